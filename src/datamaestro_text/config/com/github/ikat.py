@@ -35,6 +35,8 @@ class Clueweb22(Dataset):
         IKatClueWeb22DocumentStore.Document,
         "id",
         count_hint=count,
+        # One process per CPU (of the machine building the store)
+        num_workers=None,
     )
 
     def config(self) -> IKatClueWeb22DocumentStore:
@@ -1,15 +1,22 @@
+import json
+import logging
+import warnings
+from itertools import islice
+from pathlib import Path
 from experimaestro import Meta
 from datamaestro.data import Base, File
 from datamaestro.definitions import datatags
 import numpy as np
-from typing import Tuple, List
+from typing import Iterable, Iterator, Optional, TextIO, Tuple, List
+
+from datamaestro_text.utils.files import cached_write, file_stamp
 
 
 @datatags("word embeddings")
 class WordEmbeddings(Base):
     """Generic word embeddings"""
 
-    def load(self) -> Tuple[List[str], np.matrix]:
+    def load(self) -> Tuple[List[str], np.ndarray]:
         """Load the word embeddings
 
         Returns:
@@ -18,22 +25,147 @@ class WordEmbeddings(Base):
         raise NotImplementedError()
 
 
+def _parse_lines(lines: List[str], dimension: int) -> Tuple[List[str], np.ndarray]:
+    """Parses lines of word embeddings (word followed by the values)"""
+    words, values = [], []
+    for line in lines:
+        word, _, line_values = line.partition(" ")
+        words.append(word)
+        values.append(line_values)
+    try:
+        with warnings.catch_warnings():
+            # Older numpy versions only warn when some values cannot be parsed
+            warnings.simplefilter("error", DeprecationWarning)
+            vectors = np.fromstring(" ".join(values), dtype=np.float32, sep=" ")
+    except (ValueError, DeprecationWarning):
+        vectors = None
+
+    if vectors is None or len(vectors) != len(lines) * dimension:
+        # Some words contain spaces: splits from the right
+        words, vectors = [], []
+        for line in lines:
+            word, *line_values = line.rstrip().rsplit(" ", dimension)
+            assert len(line_values) == dimension, f"Wrong dimension for {word}"
+            words.append(word)
+            vectors.append(line_values)
+        vectors = np.array(vectors, dtype=np.float32)
+
+    return words, vectors.reshape(len(lines), dimension)
+
+
 class WordEmbeddingsText(WordEmbeddings, File):
-    """Word embeddings as a text word / values"""
+    """Word embeddings as a text word / values
+
+    On first load, the embeddings are cached (as a float32 NumPy matrix and a
+    list of words) in a folder next to the file; they are then memory-mapped
+    (copy-on-write, so the matrix can be modified in place).
+    """
 
     encoding: Meta[str] = "utf-8"
 
-    def load(self):
-        words = []
-        vectors = []
+    def _iter_chunks(
+        self, fp: TextIO, chunk_size: int
+    ) -> Iterator[Tuple[List[str], np.ndarray]]:
+        # Blank lines (e.g. at the end of the file) are skipped
+        lines_iter = (line for line in fp if line.rstrip("\r\n"))
         dimension = None
-        with self.path.open("rt", encoding=self.encoding) as fp:
-            for ix, line in enumerate(fp):
-                word, *values = line.split(" ")
-                vectors.append([float(x) for x in values])
-                if dimension is None:
-                    dimension = len(values)
-                else:
-                    assert dimension == len(values)
-                words.append(word)
-        return words, np.matrix(vectors)
+        while lines := list(islice(lines_iter, chunk_size)):
+            if dimension is None:
+                dimension = len(lines[0].rstrip().split(" ")) - 1
+            yield _parse_lines(lines, dimension)
+
+    def _parse(self, chunk_size: int = 2**16) -> Tuple[List[str], np.ndarray]:
+        words, vectors = [], []
+        with self.path.open("rt", encoding=self.encoding, newline="\n") as fp:
+            for chunk_words, chunk_vectors in self._iter_chunks(fp, chunk_size):
+                words.extend(chunk_words)
+                vectors.append(chunk_vectors)
+        if not vectors:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return words, np.concatenate(vectors)
+
+    def _write_cache(self, path: Path, metadata, chunk_size: int = 2**16):
+        """Parses the embeddings and writes them directly to a new cache folder"""
+        logging.info("Caching word embeddings in %s", path)
+        path.mkdir(parents=True)
+
+        # Count the (non blank) lines and get the dimension
+        count, dimension = 0, 0
+        with self.path.open("rb") as fp:
+            for line in fp:
+                if line.rstrip(b"\r\n"):
+                    if count == 0:
+                        dimension = len(line.rstrip().split(b" ")) - 1
+                    count += 1
+
+        vectors = np.lib.format.open_memmap(
+            path / "vectors.npy", mode="w+", dtype=np.float32, shape=(count, dimension)
+        )
+        offset = 0
+        with (
+            self.path.open("rt", encoding=self.encoding, newline="\n") as fp,
+            (path / "words.txt").open("wt", encoding="utf-8", newline="\n") as words_fp,
+        ):
+            for words, chunk_vectors in self._iter_chunks(fp, chunk_size):
+                vectors[offset : offset + len(words)] = chunk_vectors
+                offset += len(words)
+                words_fp.writelines(f"{word}\n" for word in words)
+        if offset != count:
+            raise ValueError(f"{self.path}: parsed {offset} words, expected {count}")
+        vectors.flush()
+        del vectors
+
+        # Written last: marks the cache as complete
+        (path / "meta.json").write_text(json.dumps(metadata))
+
+    @staticmethod
+    def _load_cache(path: Path, metadata) -> Optional[Tuple[List[str], np.ndarray]]:
+        meta_path = path / "meta.json"
+        if not meta_path.is_file() or json.loads(meta_path.read_text()) != metadata:
+            return None
+
+        with (path / "words.txt").open(encoding="utf-8", newline="\n") as fp:
+            words = fp.read().split("\n")[:-1]
+        # Copy-on-write: pages are shared, but the matrix can be modified
+        return words, np.load(path / "vectors.npy", mmap_mode="c")
+
+    def _load_all(self) -> Tuple[List[str], np.ndarray]:
+        metadata = file_stamp(self.path)
+        if metadata["size"] == 0:
+            return self._parse()
+
+        # The cache is written while parsing
+        loaded = cached_write(
+            self.path.with_name(f"{self.path.name}.cache"),
+            lambda path: self._load_cache(path, metadata),
+            lambda path: self._write_cache(path, metadata),
+        )
+        return self._parse() if loaded is None else loaded
+
+    def load(
+        self,
+        vocabulary: Optional[Iterable[str]] = None,
+        max_words: Optional[int] = None,
+    ) -> Tuple[List[str], np.ndarray]:
+        """Load the word embeddings
+
+        The full matrix is memory-mapped (once cached), so only the selected
+        vectors are read.
+
+        :param vocabulary: If given, only returns the embeddings of these words
+            (words without embedding are ignored)
+        :param max_words: If given, only considers the first `max_words` words
+            of the file
+        :return: The words and the (float32) matrix, in file order
+        """
+        words, vectors = self._load_all()
+        if max_words is not None:
+            words, vectors = words[:max_words], vectors[:max_words]
+
+        if vocabulary is not None:
+            vocabulary = set(vocabulary)
+            indices = [ix for ix, word in enumerate(words) if word in vocabulary]
+            words = [words[ix] for ix in indices]
+            vectors = vectors[np.array(indices, dtype=np.int64)]
+
+        return words, vectors
@@ -1,17 +1,32 @@
 """Generic data types for information retrieval"""
 
+import asyncio
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from functools import cached_property
+from itertools import islice, repeat
 import logging
 from pathlib import Path
 from attrs import define
-from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Type,
+)
 import random
+import numpy as np
 from experimaestro import Config, field
 from datamaestro.definitions import datatasks, Param, Meta
 from datamaestro.data import Base
-from datamaestro_text.utils.files import auto_open
+from datamaestro_text.utils.files import LineIndex, auto_open
+from datamaestro_text.utils.aio import RequestBatcher, aiter_batches
 from datamaestro_text.utils.iter import BatchIterator
 from datamaestro.record import record_type, RecordType
 from .base import (  # noqa: F401
@@ -25,11 +40,16 @@ from .base import (  # noqa: F401
     ScoredItem,
     # Create records
     create_record,
+    CompactRecord,
+    CompactRecordType,
     # Other things
     AdhocAssessment,
     AdhocAssessedTopic,
 )
 
+if TYPE_CHECKING:
+    from .runs import ColumnarAdhocRun
+
 #: A adhoc run dictionary (query id -> doc id -> score)
 AdhocRunDict = dict[str, dict[str, float]]
 
@@ -53,23 +73,59 @@ class Documents(Base):
     def iter_documents_from(self, start=0) -> Iterator[DocumentRecord]:
         """Iterate over a range of documents
 
-        Can be specialized in a subclass for faster access
+        Can be specialized in a subclass for faster access (the default
+        implementation iterates over the skipped documents)
 
         :param start: The starting document, defaults to 0
         :return: An iterator
         """
-        iter = self.iter()
         if start > 0:
-            logging.info("skipping %d documents", start + 1)
-            for _ in range(start + 1):
-                next(iter)
+            logging.info("skipping %d documents", start)
+        return islice(self.iter(), start, None)
+
+    def iter_range(
+        self, start: int = 0, stop: Optional[int] = None
+    ) -> Iterator[DocumentRecord]:
+        """Iterates over documents from `start` (included) to `stop` (excluded)
+
+        Relies on `iter_documents_from`, but can be specialized in a subclass
+
+        :param start: The first document
+        :param stop: The end of the range, defaults to None (last document)
+        """
+        documents = self.iter_documents_from(start)
+        if stop is None:
+            return documents
+        return islice(documents, max(0, stop - start))
+
+    def shard(self, index: int, count: int) -> Iterator[DocumentRecord]:
+        """Iterates over the documents of one (contiguous) shard
+
+        Shards have the same size (up to one document), and are given by
+        `documentcount`.
+
+        :param index: The shard index (e.g. the worker rank)
+        :param count: The number of shards
+        """
+        assert 0 <= index < count, f"Invalid shard {index} (of {count})"
+        total = self.documentcount
+        return self.iter_range(total * index // count, total * (index + 1) // count)
 
-        return iter
+    def iter_batches(self, size: int) -> Iterator[List[DocumentRecord]]:
+        """Iterates over batches of documents
+
+        By default, batches documents returned by `iter`, but subclasses can
+        convert documents by batches.
+
+        :param size: The number of documents in each batch (except the last)
+        """
+        return BatchIterator(self.iter(), size)
 
     def iter_ids(self) -> Iterator[str]:
         """Iterates over document ids
 
-        By default, use iter_documents, which is not really efficient.
+        By default, use iter_documents, which is not really efficient (stores
+        should avoid decoding the documents).
         """
         for doc in self.iter():
             yield doc[IDItem].id
@@ -136,6 +192,55 @@ class DocumentStore(Documents):
         """
         return [self.document_ext(docid) for docid in docids]
 
+    #: Maximum delay (in seconds) during which asynchronous requests are merged
+    ASYNC_WINDOW = 0.001
+
+    #: Maximum number of documents fetched at once by asynchronous requests
+    ASYNC_BATCH_SIZE = 1024
+
+    def _async_concurrency(self) -> int:
+        """Number of batches that can be fetched concurrently (stores are not
+        assumed to be thread-safe)"""
+        return 1
+
+    def _async_batcher(self) -> RequestBatcher[str, DocumentRecord]:
+        loop = asyncio.get_running_loop()
+        batcher = self.__dict__.get("_batcher")
+        if batcher is None or batcher.loop is not loop:
+            batcher = RequestBatcher(
+                self.documents_ext,
+                window=self.ASYNC_WINDOW,
+                max_batch=self.ASYNC_BATCH_SIZE,
+                max_concurrency=self._async_concurrency(),
+            )
+            self.__dict__["_batcher"] = batcher
+        return batcher
+
+    async def adocument_ext(self, docid: str) -> DocumentRecord:
+        """Returns a document given its external ID (asynchronous version)
+
+        Concurrent requests are merged into batched calls to `documents_ext`,
+        run in an executor so that the event loop is not blocked.
+        """
+        return await self._async_batcher().get(docid)
+
+    async def adocuments_ext(self, docids: List[str]) -> List[DocumentRecord]:
+        """Returns documents given their external ID (asynchronous version,
+        see `adocument_ext`)"""
+        return await self._async_batcher().get_many(docids)
+
+    async def aiter(self, batch_size: int = 1024) -> AsyncIterator[DocumentRecord]:
+        """Asynchronously iterates over documents
+
+        Batches of documents are read in a background thread (one batch
+        ahead of the consumer).
+        """
+        iterator = self.iter()
+        with ThreadPoolExecutor(1) as executor:
+            batches = repeat(lambda: list(islice(iterator, batch_size)))
+            async for document in aiter_batches(batches, executor=executor):
+                yield document
+
     def iter_sample(
         self, randint: Optional[Callable[[int], int]]
     ) -> Iterator[DocumentRecord]:
@@ -194,6 +299,14 @@ class TopicsStore(Topics):
     def topic_ext(self, external_topic_id: int) -> TopicRecord:
         """Returns a document given its external ID"""
 
+    def topics_ext(self, external_topic_ids: List[str]) -> List[TopicRecord]:
+        """Returns topics given their external IDs
+
+        By default, just look using `topic_ext`, but some stores might
+        optimize batch retrieval
+        """
+        return [self.topic_ext(topic_id) for topic_id in external_topic_ids]
+
 
 class AdhocAssessments(Base, ABC):
     """Ad-hoc assessments (qrels)"""
@@ -211,6 +324,16 @@ class AdhocRun(Base):
         """Get the run as a dictionary query ID -> doc ID -> score"""
         ...
 
+    def get_run(self) -> "ColumnarAdhocRun":
+        """Get the run as columnar arrays (query offsets, document codes and
+        scores)
+
+        By default, this converts the output of `get_dict`
+        """
+        from .runs import ColumnarAdhocRun
+
+        return ColumnarAdhocRun.from_dict(self.get_dict())
+
 
 class AdhocResults(Base):
     def get_results(self) -> Dict[str, float]:
@@ -300,8 +423,58 @@ class TrainingTripletsLines(TrainingTriplets):
     def iter(self) -> Iterator[Triplets]:
         with auto_open(self.path, "rt") as fp:
             for line in fp:
-                q, pos, neg = line.strip().split(self.sep)
-                yield self._topic(q), self._doc(pos), self._doc(neg)
+                yield self._triplet(line)
+
+    def _triplet(self, line: str) -> Triplets:
+        q, pos, neg = line.strip().split(self.sep)
+        return self._topic(q), self._doc(pos), self._doc(neg)
+
+    @cached_property
+    def line_index(self) -> LineIndex:
+        """Line offsets index (built on first use) for random access"""
+        return LineIndex(self.path)
+
+    def count(self):
+        """Returns the number of triplets (if the line index exists)"""
+        if self.line_index.exists:
+            return self.line_index.count
+        return None
+
+    def iter_range(self, start: int = 0, end: Optional[int] = None):
+        """Iterates over triplets from `start` (included) to `end` (excluded)
+
+        Uses the line index to seek directly to the starting triplet (gzip
+        files without `indexed_gzip` are decompressed up to it, with a
+        warning).
+        """
+        end = self.line_index.count if end is None else end
+        with self.line_index.open(start, sequential=True) as fp:
+            for _, line in zip(range(start, end), fp):
+                yield self._triplet(line.decode("utf-8"))
+
+    def iter_from(self, start: int) -> Iterator[Triplets]:
+        """Iterates over triplets starting from the given one"""
+        return self.iter_range(start)
+
+    def __getitem__(self, ix: int) -> Triplets:
+        if ix < 0:
+            ix += self.line_index.count
+        if not 0 <= ix < self.line_index.count:
+            raise IndexError(ix)
+        # Fails if the file is not seekable (each access would decompress it)
+        with self.line_index.open(ix) as fp:
+            return self._triplet(fp.readline().decode("utf-8"))
+
+    def shard(self, rank: int, world_size: int) -> Iterator[Triplets]:
+        """Iterates over the triplets of one (contiguous) shard
+
+        :param rank: The shard index (e.g. data loader worker or process rank)
+        :param world_size: The number of shards
+        """
+        count = self.line_index.count
+        return self.iter_range(
+            count * rank // world_size, count * (rank + 1) // world_size
+        )
 
     @cached_property
     def _doc(self):
@@ -326,6 +499,124 @@ class TrainingTripletsLines(TrainingTriplets):
         return record_type(IDItem) if self.doc_ids else record_type(SimpleTextItem)
 
 
+class TrainingTripletsArray(TrainingTriplets):
+    """Training triplets of topic and document IDs, stored as a binary array
+
+    The folder contains `triplets.npy`, a (N, 3) array of integer codes
+    (topic, positive and negative documents), and the `topic_ids.npy` and
+    `doc_ids.npy` sorted arrays of IDs (UTF-8 bytes) the codes refer to.
+    Arrays are memory-mapped, which gives constant time random access.
+    """
+
+    path: Param[Path]
+    """The folder containing the arrays"""
+
+    @cached_property
+    def triplets(self):
+        """The (memory-mapped) array of triplet codes"""
+        return np.load(self.path / "triplets.npy", mmap_mode="r")
+
+    @cached_property
+    def topic_ids(self):
+        """Topic IDs (sorted, as bytes)"""
+        return np.load(self.path / "topic_ids.npy", mmap_mode="r")
+
+    @cached_property
+    def doc_ids(self):
+        """Document IDs (sorted, as bytes)"""
+        return np.load(self.path / "doc_ids.npy", mmap_mode="r")
+
+    @staticmethod
+    def write(path: Path, triplets, topic_ids, doc_ids):
+        """Writes the arrays into a folder
+
+        :param triplets: The (N, 3) array of codes
+        :param topic_ids: The sorted topic IDs (bytes)
+        :param doc_ids: The sorted document IDs (bytes)
+        """
+        path.mkdir(exist_ok=True, parents=True)
+        np.save(path / "topic_ids.npy", topic_ids)
+        np.save(path / "doc_ids.npy", doc_ids)
+        np.save(path / "triplets.npy", triplets)
+
+    def count(self):
+        return len(self.triplets)
+
+    def __len__(self):
+        return len(self.triplets)
+
+    def _triplets(self, codes) -> List[Triplets]:
+        topics = self.topic_ids[codes[:, 0]].tolist()
+        positives = self.doc_ids[codes[:, 1]].tolist()
+        negatives = self.doc_ids[codes[:, 2]].tolist()
+        return [
+            (
+                self._topic(topic.decode("utf-8")),
+                self._doc(pos.decode("utf-8")),
+                self._doc(neg.decode("utf-8")),
+            )
+            for topic, pos, neg in zip(topics, positives, negatives)
+        ]
+
+    def iter(self) -> Iterator[Triplets]:
+        for batch in self.batch_iter(4096):
+            yield from batch
+
+    def batch_iter(self, size: int) -> Iterator[List[Triplets]]:
+        for start in range(0, len(self.triplets), size):
+            yield self._triplets(self.triplets[start : start + size])
+
+    def iter_range(self, start: int = 0, end: Optional[int] = None):
+        """Iterates over triplets from `start` (included) to `end` (excluded)"""
+        end = len(self.triplets) if end is None else end
+        for offset in range(start, end, 4096):
+            yield from self._triplets(self.triplets[offset : min(offset + 4096, end)])
+
+    def codes(self, start: int = 0, end: Optional[int] = None):
+        """Returns a (zero-copy) view of the codes of a range of triplets
+
+        Topic and document IDs can be retrieved through `topic_ids` and
+        `doc_ids`.
+        """
+        return self.triplets[start:end]
+
+    def __getitem__(self, ix: int) -> Triplets:
+        if ix < 0:
+            ix += len(self.triplets)
+        if not 0 <= ix < len(self.triplets):
+            raise IndexError(ix)
+        return self._triplets(self.triplets[ix : ix + 1])[0]
+
+    def shard(self, rank: int, world_size: int) -> Iterator[Triplets]:
+        """Iterates over the triplets of one (contiguous) shard
+
+        :param rank: The shard index (e.g. data loader worker or process rank)
+        :param world_size: The number of shards
+        """
+        count = len(self.triplets)
+        return self.iter_range(
+            count * rank // world_size, count * (rank + 1) // world_size
+        )
+
+    @cached_property
+    def _doc(self):
+        return lambda doc: self.document_recordtype(IDItem(doc))
+
+    @cached_property
+    def _topic(self):
+        return lambda q: self.topic_recordtype(IDItem(q))
+
+    @cached_property
+    def topic_recordtype(self) -> Type[TopicRecord]:
+        """The class for topics"""
+        return record_type(IDItem)
+
+    @cached_property
+    def document_recordtype(self) -> Type[DocumentRecord]:
+        """The class for documents"""
+        return record_type(IDItem)
+
+
 @define(kw_only=True)
 class PairwiseSample(ABC):
     """A a query with positive and negative samples"""
@@ -0,0 +1,340 @@
+"""Documents stored in columnar files (Parquet or Arrow IPC)
+
+`pyarrow <https://arrow.apache.org/docs/python/>`_ (``arrow`` extra) is
+required to read or write them.
+"""
+
+import importlib
+from bisect import bisect_right
+import json
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import cached_property
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+
+import attrs
+from datamaestro.record import record_type
+from experimaestro import Meta
+
+from datamaestro_text.utils.shuffle import ThreadedWriter
+from . import Documents
+from .base import DocumentRecord, IDItem, TextItem
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+#: Supported formats
+FORMATS = ("parquet", "arrow")
+
+#: Schema metadata key describing the record items (class and fields)
+ITEMS_KEY = b"datamaestro.items"
+
+#: Item class (module:qualified name) and field names, for each record item
+ItemColumns = List[Tuple[str, List[str]]]
+
+
+def _class_name(cls: type) -> str:
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _import_class(name: str) -> type:
+    module, qualname = name.split(":")
+    value = importlib.import_module(module)
+    for part in qualname.split("."):
+        value = getattr(value, part)
+    return value
+
+
+def record_items(record: DocumentRecord) -> ItemColumns:
+    """Returns the items (except the ID) of a record, with their fields
+
+    Each field is stored in its own column, along with the `id` and `text`
+    columns.
+    """
+    items, names = [], {"id", "text"}
+    for item in record.items.values():
+        if isinstance(item, IDItem):
+            continue
+        fields = [field.name for field in attrs.fields(type(item))]
+        for name in fields:
+            if name != "text":
+                assert name not in names, f"Duplicate column {name}"
+                names.add(name)
+        items.append((_class_name(type(item)), fields))
+    return items
+
+
+def records_to_columns(records: List[DocumentRecord], items: ItemColumns):
+    """Converts records to a dictionary of columns"""
+    columns = {"id": [record[IDItem].id for record in records]}
+    columns["text"] = [
+        record[TextItem].text if record.has(TextItem) else None for record in records
+    ]
+    for name, fields in items:
+        cls = _import_class(name)
+        values = [record[cls] for record in records]
+        for field in fields:
+            if field != "text":
+                columns[field] = [getattr(value, field) for value in values]
+    return columns
+
+
+#: Documents and schema used by a worker process (see `write_documents`)
+_WORKER = None
+
+
+def _init_worker(documents: Documents, schema: "pa.Schema"):
+    global _WORKER
+    # Cached values (e.g. file handles) are re-created in the worker
+    for key, value in type(documents).__dict__.items():
+        if isinstance(value, cached_property):
+            documents.__dict__.pop(key, None)
+    _WORKER = (documents, schema)
+
+
+def _convert_range(start: int, stop: int) -> "pa.RecordBatch":
+    """Converts a range of documents (in a worker process)"""
+    import pyarrow as pa
+
+    documents, schema = _WORKER
+    items = json.loads(schema.metadata[ITEMS_KEY])
+    records = list(documents.iter_range(start, stop))
+    return pa.RecordBatch.from_pydict(records_to_columns(records, items), schema)
+
+
+def _document_batches(
+    documents: Documents, batch_size: int, num_workers: int
+) -> Iterator["pa.RecordBatch"]:
+    import pyarrow as pa
+
+    iterator = documents.iter()
+    records = list(islice(iterator, batch_size))
+    if not records:
+        return
+
+    # The schema is inferred from the first batch
+    items = record_items(records[0])
+    batch = pa.RecordBatch.from_pydict(records_to_columns(records, items))
+    schema = batch.schema.with_metadata({ITEMS_KEY: json.dumps(items)})
+    yield batch.replace_schema_metadata(schema.metadata)
+
+    try:
+        count = documents.documentcount if num_workers > 1 else None
+    except NotImplementedError:
+        count = None
+
+    if count is None:
+        while records := list(islice(iterator, batch_size)):
+            yield pa.RecordBatch.from_pydict(records_to_columns(records, items), schema)
+        return
+
+    del iterator
+    ranges = (
+        (start, min(start + batch_size, count))
+        for start in range(batch_size, count, batch_size)
+    )
+    # Fork so that the documents need not be pickled
+    with ProcessPoolExecutor(
+        num_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+        initargs=(documents, schema),
+    ) as executor:
+        pending = deque(
+            executor.submit(_convert_range, *r) for r in islice(ranges, 2 * num_workers)
+        )
+        while pending:
+            yield pending.popleft().result()
+            if (r := next(ranges, None)) is not None:
+                pending.append(executor.submit(_convert_range, *r))
+
+
+class _BatchWriter:
+    """Adapts Arrow writers to `ThreadedWriter`"""
+
+    def __init__(self, writer, format: str, row_group_size: int):
+        self.writer = writer
+        self.format = format
+        self.row_group_size = row_group_size
+
+    def writelines(self, batches: List["pa.RecordBatch"]):
+        import pyarrow as pa
+
+        for batch in batches:
+            if self.format == "parquet":
+                self.writer.write_table(
+                    pa.Table.from_batches([batch]), self.row_group_size
+                )
+            else:
+                self.writer.write_batch(batch)
+
+
+def write_documents(
+    documents: Documents,
+    path: Path,
+    *,
+    format: str = "parquet",
+    compression: Optional[str] = "zstd",
+    row_group_size: int = 2**16,
+    num_workers: int = 0,
+) -> int:
+    """Writes documents into a Parquet or Arrow IPC file
+
+    Documents are converted by batches of `row_group_size` (by `num_workers`
+    processes if greater than 1 and if the number of documents is known),
+    and written by a background thread. In Parquet files, each batch is a
+    row group and the IDs are dictionary-encoded.
+
+    :param format: "parquet" or "arrow" (IPC file)
+    :param compression: The compression codec (None for no compression)
+    :return: The number of documents
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    assert format in FORMATS, f"Unknown format {format}"
+    batches = _document_batches(documents, row_group_size, num_workers)
+    first = next(batches, None)
+    if first is None:
+        first = pa.RecordBatch.from_pydict(
+            {"id": [], "text": []},
+            pa.schema([("id", pa.string()), ("text", pa.string())]).with_metadata(
+                {ITEMS_KEY: "[]"}
+            ),
+        )
+
+    if format == "parquet":
+        writer = pq.ParquetWriter(
+            path, first.schema, compression=compression or "none", use_dictionary=["id"]
+        )
+    else:
+        writer = pa.ipc.new_file(
+            path, first.schema, options=pa.ipc.IpcWriteOptions(compression=compression)
+        )
+
+    count = 0
+    with writer, ThreadedWriter(_BatchWriter(writer, format, row_group_size)) as out:
+        out.write([first])
+        count += first.num_rows
+        for batch in batches:
+            out.write([batch])
+            count += batch.num_rows
+            logging.debug("Wrote %d documents", count)
+    return count
+
+
+class ArrowDocuments(Documents):
+    """Documents stored in a Parquet or Arrow IPC file
+
+    Each field of the record items is stored in its own column, along with
+    `id` and `text`: methods that only need some columns (e.g. `iter_ids`,
+    `iter_arrow_batches`) do not read the others.
+    """
+
+    path: Meta[Path]
+    """The file"""
+
+    format: Meta[str] = "parquet"
+    """The file format (parquet or arrow)"""
+
+    @cached_property
+    def _file(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.format == "parquet":
+            return pq.ParquetFile(self.path)
+        return pa.ipc.open_file(pa.memory_map(str(self.path)))
+
+    @cached_property
+    def schema(self) -> "pa.Schema":
+        """The Arrow schema"""
+        if self.format == "parquet":
+            return self._file.schema_arrow
+        return self._file.schema
+
+    @cached_property
+    def _batch_offsets(self) -> List[int]:
+        """Start of each row group (or IPC batch), plus the number of rows"""
+        offsets = [0]
+        if self.format == "parquet":
+            metadata = self._file.metadata
+            for ix in range(metadata.num_row_groups):
+                offsets.append(offsets[-1] + metadata.row_group(ix).num_rows)
+        else:
+            for ix in range(self._file.num_record_batches):
+                offsets.append(offsets[-1] + self._file.get_batch(ix).num_rows)
+        return offsets
+
+    @cached_property
+    def documentcount(self):
+        return self._batch_offsets[-1]
+
+    @cached_property
+    def _items(self) -> List[Tuple[type, List[str]]]:
+        items = json.loads(self.schema.metadata[ITEMS_KEY])
+        return [(_import_class(name), fields) for name, fields in items]
+
+    @cached_property
+    def document_recordtype(self):
+        return record_type(IDItem, *(cls for cls, _ in self._items))
+
+    def iter_arrow_batches(
+        self, columns: Optional[List[str]] = None, start: int = 0
+    ) -> Iterator["pa.RecordBatch"]:
+        """Iterates over batches of (selected) columns
+
+        :param columns: The columns to read (all by default)
+        :param start: The first document
+        """
+        offsets = self._batch_offsets
+        if start >= offsets[-1]:
+            return
+
+        first = bisect_right(offsets, start) - 1
+        skip = start - offsets[first]
+        for ix in range(first, len(offsets) - 1):
+            if self.format == "parquet":
+                batches = self._file.read_row_group(ix, columns=columns).to_batches()
+            else:
+                batch = self._file.get_batch(ix)
+                batches = [batch.select(columns) if columns else batch]
+
+            for batch in batches:
+                if skip >= batch.num_rows:
+                    skip -= batch.num_rows
+                    continue
+                yield batch.slice(skip) if skip else batch
+                skip = 0
+
+    def _records(self, batch: "pa.RecordBatch") -> Iterator[DocumentRecord]:
+        columns = batch.to_pydict()
+        for ix, docid in enumerate(columns["id"]):
+            yield DocumentRecord(
+                IDItem(docid),
+                *(
+                    cls(**{field: columns[field][ix] for field in fields})
+                    for cls, fields in self._items
+                ),
+            )
+
+    def iter(self) -> Iterator[DocumentRecord]:
+        return self.iter_documents_from(0)
+
+    def iter_documents_from(self, start=0) -> Iterator[DocumentRecord]:
+        for batch in self.iter_arrow_batches(start=start):
+            yield from self._records(batch)
+
+    def iter_ids(self) -> Iterator[str]:
+        """Iterates over document IDs (only reads the ID column)"""
+        for batch in self.iter_arrow_batches(["id"]):
+            yield from batch.column(0).to_pylist()
+
+    def iter_texts(self) -> Iterator[str]:
+        """Iterates over document texts (only reads the text column)"""
+        for batch in self.iter_arrow_batches(["text"]):
+            yield from batch.column(0).to_pylist()
@@ -1,12 +1,81 @@
 from abc import ABC, abstractmethod
 from attrs import define
-from typing import List
-from datamaestro.record import Record, Item
+from typing import Dict, List, Tuple, Type
+from datamaestro.record import Record, RecordType, Item
 
 
 TopicRecord = DocumentRecord = Record
 
 
+class CompactRecord(Record):
+    """A record whose items are stored in a tuple
+
+    Contrary to `Record`, no dictionary is created for each record: items
+    are located through their (shared) record type.
+    """
+
+    __slots__ = ("recordtype", "values")
+
+    def __init__(self, recordtype: "CompactRecordType", values: Tuple[Item, ...]):
+        self.recordtype = recordtype
+        self.values = values
+
+    @property
+    def items(self) -> Dict[Type[Item], Item]:
+        return dict(zip(self.recordtype.bases, self.values))
+
+    def has(self, key: Type[Item]) -> bool:
+        return key.__get_base__() in self.recordtype.positions
+
+    def __getitem__(self, key: Type[Item]) -> Item:
+        position = self.recordtype.positions.get(key.__get_base__())
+        if position is None or not isinstance(self.values[position], key):
+            raise KeyError(
+                f"No entry with type {key}: "
+                f"{','.join(str(s) for s in self.recordtype.bases)}"
+            )
+        return self.values[position]
+
+    def __getstate__(self):
+        return (self.recordtype, self.values)
+
+    def __setstate__(self, state):
+        self.recordtype, self.values = state
+
+
+class CompactRecordType(RecordType):
+    """A record type whose records are `CompactRecord`s
+
+    Items are stored in the order of the item types given to the constructor:
+    `create` builds a record from items in that order, without validation.
+    """
+
+    def __init__(self, *item_types: Type[Item]):
+        super().__init__(*item_types)
+        self.bases = tuple(item_type.__get_base__() for item_type in item_types)
+        self.positions = {base: ix for ix, base in enumerate(self.bases)}
+
+    def __call__(self, *items: Item) -> CompactRecord:
+        values = [None] * len(self.bases)
+        for item in items:
+            position = self.positions.get(item.__get_base__())
+            if position is None:
+                raise KeyError(
+                    f"The record of type {self} contains unregistered items: {item}"
+                )
+            if values[position] is not None:
+                raise RuntimeError(
+                    f"The item type {item.__get_base__()} ({item.__class__})"
+                    " is already in the record"
+                )
+            values[position] = item
+        return self.validate(CompactRecord(self, tuple(values)))
+
+    def create(self, items: Tuple[Item, ...]) -> CompactRecord:
+        """Creates a record from items (in the order of the item types)"""
+        return CompactRecord(self, items)
+
+
 @define()
 class ScoredItem(Item):
     """A score associated with the document"""
@@ -1,5 +1,10 @@
-from csv import DictReader
-from typing import Iterator
+import csv
+import logging
+from functools import cached_property
+from pathlib import Path
+from typing import BinaryIO, Iterator, List, Optional
+
+import numpy as np
 
 from experimaestro import documentation
 from datamaestro.data import File
@@ -11,6 +16,7 @@ from datamaestro_text.data.ir.formats import (
     TrecTopic,
 )
 from datamaestro.data.csv import Generic as GenericCSV
+from datamaestro_text.utils.files import cached_build, file_stamp
 import xml.etree.ElementTree as ET
 
 
@@ -36,12 +42,89 @@ class Topics(Topics, File):
 
 
 class Documents(Documents, GenericCSV):
+    """CORD-19 metadata file
+
+    Documents can be iterated from any position using an index of row offsets,
+    built on first use next to the file (`<path>.rows.npz`), and rebuilt when
+    the file size or modification time changes.
+    """
+
     @documentation
     def iter(self) -> Iterator[Record]:
         """Returns an iterator over adhoc documents"""
-        with self.path.open("r") as fp:
-            for row in DictReader(fp):
-                yield Record(
-                    IDItem(row["cord_uid"]),
-                    DocumentWithTitle(row["abstract"], row["title"]),
-                )
+        return self.iter_documents_from(0)
+
+    @staticmethod
+    def _lines(fp: BinaryIO, positions: List[int]):
+        for line in fp:
+            positions[0] += len(line)
+            yield line.decode("utf-8")
+
+    def _rows(self, start: int = 0) -> Iterator[dict]:
+        """Iterates over rows (as dictionaries), starting from the given one"""
+        with self.path.open("rb") as fp:
+            reader = csv.reader(self._lines(fp, [0]))
+            fieldnames = next(reader)
+            if start > 0:
+                if start >= len(self.row_offsets):
+                    return
+                fp.seek(int(self.row_offsets[start]))
+
+            for row in reader:
+                yield dict(zip(fieldnames, row))
+
+    def iter_documents_from(self, start=0) -> Iterator[Record]:
+        for row in self._rows(start):
+            yield Record(
+                IDItem(row["cord_uid"]),
+                DocumentWithTitle(row["abstract"], row["title"]),
+            )
+
+    def iter_ids(self) -> Iterator[str]:
+        return (row["cord_uid"] for row in self._rows())
+
+    @property
+    def documentcount(self):
+        if self.count is not None:
+            return self.count
+        return len(self.row_offsets)
+
+    @cached_property
+    def row_offsets(self) -> np.ndarray:
+        """Offsets of each row (excluding the header)"""
+        return cached_build(
+            self.path.with_name(f"{self.path.name}.rows.npz"),
+            self._load_offsets,
+            self._build_offsets,
+            self._save_offsets,
+        )
+
+    def _load_offsets(self, index_path: Path) -> Optional[np.ndarray]:
+        if not index_path.is_file():
+            return None
+
+        data = np.load(index_path)
+        stamp = file_stamp(self.path)
+        if (int(data["size"]), int(data["mtime"])) != (stamp["size"], stamp["mtime"]):
+            return None
+        return data["offsets"]
+
+    def _build_offsets(self) -> np.ndarray:
+        logging.info("Building the row index of %s", self.path)
+        offsets = []
+        with self.path.open("rb") as fp:
+            # Rows can span several lines: the position before reading a row
+            # is the end of the last line read by the CSV reader
+            position = [0]
+            reader = csv.reader(self._lines(fp, position))
+            next(reader)
+            while True:
+                start = position[0]
+                if next(reader, None) is None:
+                    break
+                offsets.append(start)
+        return np.array(offsets, dtype=np.int64)
+
+    def _save_offsets(self, offsets: np.ndarray, index_path: Path):
+        with index_path.open("wb") as fp:
+            np.savez(fp, offsets=offsets, **file_stamp(self.path))
@@ -1,11 +1,17 @@
+import json
+import logging
+import mmap
 from functools import cached_property
 from pathlib import Path
+from typing import Iterator, List, Optional
 
+import numpy as np
 from experimaestro import Param, Meta
-from datamaestro.record import Record, RecordType
+from datamaestro.record import Record, RecordType, record_type
 import datamaestro_text.data.ir as ir
-from datamaestro_text.data.ir.base import IDItem, SimpleTextItem
+from datamaestro_text.data.ir.base import DocumentRecord, IDItem, SimpleTextItem
 from datamaestro_text.interfaces.plaintext import read_tsv
+from datamaestro_text.utils.files import cached_build, file_stamp
 
 
 class AdhocRunWithText(ir.AdhocRun):
@@ -33,10 +39,214 @@ class Topics(ir.Topics):
         return RecordType(IDItem, SimpleTextItem)
 
 
-class Documents(ir.Documents):
-    "One line per document, format pid<SEP>text"
+class OffsetIndex:
+    """Line offsets and ID lookup for a file with one document per line
+
+    The index is stored (as NumPy arrays) in a folder next to the file, and
+    rebuilt when the file size or modification time changes:
+
+    - `offsets.npy` contains the start of each document (and the file size);
+      blank lines are skipped
+    - `ids.npy` and `lines.npy` contain the sorted IDs and the corresponding
+      document numbers; they are not stored when the ID of each document is
+      its number (e.g. MS MARCO passages), in which case lookups are direct
+    """
+
+    def __init__(self, path: Path, separator: bytes):
+        self.path = path
+        self.separator = separator
+        self.folder = path.with_name(f"{path.name}.index")
+
+        metadata = file_stamp(path)
+        self.offsets, self.ids, self.lines = cached_build(
+            self.folder,
+            lambda folder: self._load(folder, metadata),
+            self._build,
+            lambda index, folder: self._save(index, folder, metadata),
+        )
+
+    @staticmethod
+    def _load(folder: Path, metadata):
+        meta_path = folder / "meta.json"
+        if not meta_path.is_file() or json.loads(meta_path.read_text()) != metadata:
+            return None
+
+        offsets = np.load(folder / "offsets.npy", mmap_mode="r")
+        if not (folder / "ids.npy").is_file():
+            return offsets, None, None
+        ids = np.load(folder / "ids.npy", mmap_mode="r")
+        return offsets, ids, np.load(folder / "lines.npy", mmap_mode="r")
+
+    def _id(self, line: bytes, lineno: int) -> bytes:
+        position = line.find(self.separator)
+        if position < 0:
+            raise ValueError(f"{self.path}, line {lineno}: no separator")
+        return line[:position]
+
+    def _build(self, block_size: int = 2**26):
+        logging.info("Building the offset index of %s", self.path)
+        starts, ids = [], []
+        with self.path.open("rb") as fp:
+            position, lineno, remainder = 0, 0, b""
+            while block := fp.read(block_size):
+                block = remainder + block
+                ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+                start = 0
+                for end in ends.tolist():
+                    lineno += 1
+                    line = block[start:end]
+                    if line and line != b"\r":
+                        ids.append(self._id(line, lineno))
+                        starts.append(position + start)
+                    start = end + 1
+
+                remainder = block[start:]
+                position += start
+
+            if remainder.rstrip(b"\r"):
+                # Last line without end of line
+                ids.append(self._id(remainder, lineno + 1))
+                starts.append(position)
+            starts.append(position + len(remainder))
+
+        offsets = np.array(starts, dtype=np.int64)
+        ids = np.array(ids, dtype=bytes)
+        if np.array_equal(ids, np.arange(len(ids)).astype(bytes)):
+            return offsets, None, None
+        lines = np.argsort(ids, kind="stable")
+        return offsets, ids[lines], lines
+
+    @staticmethod
+    def _save(index, folder: Path, metadata):
+        offsets, ids, lines = index
+        folder.mkdir(parents=True)
+        np.save(folder / "offsets.npy", offsets)
+        if ids is not None:
+            np.save(folder / "ids.npy", ids)
+            np.save(folder / "lines.npy", lines)
+        (folder / "meta.json").write_text(json.dumps(metadata))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def line(self, docid: str) -> int:
+        """Returns the number of a document"""
+        return int(self.line_numbers([docid])[0])
+
+    def line_numbers(self, docids: List[str]) -> np.ndarray:
+        """Returns the numbers of documents
+
+        :raises KeyError: if a document does not exist
+        """
+        if self.ids is None:
+            # Document IDs are line numbers
+            if all(docid.isdigit() for docid in docids):
+                lines = np.array([int(docid) for docid in docids], dtype=np.int64)
+                canonical = all(
+                    str(line) == docid for line, docid in zip(lines.tolist(), docids)
+                )
+                if canonical and (lines < len(self)).all():
+                    return lines
+        else:
+            keys = np.array([docid.encode("utf-8") for docid in docids], dtype=bytes)
+            ix = np.searchsorted(self.ids, keys)
+            found = ix < len(self.ids)
+            found[found] = self.ids[ix[found]] == keys[found]
+            if found.all():
+                return self.lines[ix]
+
+        raise KeyError(f"Documents not found in {self.path}")
+
+
+class Documents(ir.DocumentStore):
+    """One line per document, format pid<SEP>text
+
+    Blank lines are skipped. Random access relies on an offset index, built on
+    first use next to the file, and on a memory-mapped view of the file.
+    """
 
     path: Param[Path]
     separator: Meta[str] = "\t"
 
-    pass
+    @cached_property
+    def document_recordtype(self):
+        return record_type(IDItem, SimpleTextItem)
+
+    def _document(self, line: str) -> DocumentRecord:
+        # Stops at the end of line (indexed documents include blank lines)
+        line = line.partition("\n")[0].rstrip("\r")
+        docid, separator, text = line.partition(self.separator)
+        if not separator:
+            raise ValueError(f"{self.path}: no separator in line {line[:80]!r}")
+        return self.document_recordtype(IDItem(docid), SimpleTextItem(text))
+
+    @staticmethod
+    def _is_blank(line: bytes) -> bool:
+        return line in (b"\n", b"\r\n", b"\r", b"")
+
+    def iter(self) -> Iterator[DocumentRecord]:
+        return self.iter_documents_from(0)
+
+    def iter_documents_from(self, start=0) -> Iterator[DocumentRecord]:
+        """Iterates over documents, starting from the given one (using the
+        offset index to seek directly to it)"""
+        with self.path.open("rb", buffering=2**20) as fp:
+            if start > 0:
+                fp.seek(int(self.index.offsets[start]))
+            for line in fp:
+                if not self._is_blank(line):
+                    yield self._document(line.decode("utf-8"))
+
+    def iter_ids(self) -> Iterator[str]:
+        """Iterates over document IDs (without decoding the documents)"""
+        if self.index.ids is None:
+            return map(str, range(len(self.index)))
+        return self._iter_ids()
+
+    def _iter_ids(self) -> Iterator[str]:
+        with self.path.open("rb", buffering=2**20) as fp:
+            for lineno, line in enumerate(fp, 1):
+                if not self._is_blank(line):
+                    yield self.index._id(line, lineno).decode("utf-8")
+
+    @cached_property
+    def index(self) -> OffsetIndex:
+        """The offset index (built on first use)"""
+        return OffsetIndex(self.path, self.separator.encode("utf-8"))
+
+    @cached_property
+    def _data(self):
+        with self.path.open("rb") as fp:
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _line(self, ix: int) -> str:
+        offsets = self.index.offsets
+        return self._data[offsets[ix] : offsets[ix + 1]].decode("utf-8")
+
+    @property
+    def documentcount(self):
+        if self.count is not None:
+            return self.count
+        return len(self.index)
+
+    def docid_internal2external(self, ix: int):
+        return self.document_int(ix)[IDItem].id
+
+    def document_int(self, ix: int) -> DocumentRecord:
+        if not 0 <= ix < len(self.index):
+            raise IndexError(ix)
+        return self._document(self._line(ix))
+
+    def document_ext(self, docid: str) -> DocumentRecord:
+        return self._document(self._line(self.index.line(docid)))
+
+    def documents_ext(self, docids: List[str]) -> List[DocumentRecord]:
+        """Returns documents given their external IDs
+
+        Documents are read in file order (which minimizes disk seeks)
+        """
+        lines = self.index.line_numbers(docids)
+        documents: List[Optional[DocumentRecord]] = [None] * len(docids)
+        for ix in np.argsort(lines, kind="stable").tolist():
+            documents[ix] = self._document(self._line(int(lines[ix])))
+        return documents
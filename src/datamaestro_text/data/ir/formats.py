@@ -1,10 +1,12 @@
 from functools import cached_property
-from typing import Tuple, List
+from typing import TYPE_CHECKING, Tuple, List
 from attrs import define
 from datamaestro.record import record_type
-from ir_datasets.datasets.wapo import WapoDocMedia
 from .base import TextItem, SimpleTextItem, IDItem
-from ir_datasets.datasets.cord19 import Cord19FullTextSection
+
+if TYPE_CHECKING:
+    from ir_datasets.datasets.wapo import WapoDocMedia
+    from ir_datasets.datasets.cord19 import Cord19FullTextSection
 
 
 @define
@@ -31,7 +33,7 @@ class CordFullTextDocument(TextItem):
     doi: str
     date: str
     abstract: str
-    body: Tuple[Cord19FullTextSection, ...]
+    body: Tuple["Cord19FullTextSection", ...]
 
     @cached_property
     def text(self):
@@ -95,7 +97,7 @@ class WapoDocument(TextItem):
     kicker: str
     body: str
     body_paras_html: Tuple[str, ...]
-    body_media: Tuple[WapoDocMedia, ...]
+    body_media: Tuple["WapoDocMedia", ...]
 
     @cached_property
     def text(self):
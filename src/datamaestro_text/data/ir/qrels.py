@@ -0,0 +1,166 @@
+"""Columnar representation of ad-hoc assessments"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from datamaestro_text.utils.files import cached_build, file_stamp
+
+from .base import AdhocAssessedTopic, SimpleAdhocAssessment
+
+
+class ColumnarAssessments:
+    """Ad-hoc assessments (qrels) stored as NumPy arrays
+
+    Topic and document IDs are stored sorted (as UTF-8 bytes), so they can be
+    looked up by binary search. The assessments of the i-th topic are at
+    positions `offsets[i]` to `offsets[i+1]` of `doc_codes` and
+    `relevances`.
+
+    The arrays can be saved in a folder, and loaded back memory-mapped.
+    """
+
+    ARRAYS = ["topic_ids", "offsets", "doc_ids", "doc_codes", "relevances"]
+
+    def __init__(
+        self,
+        topic_ids: np.ndarray,
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        doc_codes: np.ndarray,
+        relevances: np.ndarray,
+    ):
+        self.topic_ids = topic_ids
+        """Sorted topic IDs (bytes)"""
+
+        self.offsets = offsets
+        """Start of each topic assessments (with one extra final value)"""
+
+        self.doc_ids = doc_ids
+        """Sorted document IDs (bytes)"""
+
+        self.doc_codes = doc_codes
+        """Index of each assessed document in `doc_ids` (int32)"""
+
+        self.relevances = relevances
+        """Relevance of each assessed document (int8)"""
+
+    @staticmethod
+    def from_arrays(
+        topic_ids: np.ndarray, doc_ids: np.ndarray, relevances: np.ndarray
+    ) -> "ColumnarAssessments":
+        """Builds the assessments from one entry per judgment (IDs as bytes)"""
+        topics, topic_codes = np.unique(topic_ids, return_inverse=True)
+        topic_codes = topic_codes.reshape(-1)
+        order = np.argsort(topic_codes, kind="stable")
+        offsets = np.zeros(len(topics) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(topic_codes, minlength=len(topics)), out=offsets[1:])
+
+        docs, doc_codes = np.unique(doc_ids, return_inverse=True)
+        return ColumnarAssessments(
+            topics,
+            offsets,
+            docs,
+            doc_codes.reshape(-1)[order].astype(np.int32),
+            np.asarray(relevances, dtype=np.int8)[order],
+        )
+
+    def save(self, path: Path, **metadata):
+        """Saves the arrays into a new folder"""
+        path.mkdir(parents=True)
+        for name in ColumnarAssessments.ARRAYS:
+            np.save(path / f"{name}.npy", getattr(self, name))
+        # Written last: marks the cache as complete
+        (path / "meta.json").write_text(json.dumps(metadata))
+
+    @staticmethod
+    def load(path: Path, **metadata) -> Optional["ColumnarAssessments"]:
+        """Loads (memory-mapped) arrays from a folder
+
+        :param metadata: if given, the saved metadata should match
+        :return: The assessments, or None if the folder is missing or stale
+        """
+        meta_path = path / "meta.json"
+        if not meta_path.is_file() or json.loads(meta_path.read_text()) != metadata:
+            return None
+
+        return ColumnarAssessments(
+            *(
+                np.load(path / f"{name}.npy", mmap_mode="r")
+                for name in ColumnarAssessments.ARRAYS
+            )
+        )
+
+    def topic_index(self, topic_id: str) -> int:
+        """Returns the index of a topic, or -1 if it has no assessments"""
+        key = topic_id.encode("utf-8")
+        ix = int(np.searchsorted(self.topic_ids, key))
+        if ix < len(self.topic_ids) and self.topic_ids[ix] == key:
+            return ix
+        return -1
+
+    def _assessments(self, ix: int):
+        start, end = self.offsets[ix], self.offsets[ix + 1]
+        return self.doc_codes[start:end], self.relevances[start:end]
+
+    def get(self, topic_id: str) -> Dict[str, int]:
+        """Returns the assessments (document ID -> relevance) of a topic"""
+        ix = self.topic_index(topic_id)
+        if ix < 0:
+            return {}
+
+        doc_codes, relevances = self._assessments(ix)
+        return dict(
+            zip(
+                np.char.decode(self.doc_ids[doc_codes], "utf-8").tolist(),
+                relevances.tolist(),
+            )
+        )
+
+    def relevant_docs(self, topic_id: str, min_rel: int = 1) -> List[str]:
+        """Returns the documents whose relevance is at least `min_rel`"""
+        ix = self.topic_index(topic_id)
+        if ix < 0:
+            return []
+
+        doc_codes, relevances = self._assessments(ix)
+        selected = doc_codes[relevances >= min_rel]
+        return np.char.decode(self.doc_ids[selected], "utf-8").tolist()
+
+    def iter(self) -> Iterator[AdhocAssessedTopic]:
+        """Iterates over assessed topics (sorted by topic ID)"""
+        for ix, topic_id in enumerate(self.topic_ids):
+            doc_codes, relevances = self._assessments(ix)
+            yield AdhocAssessedTopic(
+                topic_id.decode("utf-8"),
+                [
+                    SimpleAdhocAssessment(doc_id, rel)
+                    for doc_id, rel in zip(
+                        np.char.decode(self.doc_ids[doc_codes], "utf-8").tolist(),
+                        relevances.tolist(),
+                    )
+                ],
+            )
+
+    def __len__(self):
+        return len(self.topic_ids)
+
+
+def cached_assessments(path: Path, parse) -> ColumnarAssessments:
+    """Returns the assessments of a file, using a cache folder next to it
+
+    The cache is invalidated when the size or modification time of the file
+    changes. If it cannot be written, the parsed assessments are returned.
+
+    :param path: The assessments file
+    :param parse: Function that parses the file into columnar assessments
+    """
+    metadata = file_stamp(path)
+    return cached_build(
+        path.with_name(f"{path.name}.cache"),
+        lambda cache_path: ColumnarAssessments.load(cache_path, **metadata),
+        lambda: parse(path),
+        lambda assessments, cache_path: assessments.save(cache_path, **metadata),
+    )
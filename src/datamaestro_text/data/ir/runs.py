@@ -0,0 +1,139 @@
+"""Columnar representation of ad-hoc runs"""
+
+from functools import cached_property
+from typing import Dict, Iterator, Mapping
+
+import numpy as np
+
+
+def _as_str(array: np.ndarray) -> np.ndarray:
+    """Converts an array of bytes (UTF-8) or strings to an array of strings"""
+    if array.dtype.kind == "S":
+        return np.char.decode(array, "utf-8")
+    return array.astype(str)
+
+
+class ColumnarAdhocRun(Mapping[str, Mapping[str, float]]):
+    """An ad-hoc run stored as NumPy arrays
+
+    Results are grouped by query: the results of the i-th query are at
+    positions `offsets[i]` to `offsets[i+1]` of `doc_codes` (indices in
+    `doc_ids`) and `scores`.
+
+    The run can be used as a (read-only) dictionary query ID -> doc ID ->
+    score, where the inner dictionaries are built on demand.
+    """
+
+    def __init__(
+        self,
+        query_ids: np.ndarray,
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        doc_codes: np.ndarray,
+        scores: np.ndarray,
+    ):
+        assert len(offsets) == len(query_ids) + 1
+        assert len(doc_codes) == len(scores) == offsets[-1]
+
+        self.query_ids = query_ids
+        """Query IDs (strings)"""
+
+        self.offsets = offsets
+        """Start of each query results (int64, with one extra final value)"""
+
+        self.doc_ids = doc_ids
+        """Document IDs (strings)"""
+
+        self.doc_codes = doc_codes
+        """Index of each result document in `doc_ids` (int32)"""
+
+        self.scores = scores
+        """Score of each result (float64)"""
+
+    @staticmethod
+    def from_arrays(
+        query_ids: np.ndarray, doc_ids: np.ndarray, scores: np.ndarray
+    ) -> "ColumnarAdhocRun":
+        """Builds a run from one entry per result
+
+        Queries are kept in order of first appearance, and results of a query
+        keep their relative order. IDs can be given as strings or as UTF-8
+        bytes (which is more compact).
+        """
+        queries, first, query_codes = np.unique(
+            query_ids, return_index=True, return_inverse=True
+        )
+
+        # Renumber queries by first appearance
+        query_order = np.argsort(first, kind="stable")
+        query_rank = np.empty_like(query_order)
+        query_rank[query_order] = np.arange(len(query_order))
+        query_codes = query_rank[query_codes.reshape(-1)]
+
+        order = np.argsort(query_codes, kind="stable")
+        offsets = np.zeros(len(queries) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(query_codes, minlength=len(queries)), out=offsets[1:])
+
+        docs, doc_codes = np.unique(doc_ids, return_inverse=True)
+        return ColumnarAdhocRun(
+            _as_str(queries[query_order]),
+            offsets,
+            _as_str(docs),
+            doc_codes.reshape(-1)[order].astype(np.int32),
+            np.asarray(scores, dtype=np.float64)[order],
+        )
+
+    @staticmethod
+    def from_dict(run: Mapping[str, Mapping[str, float]]) -> "ColumnarAdhocRun":
+        """Builds a columnar run from a dictionary"""
+        if isinstance(run, ColumnarAdhocRun):
+            return run
+
+        query_ids = [qid for qid, results in run.items() for _ in results]
+        doc_ids = [doc_id for results in run.values() for doc_id in results]
+        scores = [score for results in run.values() for score in results.values()]
+        if not query_ids:
+            return ColumnarAdhocRun(
+                np.array([], dtype=str),
+                np.zeros(1, dtype=np.int64),
+                np.array([], dtype=str),
+                np.array([], dtype=np.int32),
+                np.array([], dtype=np.float64),
+            )
+        return ColumnarAdhocRun.from_arrays(
+            np.array(query_ids), np.array(doc_ids), np.array(scores, dtype=np.float64)
+        )
+
+    @cached_property
+    def query_index(self) -> Dict[str, int]:
+        """Maps query IDs to their index"""
+        return {qid: ix for ix, qid in enumerate(self.query_ids.tolist())}
+
+    def results(self, index: int):
+        """Returns the document codes and scores of the i-th query"""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.doc_codes[start:end], self.scores[start:end]
+
+    def __getitem__(self, query_id: str) -> Dict[str, float]:
+        doc_codes, scores = self.results(self.query_index[query_id])
+        return dict(zip(self.doc_ids[doc_codes].tolist(), scores.tolist()))
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """Returns the run as a dictionary query ID -> doc ID -> score"""
+        doc_ids, scores = self.doc_ids[self.doc_codes].tolist(), self.scores.tolist()
+        offsets = self.offsets.tolist()
+        return {
+            query_id: dict(zip(doc_ids[start:end], scores[start:end]))
+            for query_id, start, end in zip(
+                self.query_ids.tolist(), offsets, offsets[1:]
+            )
+        }
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.query_ids.tolist())
+
+    def __len__(self):
+        return len(self.query_ids)
+
+    def __contains__(self, query_id):
+        return query_id in self.query_index
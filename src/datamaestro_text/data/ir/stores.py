@@ -1,12 +1,23 @@
 import bz2
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from hashlib import md5, sha256
+from itertools import islice
 import json
 import logging
 from pathlib import Path
-from typing import List, NamedTuple
-from datamaestro_text.utils.files import TQDMFileReader
-from experimaestro import Constant
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+from zlib import crc32
+from datamaestro_text.utils.cache import CacheStatistics, LRUCache
+from datamaestro_text.utils.digests import DigestIndex
+from datamaestro_text.utils.files import (
+    ChecksumManifest,
+    TQDMFileReader,
+    file_digest,
+)
+from experimaestro import Constant, Meta, Param
 from datamaestro.record import Record
+from datamaestro_text.data.ir import DocumentStore
 from datamaestro_text.data.ir.base import (
     DocumentRecord,
     IDItem,
@@ -31,6 +42,7 @@ class OrConvQADocumentStore(LZ4DocumentStore):
     index_fields: Constant[List[str]] = ["id"]
 
     data_cls = NAMED_TUPLE
+    text_fields = ("title", "body")
 
     def converter(self, data: NAMED_TUPLE) -> Record:
         fields = data._asdict()
@@ -38,76 +50,167 @@ class OrConvQADocumentStore(LZ4DocumentStore):
         return Record(OrConvQADocument(**fields), IDItem(data.id))
 
 
-class IKatClueWeb22DocumentStore(LZ4DocumentStore):
-    @staticmethod
-    def generator(path: Path, checksums_file: Path, passages_hashes: Path):
-        """Returns an iterator over iKAT 2022-25 documents
+class IKatDocuments:
+    """Iterator factory over iKAT 2022-25 documents
 
-        :param path: The folder containing the files
-        """
+    The factory can be called with `(shard, num_shards)` to only iterate over
+    a contiguous subset of the files (parallel store building). The file list
+    and the passage hashes are loaded once by `prepare`, which is called
+    before worker processes are forked.
 
-        def __iter__():
-            errors = False
-
-            assert checksums_file.is_file(), f"{checksums_file} does not exist"
-            assert passages_hashes.is_file(), f"{passages_hashes} does not exist"
-
-            # Get the list of files
-            with checksums_file.open("rt") as fp:
-                files = []
-                for line in fp:
-                    checksum, filename = line.strip().split()
-                    files.append((checksum, filename))
-                    if not (path / filename).is_file():
-                        logging.error("File %s does not exist", path / filename)
-                        errors = True
-
-            assert not errors, "Errors detected, stopping"
-
-            # Check the SHA256 sums
-            match checksums_file.suffix:
-                case ".sha256sums":
-                    hasher_factory = sha256
-                case _:
-                    raise NotImplementedError(
-                        f"Cannot handle {checksums_file.suffix} checksum files"
-                    )
+    File checksums are computed in a thread pool while documents are parsed
+    (a few files ahead), and are recorded in a manifest (next to the checksum file) so that
+    unchanged files are not hashed again. If a checksum does not match, an
+    exception is raised (and the store is not built).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        checksums_file: Path,
+        passages_hashes: Path,
+        *,
+        md5_sample_rate: float = 1.0,
+        checksum_workers: int = 4,
+    ):
+        self.path = path
+        self.checksums_file = checksums_file
+        self.passages_hashes = passages_hashes
+        self.md5_sample_rate = md5_sample_rate
+        self.checksum_workers = checksum_workers
+
+        self.files: Optional[List[Tuple[str, str]]] = None
+        """(checksum, file name) pairs, set by `prepare`"""
+
+        self.passage_checksums: Optional[DigestIndex] = None
+        """MD5 digests of the passages, set by `prepare`"""
+
+    def prepare(self):
+        """Checks that all the files exist and loads the passage hashes"""
+        if self.files is not None:
+            return
+
+        path, checksums_file = self.path, self.checksums_file
+        assert checksums_file.is_file(), f"{checksums_file} does not exist"
+        assert self.passages_hashes.is_file(), f"{self.passages_hashes} does not exist"
+        if checksums_file.suffix != ".sha256sums":
+            raise NotImplementedError(
+                f"Cannot handle {checksums_file.suffix} checksum files"
+            )
+
+        # Get the list of files
+        errors = False
+        with checksums_file.open("rt") as fp:
+            files = []
+            for line in fp:
+                checksum, filename = line.strip().split()
+                files.append((checksum, filename))
+                if not (path / filename).is_file():
+                    logging.error("File %s does not exist", path / filename)
+                    errors = True
+        assert not errors, "Errors detected, stopping"
+
+        # Get the MD5 hashes of all the passages (converted once into a
+        # memory-mapped index, shared by forked processes)
+        if self.md5_sample_rate > 0:
+            passages_hashes = self.passages_hashes
+            self.passage_checksums = DigestIndex.create(
+                passages_hashes.with_name(f"{passages_hashes.name}.index"),
+                lambda: IKatClueWeb22DocumentStore._passage_hashes(passages_hashes),
+            )
+        self.files = files
 
+    def __call__(self, shard: int = 0, num_shards: int = 1):
+        self.prepare()
+        path, passage_checksums = self.path, self.passage_checksums
+
+        # Only keep the files of this shard
+        start = len(self.files) * shard // num_shards
+        end = len(self.files) * (shard + 1) // num_shards
+        files = self.files[start:end]
+
+        manifest = ChecksumManifest(
+            self.checksums_file.with_name(f"{self.checksums_file.name}.verified")
+        )
+        md5_threshold = int(self.md5_sample_rate * 2**32)
+
+        # Read the files, while computing the checksums of the next ones in
+        # the background (not all at once, so that nothing is left to wait
+        # for if reading stops)
+        logging.info("Starting to read the files")
+        executor = ThreadPoolExecutor(self.checksum_workers)
+
+        def submit(checksum: str, filename: str) -> Optional[Future]:
+            if manifest.digest(filename, path / filename) == checksum:
+                return None
+            return executor.submit(file_digest, path / filename, sha256)
+
+        try:
+            next_files = iter(files)
+            futures = deque(
+                submit(*file) for file in islice(next_files, 2 * self.checksum_workers)
+            )
             for checksum, filename in tqdm(files):
-                logging.info("Checking %s", filename)
-                hasher = hasher_factory()
-                with (path / filename).open("rb") as fp:
-                    while data := fp.read(2**20):
-                        hasher.update(data)
-
-                file_checksum = hasher.hexdigest()
-                assert file_checksum == checksum, (
-                    f"Expected {checksum}, got {file_checksum} for {filename}"
-                )
-
-            # Get the MD5 hashes of all the passages
-            logging.info("Reading the hashes of all passages")
-            with TQDMFileReader(passages_hashes, "rt", bz2.open) as fp:
-                passage_checksums = {}
-                for line in tqdm(fp):
-                    doc_id, passage_no, checksum = line.strip().split()
-                    passage_checksums[f"{doc_id}:{passage_no}"] = checksum  # noqa: E231
-
-            # Read the files
-            logging.info("Starting to read the files")
-            for _, filename in tqdm(files):
+                future = futures.popleft()
+                if (file := next(next_files, None)) is not None:
+                    futures.append(submit(*file))
+
                 with TQDMFileReader(path / filename, "rt", bz2.open) as jsonl_fp:
                     for line in jsonl_fp:
                         data = json.loads(line)
-                        expected = passage_checksums[data["id"]]
-                        computed = md5(data["contents"].encode("utf-8")).hexdigest()
-                        assert expected == computed, (
-                            f"Expected {expected}, "
-                            f"got {computed} for passage {data['id']} in {filename}"
-                        )
+                        doc_id = data["id"]
+                        if crc32(doc_id.encode("utf-8")) < md5_threshold:
+                            computed = md5(data["contents"].encode("utf-8"))
+                            assert passage_checksums.check(doc_id, computed.digest()), (
+                                f"Expected {(passage_checksums.get(doc_id) or b'').hex()}, "
+                                f"got {computed.hexdigest()} "
+                                f"for passage {doc_id} in {filename}"
+                            )
                         yield IKatClueWeb22DocumentStore.Document(**data)
 
-        return __iter__
+                if future is not None:
+                    file_checksum = future.result()
+                    assert file_checksum == checksum, (
+                        f"Expected {checksum}, got {file_checksum} for {filename}"
+                    )
+                    manifest.add(filename, path / filename, file_checksum)
+        finally:
+            executor.shutdown(cancel_futures=True)
+
+
+class IKatClueWeb22DocumentStore(LZ4DocumentStore):
+    @staticmethod
+    def generator(
+        path: Path,
+        checksums_file: Path,
+        passages_hashes: Path,
+        *,
+        md5_sample_rate: float = 1.0,
+        checksum_workers: int = 4,
+    ) -> IKatDocuments:
+        """Returns an iterator factory over iKAT 2022-25 documents
+
+        :param path: The folder containing the files
+        :param md5_sample_rate: Fraction of passages whose MD5 is checked
+            (the sample is deterministic)
+        :param checksum_workers: Number of threads computing file checksums
+        """
+        return IKatDocuments(
+            path,
+            checksums_file,
+            passages_hashes,
+            md5_sample_rate=md5_sample_rate,
+            checksum_workers=checksum_workers,
+        )
+
+    @staticmethod
+    def _passage_hashes(passages_hashes: Path):
+        """Iterates over (passage ID, MD5 digest) pairs"""
+        logging.info("Reading the hashes of all passages")
+        with TQDMFileReader(passages_hashes, "rt", bz2.open) as fp:
+            for line in fp:
+                doc_id, passage_no, checksum = line.strip().split()
+                yield f"{doc_id}:{passage_no}", bytes.fromhex(checksum)  # noqa: E231
 
     class Document(NamedTuple):
         id: str
@@ -115,6 +218,7 @@ class IKatClueWeb22DocumentStore(LZ4DocumentStore):
         url: str
 
     data_cls = Document
+    text_fields = ("contents",)
     lookup_field: Constant[str] = "id"
     index_fields: Constant[List[str]] = ["id"]
 
@@ -122,3 +226,77 @@ class IKatClueWeb22DocumentStore(LZ4DocumentStore):
         return DocumentRecord(
             IDItem(data.id), SimpleTextItem(data.contents), UrlItem(data.url)
         )
+
+
+class CachedDocumentStore(DocumentStore):
+    """Keeps the most recently accessed documents of a store in memory
+
+    Documents retrieved by external ID (`document_ext` and `documents_ext`)
+    are kept in a LRU cache, so that popular documents (e.g. when sampling
+    negatives) are not decompressed and converted again. The cache can be
+    shared between threads, and the underlying store is called concurrently
+    (it must be thread-safe for that).
+    """
+
+    store: Param[DocumentStore]
+    """The document store"""
+
+    cache_size: Meta[int] = 2**16
+    """Maximum number of cached documents"""
+
+    def __post_init__(self):
+        self.cache = LRUCache(self.cache_size)
+
+    def statistics(self) -> CacheStatistics:
+        """Returns the cache hits, misses, evictions and size"""
+        return self.cache.statistics()
+
+    def document_ext(self, docid: str) -> DocumentRecord:
+        document = self.cache.get(docid)
+        if document is None:
+            document = self.store.document_ext(docid)
+            self.cache.put(docid, document)
+        return document
+
+    def documents_ext(self, docids: List[str]) -> List[DocumentRecord]:
+        documents = {}
+        missing = []
+        for docid in dict.fromkeys(docids):
+            if (document := self.cache.get(docid)) is None:
+                missing.append(docid)
+            else:
+                documents[docid] = document
+
+        if missing:
+            retrieved = self.store.documents_ext(missing)
+            for docid, document in zip(missing, retrieved):
+                self.cache.put(docid, document)
+                documents[docid] = document
+
+        return [documents[docid] for docid in docids]
+
+    def document_int(self, internal_docid: int) -> DocumentRecord:
+        return self.store.document_int(internal_docid)
+
+    def docid_internal2external(self, docid: int):
+        return self.store.docid_internal2external(docid)
+
+    def iter(self) -> Iterator[DocumentRecord]:
+        return self.store.iter()
+
+    def iter_documents_from(self, start=0) -> Iterator[DocumentRecord]:
+        return self.store.iter_documents_from(start)
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None):
+        return self.store.iter_range(start, stop)
+
+    def iter_ids(self) -> Iterator[str]:
+        return self.store.iter_ids()
+
+    @property
+    def documentcount(self):
+        return self.store.documentcount
+
+    @property
+    def document_recordtype(self):
+        return self.store.document_recordtype
@@ -0,0 +1,218 @@
+"""Columnar representation of topics"""
+
+import json
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from datamaestro_text.utils.files import cached_build
+
+
+class ColumnarTopics:
+    """Topics stored as NumPy arrays
+
+    Each field is stored as the concatenation of the UTF-8 encoded values
+    (`blobs`) and the start of each value (`offsets`, with one extra final
+    value). Fields whose values are not all strings are JSON-encoded (tuples,
+    or None, are supported as field values); other values (e.g. dates) are
+    rejected when the topics are built.
+
+    Topic IDs are also stored sorted (as UTF-8 bytes) so they can be looked
+    up by binary search; if an ID is duplicated, the last topic is used. The
+    arrays can be saved in a folder and loaded back memory-mapped, so they
+    are shared by forked processes.
+    """
+
+    #: Kinds of fields (how values are encoded)
+    STR, JSON, TUPLE = "str", "json", "tuple"
+
+    def __init__(
+        self,
+        fields: List[str],
+        kinds: List[str],
+        blobs: Dict[str, np.ndarray],
+        offsets: Dict[str, np.ndarray],
+        sorted_ids: np.ndarray,
+        sorted_index: np.ndarray,
+    ):
+        self.fields = fields
+        """Name of the fields (the first one is the topic ID)"""
+
+        self.kinds = kinds
+        """How each field is encoded"""
+
+        self.blobs = blobs
+        """Encoded values of each field (uint8)"""
+
+        self.offsets = offsets
+        """Start of each value (int64, with one extra final value)"""
+
+        self.sorted_ids = sorted_ids
+        """Sorted topic IDs (bytes)"""
+
+        self.sorted_index = sorted_index
+        """Index of each sorted topic ID"""
+
+    @staticmethod
+    def from_rows(fields: Sequence[str], rows: Iterable[tuple]) -> "ColumnarTopics":
+        """Builds the topics from rows (the first field is the topic ID)"""
+        columns = [[] for _ in fields]
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+
+        kinds, blobs, offsets = [], {}, {}
+        for field, values in zip(fields, columns):
+            if all(isinstance(value, str) for value in values):
+                kind = ColumnarTopics.STR
+                encoded = [value.encode("utf-8") for value in values]
+            else:
+                kind = (
+                    ColumnarTopics.TUPLE
+                    if all(isinstance(value, (tuple, type(None))) for value in values)
+                    else ColumnarTopics.JSON
+                )
+                encoded = [
+                    ColumnarTopics._encode_json(field, kind, value) for value in values
+                ]
+            kinds.append(kind)
+            blobs[field] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+            offsets[field] = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[field][1:])
+
+        ids = np.array(
+            [value.encode("utf-8") for value in columns[0]] if columns[0] else [],
+            dtype=bytes,
+        )
+        sorted_index = np.argsort(ids, kind="stable")
+        return ColumnarTopics(
+            list(fields), kinds, blobs, offsets, ids[sorted_index], sorted_index
+        )
+
+    def save(self, path: Path, **metadata):
+        """Saves the arrays into a new folder"""
+        path.mkdir(parents=True)
+        for ix, field in enumerate(self.fields):
+            np.save(path / f"{ix}.blob.npy", self.blobs[field])
+            np.save(path / f"{ix}.offsets.npy", self.offsets[field])
+        np.save(path / "sorted_ids.npy", self.sorted_ids)
+        np.save(path / "sorted_index.npy", self.sorted_index)
+
+        # Written last: marks the cache as complete
+        (path / "meta.json").write_text(
+            json.dumps({"fields": self.fields, "kinds": self.kinds, **metadata})
+        )
+
+    @staticmethod
+    def load(path: Path, **metadata) -> Optional["ColumnarTopics"]:
+        """Loads (memory-mapped) arrays from a folder
+
+        :param metadata: if given, the saved metadata should match
+        :return: The topics, or None if the folder is missing or stale
+        """
+        meta_path = path / "meta.json"
+        if not meta_path.is_file():
+            return None
+        saved = json.loads(meta_path.read_text())
+        fields, kinds = saved.pop("fields"), saved.pop("kinds")
+        if saved != metadata:
+            return None
+
+        def load(name: str):
+            return np.load(path / name, mmap_mode="r")
+
+        return ColumnarTopics(
+            fields,
+            kinds,
+            {field: load(f"{ix}.blob.npy") for ix, field in enumerate(fields)},
+            {field: load(f"{ix}.offsets.npy") for ix, field in enumerate(fields)},
+            load("sorted_ids.npy"),
+            load("sorted_index.npy"),
+        )
+
+    @staticmethod
+    def cached(
+        path: Path, build: Callable[[], "ColumnarTopics"], **metadata
+    ) -> "ColumnarTopics":
+        """Loads the topics from a cache folder, building it if needed
+
+        The folder is built by a single process (in a temporary folder, then
+        renamed), so loaded arrays are never modified. If it cannot be
+        written, the built topics are returned.
+
+        :param build: Builds the topics
+        :param metadata: The saved metadata should match
+        """
+        return cached_build(
+            path,
+            lambda cache_path: ColumnarTopics.load(cache_path, **metadata),
+            build,
+            lambda topics, cache_path: topics.save(cache_path, **metadata),
+        )
+
+    def __len__(self):
+        return len(self.sorted_ids)
+
+    def indices(self, topic_ids: List[str]) -> np.ndarray:
+        """Returns the index of each topic
+
+        :raises KeyError: if a topic does not exist
+        """
+        keys = [topic_id.encode("utf-8") for topic_id in topic_ids]
+        queries = np.array(keys, dtype=bytes)
+        # Duplicated IDs are sorted by position: the last topic is used
+        ix = np.searchsorted(self.sorted_ids, queries, side="right") - 1
+        found = ix >= 0
+        found[found] = self.sorted_ids[ix[found]] == queries[found]
+        for topic_id, key, ok in zip(topic_ids, keys, found.tolist()):
+            if not ok or len(key) > self.sorted_ids.itemsize:
+                raise KeyError(topic_id)
+        return self.sorted_index[ix]
+
+    def index(self, topic_id: str) -> int:
+        """Returns the index of a topic"""
+        return int(self.indices([topic_id])[0])
+
+    @staticmethod
+    def _encode_json(field: str, kind: str, value) -> bytes:
+        """JSON-encodes a value, checking that it is decoded as is
+
+        :raises TypeError: if the value cannot be stored
+        """
+        try:
+            encoded = json.dumps(value).encode("utf-8")
+        except (TypeError, ValueError):
+            encoded = None
+        if encoded is None or ColumnarTopics._decode(kind, encoded) != value:
+            raise TypeError(
+                f"Cannot store the value {value!r} ({type(value).__name__}) "
+                f"of the topic field {field}"
+            )
+        return encoded
+
+    @staticmethod
+    def _decode(kind: str, data) -> object:
+        value = bytes(data).decode("utf-8")
+        if kind == ColumnarTopics.STR:
+            return value
+        value = json.loads(value)
+        if kind == ColumnarTopics.TUPLE and value is not None:
+            return tuple(value)
+        return value
+
+    def row(self, ix: int) -> Tuple:
+        """Returns the values of the fields of a topic"""
+        values = []
+        for field, kind in zip(self.fields, self.kinds):
+            start, end = self.offsets[field][ix : ix + 2].tolist()
+            values.append(self._decode(kind, self.blobs[field][start:end]))
+        return tuple(values)
+
+    def column(self, field: str, indices: Sequence[int]) -> List:
+        """Returns the values of a field for the given topics"""
+        kind = self.kinds[self.fields.index(field)]
+        blob, offsets = self.blobs[field], self.offsets[field]
+        indices = np.asarray(indices, dtype=np.int64)
+        starts, ends = offsets[indices].tolist(), offsets[indices + 1].tolist()
+        return [self._decode(kind, blob[s:e]) for s, e in zip(starts, ends)]
@@ -1,29 +1,64 @@
 import re
-from typing import Dict, List, Optional
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
 from experimaestro import documentation, Param, Meta
 from pathlib import Path
 from datamaestro_text.data.ir import (
     AdhocRunDict,
     Documents,
-    Topics,
+    TopicsStore,
     AdhocAssessments,
     AdhocRun,
     AdhocResults,
     Measure,
 )
-from datamaestro_text.data.ir.formats import TrecTopicRecord
+from datamaestro_text.data.ir.base import IDItem
+from datamaestro_text.data.ir.formats import TrecTopic, TrecTopicRecord
+from datamaestro_text.data.ir.qrels import ColumnarAssessments
+from datamaestro_text.data.ir.runs import ColumnarAdhocRun
 
 
-class TrecTopics(Topics):
+class TrecTopics(TopicsStore):
+    """TREC topics
+
+    Topics are parsed once, and cached (as a JSON list) next to the file.
+    """
+
     path: Meta[Path]
     parts: Meta[List[str]]
 
+    @cached_property
+    def topics(self) -> List[Tuple[str, str, str, str]]:
+        """The (ID, title, description, narrative) of each topic"""
+        import datamaestro_text.interfaces.trec as trec
+
+        return trec.load_topics(self.path)
+
+    @cached_property
+    def topic_index(self) -> Dict[str, int]:
+        """Maps topic IDs to their index"""
+        return {fields[0]: ix for ix, fields in enumerate(self.topics)}
+
+    @staticmethod
+    def _record(fields: Tuple[str, str, str, str]) -> TrecTopicRecord:
+        topic_id, title, description, narrative = fields
+        return TrecTopicRecord(
+            IDItem(topic_id), TrecTopic(title, description, narrative)
+        )
+
     @documentation
     def iter(self):
         """Iterate over TREC adhoc topics"""
-        import datamaestro_text.interfaces.trec as trec
+        return map(TrecTopics._record, self.topics)
 
-        yield from trec.parse_query_format(self.path)
+    def count(self) -> int:
+        return len(self.topics)
+
+    def topic_int(self, internal_topic_id: int) -> TrecTopicRecord:
+        return TrecTopics._record(self.topics[internal_topic_id])
+
+    def topic_ext(self, external_topic_id: str) -> TrecTopicRecord:
+        return TrecTopics._record(self.topics[self.topic_index[external_topic_id]])
 
     @property
     def topic_recordtype(self):
@@ -36,18 +71,34 @@ class TrecAdhocAssessments(AdhocAssessments):
     def trecpath(self):
         return self.path
 
+    @cached_property
+    def assessments(self) -> ColumnarAssessments:
+        """Columnar assessments (cached in a binary format next to the file)"""
+        import datamaestro_text.interfaces.trec as trec
+
+        return trec.load_qrels(self.path)
+
     @documentation
     def iter(self):
         """Iterate over TREC adhoc topics"""
-        import datamaestro_text.interfaces.trec as trec
+        yield from self.assessments.iter()
 
-        yield from trec.parse_qrels(self.path)
+    def get(self, topic_id: str) -> Dict[str, int]:
+        """Returns the assessments (document ID -> relevance) of a topic"""
+        return self.assessments.get(topic_id)
+
+    def relevant_docs(self, topic_id: str, min_rel: int = 1) -> List[str]:
+        """Returns the IDs of documents with a relevance of at least `min_rel`"""
+        return self.assessments.relevant_docs(topic_id, min_rel)
 
 
 class TrecAdhocRun(AdhocRun):
     path: Param[Path]
 
     def get_dict(self) -> AdhocRunDict:
+        return self.get_run().to_dict()
+
+    def get_run(self) -> ColumnarAdhocRun:
         import datamaestro_text.interfaces.trec as trec
 
         return trec.parse_run(self.path)
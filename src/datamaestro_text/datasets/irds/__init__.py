@@ -28,5 +28,15 @@ class Repository(datamaestro.Repository):
         yield from self._modules
 
     def search(self, name: str):
+        if self._datasets is None:
+            from .datasets import create, load_snapshot, resolve, snapshot_path
+
+            entries = load_snapshot(snapshot_path(self))
+            if entries is not None:
+                self._modules, self._datasets = create(self, entries)
+            elif (dataset := resolve(self, name)) is not None:
+                # Avoids building the whole registry
+                return dataset
+
         self._check()
         return self._datasets.get(name, None)
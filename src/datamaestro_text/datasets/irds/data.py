@@ -1,21 +1,34 @@
 import logging
+import multiprocessing
+import weakref
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from functools import cached_property, partial
+from itertools import islice
+from operator import attrgetter
 from pathlib import Path
-from typing import Dict, Iterator, List, NamedTuple, Tuple, Type
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
 
-import ir_datasets
-import ir_datasets.datasets as _irds
 from datamaestro.record import RecordType, record_type
-from experimaestro import Config, Option, Param
-from ir_datasets.formats import (
-    GenericDoc,
-    GenericDocPair,
-    GenericQuery,
-    TrecParsedDoc,
-    TrecQuery,
-)
-from ir_datasets.indices import PickleLz4FullStore
+from experimaestro import Config, Meta, Option, Param
 
 import datamaestro_text.data.ir as ir
 import datamaestro_text.data.ir.formats as formats
@@ -29,6 +42,7 @@ from datamaestro_text.data.conversation.base import (
 )
 from datamaestro_text.data.ir.base import (
     AdhocAssessedTopic,
+    CompactRecordType,
     DocumentRecord,
     IDItem,
     Record,
@@ -38,9 +52,24 @@ from datamaestro_text.data.ir.base import (
     UrlItem,
     create_record,
 )
+from datamaestro_text.data.ir.topics import ColumnarTopics
+from datamaestro_text.datasets.irds.records import (
+    LZ4Records,
+    RawDocument,
+    raw_value,
+)
+from datamaestro_text.datasets.irds.utils import ClassRegistry
+from datamaestro_text.utils.aio import aiter_batches
+from datamaestro_text.utils.iter import BatchIterator
+
+if TYPE_CHECKING:
+    import ir_datasets.datasets as _irds
 
 # Interface between ir_datasets and datamaestro:
 # provides adapted data types
+#
+# ir_datasets (and its dataset modules) are only imported when used: converters
+# and handlers are registered by dotted class name
 
 
 class IRDSId(Config):
@@ -53,6 +82,8 @@ class IRDSId(Config):
 
     @cached_property
     def dataset(self):
+        import ir_datasets
+
         return ir_datasets.load(self.irds)
 
     def iter(self) -> Iterator[Record]:
@@ -85,11 +116,18 @@ class AdhocAssessments(ir.AdhocAssessments, IRDSId):
 
 
 class tuple_constructor:
+    """Converts ir_datasets named tuples into records (ID and target item)"""
+
     def __init__(self, target_cls: Type, id_field: str, *fields: str):
         self.id_field = id_field
         self.target_cls = target_cls
         self.fields = fields
 
+        # Field values are read with one (C) call
+        self._id = attrgetter(id_field)
+        getter = attrgetter(*fields)
+        self._values = getter if len(fields) > 1 else lambda entry: (getter(entry),)
+
     def check(self, source_cls: Type):
         source_fields = tuple(f for f in source_cls._fields if f != self.id_field)
         assert source_fields == self.fields, (
@@ -98,100 +136,142 @@ class tuple_constructor:
         )
 
     def __call__(self, recordtype, entry):
-        values = tuple(getattr(entry, key) for key in self.fields)
         return recordtype(
-            IDItem(getattr(entry, self.id_field)), self.target_cls(*values)
+            IDItem(self._id(entry)), self.target_cls(*self._values(entry))
+        )
+
+    def convert_batch(self, recordtype, entries: Sequence) -> List[Record]:
+        """Converts a batch of named tuples
+
+        Only the first record is validated against the record type: the
+        others (with the same items) are directly built from their items.
+        """
+        if not entries:
+            return []
+
+        records = [self(recordtype, entries[0])]
+        get_id, get_values, target_cls = self._id, self._values, self.target_cls
+        id_base, target_base = IDItem.__get_base__(), target_cls.__get_base__()
+        if isinstance(recordtype, CompactRecordType) and recordtype.bases == (
+            id_base,
+            target_base,
+        ):
+            create = recordtype.create
+            records.extend(
+                create((IDItem(get_id(entry)), target_cls(*get_values(entry))))
+                for entry in islice(entries, 1, None)
+            )
+            return records
+
+        records.extend(
+            Record(
+                {
+                    id_base: IDItem(get_id(entry)),
+                    target_base: target_cls(*get_values(entry)),
+                }
+            )
+            for entry in islice(entries, 1, None)
         )
+        return records
 
 
 class Documents(ir.DocumentStore, IRDSId):
-    CONVERTERS = {
-        GenericDoc: tuple_constructor(SimpleTextItem, "doc_id", "text"),
-        _irds.beir.BeirCordDoc: tuple_constructor(
-            formats.CordDocument, "doc_id", "text", "title", "url", "pubmed_id"
-        ),
-        _irds.miracl.MiraclDoc: tuple_constructor(
-            formats.DocumentWithTitle, "doc_id", "title", "text"
-        ),
-        _irds.beir.BeirTitleDoc: tuple_constructor(
-            formats.TitleDocument, "doc_id", "text", "title"
-        ),
-        _irds.beir.BeirTitleUrlDoc: tuple_constructor(
-            formats.TitleUrlDocument, "doc_id", "text", "title", "url"
-        ),
-        _irds.beir.BeirToucheDoc: tuple_constructor(
-            formats.Touche2020, "doc_id", "text", "title", "stance", "url"
-        ),
-        _irds.beir.BeirSciDoc: tuple_constructor(
-            formats.SciDocs,
-            "doc_id",
-            "text",
-            "title",
-            "authors",
-            "year",
-            "cited_by",
-            "references",
-        ),
-        _irds.msmarco_document.MsMarcoDocument: tuple_constructor(
-            formats.MsMarcoDocument, "doc_id", "url", "title", "body"
-        ),
-        _irds.cord19.Cord19FullTextDoc: tuple_constructor(
-            formats.CordFullTextDocument,
-            "doc_id",
-            "title",
-            "doi",
-            "date",
-            "abstract",
-            "body",
-        ),
-        _irds.nfcorpus.NfCorpusDoc: tuple_constructor(
-            formats.NFCorpusDocument, "doc_id", "url", "title", "abstract"
-        ),
-        TrecParsedDoc: tuple_constructor(
-            formats.TrecParsedDocument, "doc_id", "title", "body", "marked_up_doc"
-        ),
-        _irds.wapo.WapoDoc: tuple_constructor(
-            formats.WapoDocument,
-            "doc_id",
-            "url",
-            "title",
-            "author",
-            "published_date",
-            "kicker",
-            "body",
-            "body_paras_html",
-            "body_media",
-        ),
-        _irds.tweets2013_ia.TweetDoc: tuple_constructor(
-            formats.TweetDoc,
-            "doc_id",
-            "text",
-            "user_id",
-            "created_at",
-            "lang",
-            "reply_doc_id",
-            "retweet_doc_id",
-            "source",
-            "source_content_type",
-        ),
-        _irds.dpr_w100.DprW100Doc: tuple_constructor(
-            formats.DprW100Doc,
-            "doc_id",
-            "text",
-            "title",
-        ),
-        _irds.msmarco_passage_v2.MsMarcoV2Passage: tuple_constructor(
-            formats.MsMarcoV2Passage,
-            "doc_id",
-            "text",
-            "spans",
-            "msmarco_document_id",
-        ),
-    }
+    CONVERTERS = ClassRegistry(
+        {
+            "ir_datasets.formats.GenericDoc": tuple_constructor(
+                SimpleTextItem, "doc_id", "text"
+            ),
+            "ir_datasets.datasets.beir.BeirCordDoc": tuple_constructor(
+                formats.CordDocument, "doc_id", "text", "title", "url", "pubmed_id"
+            ),
+            "ir_datasets.datasets.miracl.MiraclDoc": tuple_constructor(
+                formats.DocumentWithTitle, "doc_id", "title", "text"
+            ),
+            "ir_datasets.datasets.beir.BeirTitleDoc": tuple_constructor(
+                formats.TitleDocument, "doc_id", "text", "title"
+            ),
+            "ir_datasets.datasets.beir.BeirTitleUrlDoc": tuple_constructor(
+                formats.TitleUrlDocument, "doc_id", "text", "title", "url"
+            ),
+            "ir_datasets.datasets.beir.BeirToucheDoc": tuple_constructor(
+                formats.Touche2020, "doc_id", "text", "title", "stance", "url"
+            ),
+            "ir_datasets.datasets.beir.BeirSciDoc": tuple_constructor(
+                formats.SciDocs,
+                "doc_id",
+                "text",
+                "title",
+                "authors",
+                "year",
+                "cited_by",
+                "references",
+            ),
+            "ir_datasets.datasets.msmarco_document.MsMarcoDocument": tuple_constructor(
+                formats.MsMarcoDocument, "doc_id", "url", "title", "body"
+            ),
+            "ir_datasets.datasets.cord19.Cord19FullTextDoc": tuple_constructor(
+                formats.CordFullTextDocument,
+                "doc_id",
+                "title",
+                "doi",
+                "date",
+                "abstract",
+                "body",
+            ),
+            "ir_datasets.datasets.nfcorpus.NfCorpusDoc": tuple_constructor(
+                formats.NFCorpusDocument, "doc_id", "url", "title", "abstract"
+            ),
+            "ir_datasets.formats.TrecParsedDoc": tuple_constructor(
+                formats.TrecParsedDocument, "doc_id", "title", "body", "marked_up_doc"
+            ),
+            "ir_datasets.datasets.wapo.WapoDoc": tuple_constructor(
+                formats.WapoDocument,
+                "doc_id",
+                "url",
+                "title",
+                "author",
+                "published_date",
+                "kicker",
+                "body",
+                "body_paras_html",
+                "body_media",
+            ),
+            "ir_datasets.datasets.tweets2013_ia.TweetDoc": tuple_constructor(
+                formats.TweetDoc,
+                "doc_id",
+                "text",
+                "user_id",
+                "created_at",
+                "lang",
+                "reply_doc_id",
+                "retweet_doc_id",
+                "source",
+                "source_content_type",
+            ),
+            "ir_datasets.datasets.dpr_w100.DprW100Doc": tuple_constructor(
+                formats.DprW100Doc,
+                "doc_id",
+                "text",
+                "title",
+            ),
+            "ir_datasets.datasets.msmarco_passage_v2.MsMarcoV2Passage": tuple_constructor(
+                formats.MsMarcoV2Passage,
+                "doc_id",
+                "text",
+                "spans",
+                "msmarco_document_id",
+            ),
+        }
+    )
 
     """Wraps an ir datasets collection -- and provide a default text
     value depending on the collection itself"""
 
+    compact_records: Meta[bool] = False
+    """Returns compact records (items stored in a tuple, see
+    :py:class:`~datamaestro_text.data.ir.base.CompactRecord`), which use
+    less memory"""
+
     # List of fields
     # self.dataset.docs_cls()._fields
 
@@ -201,14 +281,69 @@ class Documents(ir.DocumentStore, IRDSId):
     def __setstate__(self, state):
         self.id, self.irds = state
 
+    #: Number of documents converted at once when iterating
+    BATCH_SIZE = 1024
+
     def iter(self) -> Iterator[ir.DocumentRecord]:
         """Returns an iterator over adhoc documents"""
-        for doc in self._docs:
-            yield self.converter(self.document_recordtype, doc)
+        return self._convert(self._docs)
 
     def iter_documents_from(self, start=0):
-        for doc in self._docs[start:]:
-            yield self.converter(self.document_recordtype, doc)
+        return self._convert(self._docs[start:])
+
+    def iter_range(self, start: int = 0, stop: Optional[int] = None):
+        """Iterates over a range of documents (uses ir_datasets slicing)"""
+        return self._convert(self._docs[start:stop])
+
+    def _convert(self, docs) -> Iterator[ir.DocumentRecord]:
+        for batch in self._convert_batches(docs, self.BATCH_SIZE):
+            yield from batch
+
+    def _convert_batches(self, docs, size: int) -> Iterator[List[DocumentRecord]]:
+        converter, recordtype = self.converter, self.document_recordtype
+        for batch in BatchIterator(iter(docs), size):
+            yield converter.convert_batch(recordtype, batch)
+
+    def iter_batches(self, size: int) -> Iterator[List[ir.DocumentRecord]]:
+        """Iterates over batches of documents (converted at once)"""
+        return self._convert_batches(self._docs, size)
+
+    def iter_columns(
+        self, size: int, fields: Optional[List[str]] = None
+    ) -> Iterator[Dict[str, List]]:
+        """Iterates over batches of documents as columns
+
+        No record is created: for each field (all the ir_datasets document
+        fields by default), the list of values is returned.
+        """
+        names = self.dataset.docs_cls()._fields
+        indices = [names.index(field) for field in fields or names]
+        for batch in BatchIterator(iter(self._docs), size):
+            columns = list(zip(*batch))
+            yield {names[ix]: list(columns[ix]) for ix in indices}
+
+    def iter_ids(self) -> Iterator[str]:
+        """Iterates over document IDs
+
+        For LZ4 stores, IDs are read from the lookup index; otherwise, the raw
+        documents are iterated over (without conversion)
+        """
+        from ir_datasets.indices import PickleLz4FullStore
+
+        from .helpers import lz4docstore_ids
+
+        store = self.store
+        if isinstance(store, PickleLz4FullStore):
+            store.build()
+            ids = lz4docstore_ids(
+                Path(store.path),
+                store._id_field,
+                key_field_prefix=store.lookup._key_field_prefix,
+            )
+            if ids is not None:
+                return ids
+
+        return (doc.doc_id for doc in self._docs)
 
     @property
     def documentcount(self):
@@ -246,16 +381,89 @@ class Documents(ir.DocumentStore, IRDSId):
     def documents_ext(self, docids: List[str]) -> DocumentRecord:
         """Returns documents given their external IDs (optimized for batch)"""
         retrieved = self.store.get_many(docids)
-        return [
-            self.converter(self.document_recordtype, retrieved[docid])
-            for docid in docids
-        ]
+        return self.converter.convert_batch(
+            self.document_recordtype, [retrieved[docid] for docid in docids]
+        )
 
     def document_int(self, ix):
         return self.converter(self.document_recordtype, self._docs[ix])
 
+    #: Record fields returned (with the ID) by raw methods, when present
+    TEXT_FIELDS = ("title", "text", "body", "abstract", "contents")
+
+    @cached_property
+    def text_fields(self) -> Tuple[str, ...]:
+        """Fields returned (with the ID) by raw methods"""
+        return tuple(
+            field
+            for field in self.dataset.docs_cls()._fields
+            if field in Documents.TEXT_FIELDS
+        )
+
+    @cached_property
+    def _records(self) -> Optional[LZ4Records]:
+        """Direct access to the records of LZ4 stores"""
+        from ir_datasets.indices import PickleLz4FullStore
+
+        store = self.store
+        if not isinstance(store, PickleLz4FullStore):
+            return None
+
+        store.build()
+        records = LZ4Records(
+            Path(store.path),
+            self.dataset.docs_cls(),
+            store._id_field,
+            key_field_prefix=store.lookup._key_field_prefix,
+        )
+        return records if records.index is not None else None
+
+    def _raw(self, doc) -> RawDocument:
+        return tuple(raw_value(getattr(doc, f)) for f in ("doc_id", *self.text_fields))
+
+    def documents_ext_raw(self, docids: List[str]) -> List[RawDocument]:
+        """Returns documents as memory views over their UTF-8 ID and text
+        fields (`text_fields`)
+
+        For LZ4 stores, records are decompressed but not unpickled (the views
+        point into the decompressed records); otherwise, fields are encoded.
+        """
+        if (records := self._records) is not None:
+            raw_fields = records.field_indices(self.text_fields)
+            retrieved = records.lookup(docids, raw_fields=raw_fields)
+        else:
+            retrieved = {
+                docid: self._raw(doc)
+                for docid, doc in self.store.get_many(docids).items()
+            }
+        return [retrieved[docid] for docid in docids]
+
+    def iter_raw(self, batch_size: int = 1024) -> Iterator[RawDocument]:
+        """Iterates over documents as memory views (see `documents_ext_raw`)"""
+        if (records := self._records) is None:
+            yield from map(self._raw, self._docs)
+            return
+
+        raw_fields = records.field_indices(self.text_fields)
+        for start in range(0, len(records), batch_size):
+            stop = min(start + batch_size, len(records))
+            yield from records.read_range(start, stop, raw_fields)
+
+    async def aiter(self, batch_size: int = 1024) -> AsyncIterator[DocumentRecord]:
+        """Asynchronously iterates over documents (batches are sliced with
+        ir_datasets in a background thread, since stores are not thread-safe)"""
+        batches = (
+            partial(list, self.iter_range(start, start + batch_size))
+            for start in range(0, self.documentcount, batch_size)
+        )
+        with ThreadPoolExecutor(1) as executor:
+            async for document in aiter_batches(batches, executor=executor):
+                yield document
+
     @cached_property
     def document_recordtype(self):
+        if self.compact_records:
+            return CompactRecordType(IDItem, self.converter.target_cls)
         return record_type(IDItem, self.converter.target_cls)
 
     @cached_property
@@ -265,6 +473,25 @@ class Documents(ir.DocumentStore, IRDSId):
         return converter
 
 
+#: Document store used by a worker process (see `LZ4DocumentStore.iter`)
+_WORKER_STORE = None
+
+
+def _init_iter_worker(store: "LZ4DocumentStore"):
+    global _WORKER_STORE
+    # Do not share the (forked) file handles of the parent process
+    store.__dict__.pop("store", None)
+    store.__dict__.pop("_docs", None)
+    store.__dict__.pop("_records", None)
+    store.__dict__.pop("_lookup_executor", None)
+    _WORKER_STORE = store
+
+
+def _convert_range(start: int, stop: int) -> List[DocumentRecord]:
+    """Decompresses and converts a range of documents (in a worker process)"""
+    return list(_WORKER_STORE.iter_range(start, stop))
+
+
 class LZ4DocumentStore(ir.DocumentStore, ABC):
     """A LZ4-based document store"""
 
@@ -276,8 +503,16 @@ class LZ4DocumentStore(ir.DocumentStore, ABC):
     # Extra indexed fields (e.g. URLs)
     index_fields: List[str] = []
 
+    #: Number of threads used to decompress documents in `documents_ext`
+    lookup_threads: Meta[int] = 4
+
+    #: Fields returned (with the ID) by raw methods
+    text_fields: ClassVar[Tuple[str, ...]] = ("text",)
+
     @cached_property
     def store(self):
+        from ir_datasets.indices import PickleLz4FullStore
+
         return PickleLz4FullStore(
             self.path, None, self.data_cls, self.lookup_field, self.index_fields
         )
@@ -293,22 +528,158 @@ class LZ4DocumentStore(ir.DocumentStore, ABC):
         return self.converter(self.store.get(docid))
 
     def documents_ext(self, docids: List[str]) -> DocumentRecord:
-        """Returns documents given their external IDs (optimized for batch)"""
-        retrieved = self.store.get_many(docids)
-        return [self.converter(retrieved[docid]) for docid in docids]
+        """Returns documents given their external IDs (optimized for batch)
+
+        Records are located with the (memory-mapped) lookup index, and read
+        by increasing position: records that are close on disk are read at
+        once, and groups of records are decompressed in `lookup_threads`
+        threads (LZ4 releases the GIL). Each distinct document is converted
+        once.
+        """
+        if self._records.index is None:
+            retrieved = self.store.get_many(docids)
+            return [self.converter(retrieved[docid]) for docid in docids]
+
+        retrieved = self._records.lookup(
+            docids,
+            self.converter,
+            executor=self._lookup_executor,
+            max_tasks=self.lookup_threads,
+        )
+        return [retrieved[docid] for docid in docids]
+
+    def documents_ext_raw(self, docids: List[str]) -> List[RawDocument]:
+        """Returns documents as memory views over their UTF-8 ID and text
+        fields (`text_fields`)
+
+        Records are decompressed but not unpickled: the views point into the
+        decompressed records, so no string is created.
+        """
+        raw_fields = self._records.field_indices(self.text_fields)
+        if self._records.index is None:
+            retrieved = self.store.get_many(docids)
+            return [
+                tuple(raw_value(retrieved[docid][ix]) for ix in raw_fields)
+                for docid in docids
+            ]
+
+        retrieved = self._records.lookup(
+            docids,
+            raw_fields=raw_fields,
+            executor=self._lookup_executor,
+            max_tasks=self.lookup_threads,
+        )
+        return [retrieved[docid] for docid in docids]
+
+    def iter_raw(self, batch_size: int = 1024) -> Iterator[RawDocument]:
+        """Iterates over documents as memory views (see `documents_ext_raw`)"""
+        raw_fields = self._records.field_indices(self.text_fields)
+        for start in range(0, len(self._records), batch_size):
+            stop = min(start + batch_size, len(self._records))
+            yield from self._records.read_range(start, stop, raw_fields)
+
+    def _async_concurrency(self) -> int:
+        # Records are read with os.pread, so lookups are thread-safe
+        return self.lookup_threads if self._records.index is not None else 1
+
+    async def aiter(self, batch_size: int = 1024) -> AsyncIterator[DocumentRecord]:
+        """Asynchronously iterates over documents
+
+        Ranges of records are read (with os.pread) and converted in the
+        lookup threads, up to `lookup_threads` batches ahead of the consumer.
+        """
+        count = len(self._records)
+        batches = (
+            partial(self._read_range, start, min(start + batch_size, count))
+            for start in range(0, count, batch_size)
+        )
+        async for document in aiter_batches(
+            batches, prefetch=self.lookup_threads, executor=self._lookup_executor
+        ):
+            yield document
+
+    def _read_range(self, start: int, stop: int) -> List[DocumentRecord]:
+        """Reads and converts the documents between two internal IDs"""
+        return list(map(self.converter, self._records.read_range(start, stop)))
+
+    @cached_property
+    def _records(self) -> LZ4Records:
+        return LZ4Records(self.path, self.data_cls, self.lookup_field)
+
+    @cached_property
+    def _lookup_executor(self) -> ThreadPoolExecutor:
+        executor = ThreadPoolExecutor(self.lookup_threads)
+        weakref.finalize(self, executor.shutdown, wait=False)
+        return executor
 
     @abstractmethod
     def converter(self, data):
         """Converts a document from LZ4 tuples to a document record"""
         ...
 
-    def iter(self) -> Iterator[DocumentRecord]:
-        """Returns an iterator over documents"""
-        return map(self.converter, self.store.__iter__())
+    def iter(
+        self, parallel: int = 0, ordered: bool = True, batch_size: int = 1024
+    ) -> Iterator[DocumentRecord]:
+        """Returns an iterator over documents
+
+        :param parallel: If greater than 1, the number of processes that
+            decompress and convert documents (by batches)
+        :param ordered: When parallel, whether documents should be returned
+            in the store order
+        :param batch_size: Number of documents processed at once by a process
+        """
+        if parallel < 2:
+            return map(self.converter, self.store.__iter__())
+        return self._parallel_iter(parallel, ordered, batch_size)
+
+    def _parallel_iter(self, parallel: int, ordered: bool, batch_size: int):
+        count = self.store.count()
+        ranges = (
+            (start, min(start + batch_size, count))
+            for start in range(0, count, batch_size)
+        )
+
+        # Fork so that the store (and its converter) needs not be pickled
+        with ProcessPoolExecutor(
+            parallel,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_iter_worker,
+            initargs=(self,),
+        ) as executor:
+            # Limits the number of batches in memory
+            pending = deque(
+                executor.submit(_convert_range, *r)
+                for r in islice(ranges, 2 * parallel)
+            )
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+
+                for future in done:
+                    yield from future.result()
+                    if (r := next(ranges, None)) is not None:
+                        pending.append(executor.submit(_convert_range, *r))
 
     def iter_documents_from(self, start=0):
         return map(self.converter, self.store.__iter__()[start:])
 
+    def iter_range(self, start: int = 0, stop: Optional[int] = None):
+        """Iterates over a range of documents (only reading their records)"""
+        return map(self.converter, self.store.__iter__()[start:stop])
+
+    def iter_ids(self) -> Iterator[str]:
+        """Iterates over document IDs (read from the lookup index, without
+        decompressing documents)"""
+        from .helpers import lz4docstore_ids
+
+        if (ids := lz4docstore_ids(self.path, self.lookup_field)) is not None:
+            return ids
+        return (getattr(doc, self.lookup_field) for doc in self.store.__iter__())
+
     @cached_property
     def documentcount(self):
         if self.count:
@@ -345,6 +716,16 @@ class TopicsHandler(ABC):
         """Returns a document given its external ID"""
         ...
 
+    def topics_ext(self, external_topic_ids: List[str]) -> List[TopicRecord]:
+        """Returns topics given their external IDs"""
+        return [self.topic_ext(topic_id) for topic_id in external_topic_ids]
+
+    def columns_ext(
+        self, external_topic_ids: List[str], fields: Optional[List[str]] = None
+    ) -> Dict[str, List]:
+        """Returns the (raw) fields of topics given their external IDs"""
+        raise NotImplementedError(f"columns_ext() in {self.__class__}")
+
     @abstractmethod
     def iter(self) -> Iterator[TopicRecord]:
         """Returns an iterator over topics"""
@@ -352,91 +733,146 @@ class TopicsHandler(ABC):
 
 
 class SimpleTopicsHandler(TopicsHandler):
+    """Topics handler based on columnar topics
+
+    The topics are read once from ir_datasets, and stored (memory-mapped)
+    in the datamaestro cache folder: records are only created when topics
+    are accessed.
+    """
+
+    #: Version of the cached topics format
+    CACHE_VERSION = 1
+
     def __init__(self, converter, topics: "Topics"):
         self.converter = converter
         self._topics = topics
         self.target_cls = converter.target_cls
-        converter.check(topics.dataset.queries_cls())
+        self.queries_cls = topics.dataset.queries_cls()
+        converter.check(self.queries_cls)
 
     def topic_int(self, internal_topic_id: int) -> TopicRecord:
         """Returns a document given its internal ID"""
-        return self.topics_list[internal_topic_id]
+        return self._record(internal_topic_id)
 
-    def topic_ext(self, external_topic_id: int) -> TopicRecord:
+    def topic_ext(self, external_topic_id: str) -> TopicRecord:
         """Returns a document given its external ID"""
-        return self.topics_map[external_topic_id]
+        return self._record(self.columns.index(external_topic_id))
+
+    def topics_ext(self, external_topic_ids: List[str]) -> List[TopicRecord]:
+        """Returns topics given their external IDs (looked up at once)"""
+        return [
+            self._record(ix) for ix in self.columns.indices(external_topic_ids).tolist()
+        ]
+
+    def columns_ext(
+        self, external_topic_ids: List[str], fields: Optional[List[str]] = None
+    ) -> Dict[str, List]:
+        """Returns the fields of topics given their external IDs
+
+        No record is created: for each field (all the ir_datasets query
+        fields by default), the list of values is returned.
+        """
+        indices = self.columns.indices(external_topic_ids)
+        return {
+            field: self.columns.column(field, indices)
+            for field in fields or self.columns.fields
+        }
 
     def iter(self) -> Iterator[TopicRecord]:
         """Returns an iterator over topics"""
-        yield from self.topics_list
+        return map(self._record, range(len(self.columns)))
 
-    @cached_property
-    def topics_map(self):
-        return self.topics[0]
+    def _record(self, ix: int) -> TopicRecord:
+        query = self.queries_cls(*self.columns.row(ix))
+        return self.converter(self._topics.topic_recordtype, query)
 
     @cached_property
-    def topics_list(self):
-        return self.topics[1]
+    def columns(self) -> ColumnarTopics:
+        """The columnar topics (built on first access)"""
+        import ir_datasets
+        from datamaestro import Context
+
+        irds_id = self._topics.irds
+        metadata = {
+            "irds": irds_id,
+            "ir_datasets": ir_datasets.__version__,
+            "version": SimpleTopicsHandler.CACHE_VERSION,
+        }
+        name = "".join(c if c.isalnum() or c in "-_." else "_" for c in irds_id)
+        path = Context.instance().cachepath / "irds" / "topics" / name
+
+        return ColumnarTopics.cached(
+            path,
+            lambda: ColumnarTopics.from_rows(
+                self.queries_cls._fields, self._topics.dataset.queries_iter()
+            ),
+            **metadata,
+        )
 
     @cached_property
-    def topics(self):
-        topic_map = {}
-        topic_list = []
-        for query in self._topics.dataset.queries_iter():
-            record = self.converter(self._topics.topic_recordtype, query)
-            topic_map[query.query_id] = record
-            topic_list.append(record)
+    def topics_map(self) -> Dict[str, TopicRecord]:
+        """All the topics, by ID (creates all the records)"""
+        return {record[IDItem].id: record for record in self.topics_list}
 
-        return topic_map, topic_list
+    @cached_property
+    def topics_list(self) -> List[TopicRecord]:
+        """All the topics (creates all the records)"""
+        return list(self.iter())
 
 
 class Topics(ir.TopicsStore, IRDSId):
-    CONVERTERS = {
-        GenericQuery: tuple_constructor(SimpleTextItem, "query_id", "text"),
-        _irds.beir.BeirCovidQuery: tuple_constructor(
-            formats.TrecTopic, "query_id", "text", "query", "narrative"
-        ),
-        _irds.beir.BeirUrlQuery: tuple_constructor(
-            formats.UrlTopic, "query_id", "text", "url"
-        ),
-        _irds.nfcorpus.NfCorpusQuery: tuple_constructor(
-            formats.NFCorpusTopic, "query_id", "title", "all"
-        ),
-        TrecQuery: tuple_constructor(
-            formats.TrecTopic, "query_id", "title", "description", "narrative"
-        ),
-        _irds.beir.BeirToucheQuery: tuple_constructor(
-            formats.TrecTopic, "query_id", "text", "description", "narrative"
-        ),
-        _irds.beir.BeirSciQuery: tuple_constructor(
-            formats.SciDocsTopic,
-            "query_id",
-            "text",
-            "authors",
-            "year",
-            "cited_by",
-            "references",
-        ),
-        _irds.tweets2013_ia.TrecMb13Query: tuple_constructor(
-            formats.TrecMb13Query, "query_id", "query", "time", "tweet_time"
-        ),
-        _irds.tweets2013_ia.TrecMb14Query: tuple_constructor(
-            formats.TrecMb14Query,
-            "query_id",
-            "query",
-            "time",
-            "tweet_time",
-            "description",
-        ),
-        _irds.dpr_w100.DprW100Query: tuple_constructor(
-            formats.DprW100Query, "query_id", "text", "answers"
-        ),
-    }
-
-    HANDLERS = {
-        cls: partial(SimpleTopicsHandler, converter)
-        for cls, converter in CONVERTERS.items()
-    }
+    CONVERTERS = ClassRegistry(
+        {
+            "ir_datasets.formats.GenericQuery": tuple_constructor(
+                SimpleTextItem, "query_id", "text"
+            ),
+            "ir_datasets.datasets.beir.BeirCovidQuery": tuple_constructor(
+                formats.TrecTopic, "query_id", "text", "query", "narrative"
+            ),
+            "ir_datasets.datasets.beir.BeirUrlQuery": tuple_constructor(
+                formats.UrlTopic, "query_id", "text", "url"
+            ),
+            "ir_datasets.datasets.nfcorpus.NfCorpusQuery": tuple_constructor(
+                formats.NFCorpusTopic, "query_id", "title", "all"
+            ),
+            "ir_datasets.formats.TrecQuery": tuple_constructor(
+                formats.TrecTopic, "query_id", "title", "description", "narrative"
+            ),
+            "ir_datasets.datasets.beir.BeirToucheQuery": tuple_constructor(
+                formats.TrecTopic, "query_id", "text", "description", "narrative"
+            ),
+            "ir_datasets.datasets.beir.BeirSciQuery": tuple_constructor(
+                formats.SciDocsTopic,
+                "query_id",
+                "text",
+                "authors",
+                "year",
+                "cited_by",
+                "references",
+            ),
+            "ir_datasets.datasets.tweets2013_ia.TrecMb13Query": tuple_constructor(
+                formats.TrecMb13Query, "query_id", "query", "time", "tweet_time"
+            ),
+            "ir_datasets.datasets.tweets2013_ia.TrecMb14Query": tuple_constructor(
+                formats.TrecMb14Query,
+                "query_id",
+                "query",
+                "time",
+                "tweet_time",
+                "description",
+            ),
+            "ir_datasets.datasets.dpr_w100.DprW100Query": tuple_constructor(
+                formats.DprW100Query, "query_id", "text", "answers"
+            ),
+        }
+    )
+
+    HANDLERS = ClassRegistry(
+        {
+            name: partial(SimpleTopicsHandler, converter)
+            for name, converter in CONVERTERS.items()
+        }
+    )
 
     def count(self):
         return self.dataset.queries_count()
@@ -458,6 +894,17 @@ class Topics(ir.TopicsStore, IRDSId):
         """Returns a document given its external ID"""
         return self.handler.topic_ext(external_topic_id)
 
+    def topics_ext(self, external_topic_ids: List[str]) -> List[TopicRecord]:
+        """Returns topics given their external IDs"""
+        return self.handler.topics_ext(external_topic_ids)
+
+    def columns_ext(
+        self, external_topic_ids: List[str], fields: Optional[List[str]] = None
+    ) -> Dict[str, List]:
+        """Returns the (raw) fields of topics given their external IDs, as
+        one list of values per field"""
+        return self.handler.columns_ext(external_topic_ids, fields)
+
     def iter(self) -> Iterator[TopicRecord]:
         """Returns an iterator over topics"""
         return self.handler.iter()
@@ -506,7 +953,11 @@ class TrecBackgroundLinkingTopicsHandler(TopicsHandler):
 
 
 Topics.HANDLERS.update(
-    {_irds.wapo.TrecBackgroundLinkingQuery: TrecBackgroundLinkingTopicsHandler}
+    {
+        "ir_datasets.datasets.wapo.TrecBackgroundLinkingQuery": (
+            TrecBackgroundLinkingTopicsHandler
+        )
+    }
 )
 
 
@@ -591,13 +1042,13 @@ class CastTopicsHandler(TopicsHandler):
 
 class Cast2020TopicsHandler(CastTopicsHandler):
     @staticmethod
-    def get_canonical_result_id(query: _irds.trec_cast.Cast2020Query):
+    def get_canonical_result_id(query: "_irds.trec_cast.Cast2020Query"):
         return query.manual_canonical_result_id
 
 
 class Cast2021TopicsHandler(CastTopicsHandler):
     @staticmethod
-    def get_canonical_result_id(query: _irds.trec_cast.Cast2021Query):
+    def get_canonical_result_id(query: "_irds.trec_cast.Cast2021Query"):
         return query.canonical_result_id
 
 
@@ -652,22 +1103,24 @@ class Cast2022TopicsHandler(CastTopicsHandler):
 Topics.HANDLERS.update(
     {
         # _irds.trec_cast.Cast2019Query: Cast2019TopicsHandler,
-        _irds.trec_cast.Cast2020Query: Cast2020TopicsHandler,
-        _irds.trec_cast.Cast2021Query: Cast2021TopicsHandler,
-        _irds.trec_cast.Cast2022Query: Cast2022TopicsHandler,
+        "ir_datasets.datasets.trec_cast.Cast2020Query": Cast2020TopicsHandler,
+        "ir_datasets.datasets.trec_cast.Cast2021Query": Cast2021TopicsHandler,
+        "ir_datasets.datasets.trec_cast.Cast2022Query": Cast2022TopicsHandler,
     }
 )
 
 
 class CastDocHandler:
     def check(self, cls):
-        assert issubclass(cls, _irds.trec_cast.CastDoc)
+        from ir_datasets.datasets.trec_cast import CastDoc
+
+        assert issubclass(cls, CastDoc)
 
     @cached_property
     def target_cls(self):
         return formats.TitleUrlDocument
 
-    def __call__(self, _, doc: _irds.trec_cast.CastDoc):
+    def __call__(self, _, doc: "_irds.trec_cast.CastDoc"):
         return Record(
             IDItem(doc.doc_id), formats.SimpleTextItem(" ".join(doc.passages))
         )
@@ -675,21 +1128,25 @@ class CastDocHandler:
 
 class CastPassageDocHandler:
     def check(self, cls):
-        assert issubclass(cls, _irds.trec_cast.CastPassageDoc)
+        from ir_datasets.datasets.trec_cast import CastPassageDoc
+
+        assert issubclass(cls, CastPassageDoc)
 
     @cached_property
     def target_cls(self):
         return formats.TitleUrlDocument
 
-    def __call__(self, _, doc: _irds.trec_cast.CastPassageDoc):
+    def __call__(self, _, doc: "_irds.trec_cast.CastPassageDoc"):
         return Record(
             IDItem(doc.doc_id),
             formats.TitleUrlDocument(doc.text, doc.title, doc.url),
         )
 
 
-Documents.CONVERTERS[_irds.trec_cast.CastDoc] = CastDocHandler()
-Documents.CONVERTERS[_irds.trec_cast.CastPassageDoc] = CastPassageDocHandler()
+Documents.CONVERTERS["ir_datasets.datasets.trec_cast.CastDoc"] = CastDocHandler()
+Documents.CONVERTERS["ir_datasets.datasets.trec_cast.CastPassageDoc"] = (
+    CastPassageDocHandler()
+)
 
 
 class Adhoc(ir.Adhoc, IRDSId):
@@ -703,13 +1160,15 @@ class AdhocRun(ir.AdhocRun, IRDSId):
 class TrainingTriplets(ir.TrainingTriplets, IRDSId):
     """Training triplets from IR Dataset"""
 
-    CONVERTERS = {
-        GenericDocPair: lambda qid, doc1_id, doc2_id: (
-            create_record(id=qid),
-            create_record(id=doc1_id),
-            create_record(id=doc2_id),
-        )
-    }
+    CONVERTERS = ClassRegistry(
+        {
+            "ir_datasets.formats.GenericDocPair": lambda qid, doc1_id, doc2_id: (
+                create_record(id=qid),
+                create_record(id=doc1_id),
+                create_record(id=doc2_id),
+            )
+        }
+    )
 
     @cached_property
     def topic_recordtype(self) -> RecordType:
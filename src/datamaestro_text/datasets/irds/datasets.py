@@ -1,6 +1,11 @@
 from contextlib import contextmanager
+from functools import cached_property
+import json
+import logging
 import os
-from typing import Iterable
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import ir_datasets
 from ir_datasets import registry, corpus_id, load
 
 from datamaestro.definitions import AbstractDataset
@@ -19,14 +24,20 @@ class Dataset(AbstractDataset):
     SUFFIX = ""
     __configtype__ = None
 
-    def __init__(self, repository, irds_id, irds_ds):
+    def __init__(self, repository, irds_id, description: Optional[str] = None):
         super().__init__(repository)
         self.id = (
             f"""irds.{irds_id.replace("/", ".")}"""
             f"""{"." + self.SUFFIX if self.SUFFIX else ""}"""
         )
         self.irds_id = irds_id
-        self.irds_ds = irds_ds
+        self._description = description
+
+    @cached_property
+    def irds_ds(self):
+        """The ir_datasets dataset (loaded on first access)"""
+        with no_deprecated_warnings():
+            return load(self.irds_id)
 
     @property
     def fullid(self):
@@ -34,7 +45,9 @@ class Dataset(AbstractDataset):
 
     @property
     def description(self):
-        return self.irds_ds.documentation().get("desc", "")
+        if self._description is None:
+            self._description = self.irds_ds.documentation().get("desc", "")
+        return self._description
 
     def hasfiles(self):
         return False
@@ -160,8 +173,50 @@ def no_deprecated_warnings():
     os.environ[IRDS_NO_WARNING_KEY] = old
 
 
-def build(repository):
-    """Builds a datamaestro repository by using ir_datasets registry"""
+#: Version of the registry snapshot format
+SNAPSHOT_VERSION = 1
+
+#: Dataset classes associated with each part of an ir_datasets dataset
+PARTS = {
+    "queries": QueriesDataset,
+    "docpairs": TrainingTripletsDataset,
+    "scoreddocs": AdhocRunDataset,
+    "qrels": QrelsDataset,
+}
+
+
+def describe(dataset_id: str) -> Optional[Dict]:
+    """Describes an ir_datasets dataset (or returns None if it is skipped)
+
+    The description is a plain dictionary, so that it can be serialized.
+    """
+    ds = registry[dataset_id]
+
+    # Skip deprecated datasets
+    if hasattr(ds, "deprecated"):
+        return None
+
+    if not ds.has_docs():
+        # Abstract dataset
+        return None
+
+    documentation = ds.documentation()
+    return {
+        "id": dataset_id,
+        "corpus": corpus_id(dataset_id),
+        "title": documentation.get("pretty_name", dataset_id),
+        "description": documentation.get("desc", ""),
+        "parts": [part for part in PARTS if getattr(ds, f"has_{part}")()],
+    }
+
+
+def create(repository, entries: List[Dict]):
+    """Creates the datamaestro datasets from dataset descriptions
+
+    :param entries: The dataset descriptions (see `describe`); the corpus of a
+        dataset must be described before it
+    :return: A tuple (modules, datasets by ID)
+    """
     datasets = {}
     bykey = {}
 
@@ -169,52 +224,115 @@ def build(repository):
         datasets[cid].datasets.append(ds)
         bykey[ds.id] = ds
 
-    with no_deprecated_warnings():
-        for dataset_id in registry:
-            ds = load(dataset_id)
+    for entry in entries:
+        dataset_id, cid = entry["id"], entry["corpus"]
+        description = entry["description"]
 
-            # Skip deprecated datasets
-            if hasattr(ds, "deprecated"):
-                continue
+        if cid == dataset_id:
+            # If the corpus ID is the current dataset ID
+            datasets[cid] = Datasets(cid, entry["title"], description)
+            add(cid, DocumentsDataset(repository, dataset_id, description))
+
+        if cid not in datasets:
+            logging.warning("Corpus %s of %s is not described", cid, dataset_id)
+            continue
+
+        parts = {
+            part: PARTS[part](repository, dataset_id, description)
+            for part in entry["parts"]
+        }
+        for ds in parts.values():
+            add(cid, ds)
 
-            if not ds.has_docs():
-                # Abstract dataset
+        if "qrels" in parts and "queries" in parts:
+            collection = Collection(repository, dataset_id, description)
+            collection.documents = datasets[cid].datasets[0]
+            collection.topics = parts["queries"]
+            collection.assessments = parts["qrels"]
+
+            add(cid, collection)
+
+    return list(datasets.values()), bykey
+
+
+def snapshot_path(repository) -> Path:
+    """Path of the registry snapshot (depends on the ir_datasets version)"""
+    return (
+        repository.context.cachepath
+        / "irds"
+        / f"registry-{ir_datasets.__version__}-v{SNAPSHOT_VERSION}.json"
+    )
+
+
+def load_snapshot(path: Path) -> Optional[List[Dict]]:
+    """Loads the dataset descriptions from a snapshot (None if missing)"""
+    try:
+        with path.open("rt") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def save_snapshot(path: Path, entries: List[Dict]):
+    """Saves the dataset descriptions (ignores errors)"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("wt") as fp:
+            json.dump(entries, fp)
+        tmp_path.replace(path)
+    except OSError:
+        logging.warning("Could not write the ir_datasets registry snapshot %s", path)
+
+
+def build(repository):
+    """Builds a datamaestro repository by using ir_datasets registry
+
+    The dataset descriptions are cached in a snapshot (one per ir_datasets
+    version), so that the datasets are only loaded once.
+    """
+    path = snapshot_path(repository)
+    entries = load_snapshot(path)
+    if entries is None:
+        with no_deprecated_warnings():
+            entries = [
+                entry
+                for entry in (describe(dataset_id) for dataset_id in registry)
+                if entry is not None
+            ]
+        save_snapshot(path, entries)
+
+    return create(repository, entries)
+
+
+def resolve(repository, name: str) -> Optional[Dataset]:
+    """Resolves a dataset ID without building the whole repository
+
+    Only the matching ir_datasets dataset (and its corpus) are loaded.
+    """
+    if not name.startswith("irds."):
+        return None
+
+    ids = {dataset_id.replace("/", "."): dataset_id for dataset_id in registry}
+    key = name[len("irds.") :]
+    candidates = [key]
+    if "." in key:
+        candidates.append(key.rsplit(".", 1)[0])
+
+    with no_deprecated_warnings():
+        for candidate in candidates:
+            if (dataset_id := ids.get(candidate)) is None:
                 continue
 
             cid = corpus_id(dataset_id)
-            queries = None
-            qrels = None
-
-            if cid == dataset_id:
-                # If the corpus ID is the current dataset ID
-                module = Datasets(
-                    cid,
-                    ds.documentation().get("pretty_name", cid),
-                    ds.documentation().get("desc", ""),
-                )
-                datasets[cid] = module
-                add(cid, DocumentsDataset(repository, dataset_id, ds))
-
-            if ds.has_queries():
-                queries = QueriesDataset(repository, dataset_id, ds)
-                add(cid, queries)
-
-            if ds.has_docpairs():
-                add(cid, TrainingTripletsDataset(repository, dataset_id, ds))
-
-            if ds.has_scoreddocs():
-                add(cid, AdhocRunDataset(repository, dataset_id, ds))
-
-            if ds.has_qrels():
-                qrels = QrelsDataset(repository, dataset_id, ds)
-                add(cid, qrels)
-
-            if qrels and queries:
-                collection = Collection(repository, dataset_id, ds)
-                collection.documents = datasets[cid].datasets[0]
-                collection.topics = queries
-                collection.assessments = qrels
-
-                add(cid, collection)
-
-        return list(datasets.values()), bykey
+            entries = [describe(cid)]
+            if dataset_id != cid:
+                entries.append(describe(dataset_id))
+            if None in entries:
+                continue
+
+            _, bykey = create(repository, entries)
+            if name in bykey:
+                return bykey[name]
+
+    return None
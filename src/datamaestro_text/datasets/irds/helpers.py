@@ -1,12 +1,245 @@
 import logging
-from typing import Optional, Type, Callable, Iterator
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple, Type, Callable, Iterator
+import numpy as np
 from ir_datasets.indices import PickleLz4FullStore
+from ir_datasets.indices.lz4_pickle import safe_str
 from datamaestro.download import Resource
 from datamaestro.utils import FileChecker
 from pathlib import Path
 import urllib3
 
 
+#: Shard iterator factory, set in each worker process (see `build_lz4docstore`)
+_SHARD_FACTORY = None
+
+
+def _init_shard_worker(iter_factory, doc_cls, lookup_field):
+    global _SHARD_FACTORY
+    _SHARD_FACTORY = (iter_factory, doc_cls, lookup_field)
+
+
+def _build_shard(path: Path, shard: int, num_shards: int) -> int:
+    """Builds one shard of a LZ4 store (run in a worker process)"""
+    iter_factory, doc_cls, lookup_field = _SHARD_FACTORY
+    store = PickleLz4FullStore(
+        path,
+        lambda: iter_factory(shard, num_shards),
+        doc_cls,
+        lookup_field=lookup_field,
+        index_fields=[lookup_field],
+        key_field_prefix=None,
+        size_hint=None,
+        count_hint=None,
+    )
+    store.build()
+    return store.count()
+
+
+def _read_sorted_index(path: Path):
+    """Reads the keys and positions of an ir_datasets NumpySortedIndex"""
+    keylen, count = (int(x) for x in Path(f"{path}.meta").read_text().split())
+    keys = np.fromfile(f"{path}.key", dtype=f"S{keylen}", count=count)
+    positions = np.fromfile(f"{path}.pos", dtype="int64", count=count)
+    return keys, positions
+
+
+def lz4docstore_index(
+    path: Path, field: str
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Returns the (memory-mapped) sorted keys and record positions of a LZ4
+    store index, or None if the index does not exist"""
+    name = path / f"idx.{safe_str(field)}"
+    meta_path = Path(f"{name}.meta")
+    if not meta_path.is_file():
+        return None
+
+    keylen, count = (int(x) for x in meta_path.read_text().split())
+    if count == 0:
+        return np.empty(0, dtype=f"S{max(keylen, 1)}"), np.empty(0, dtype="int64")
+    keys = np.memmap(f"{name}.key", dtype=f"S{keylen}", mode="r", shape=(count,))
+    positions = np.memmap(f"{name}.pos", dtype="int64", mode="r", shape=(count,))
+    return keys, positions
+
+
+def lz4docstore_ids(
+    path: Path,
+    lookup_field: str,
+    *,
+    key_field_prefix: Optional[str] = None,
+    chunk_size: int = 2**20,
+) -> Optional[Iterator[str]]:
+    """Iterates over the document IDs of a LZ4 store, in store order
+
+    IDs are read from the (memory-mapped) lookup index, so documents are not
+    decompressed.
+
+    :param path: The store folder
+    :param lookup_field: The lookup field
+    :param key_field_prefix: The prefix removed from IDs in the index
+    :return: An iterator, or None if the index cannot be used (e.g. missing,
+        or with duplicate IDs)
+    """
+    positions_path = path / "bin.pos"
+    index = lz4docstore_index(path, lookup_field)
+    if index is None or not positions_path.is_file():
+        return None
+
+    keys, positions = index
+    count = len(keys)
+    if count != positions_path.stat().st_size // 8:
+        # Not one key per document
+        return None
+    if count == 0:
+        return iter([])
+
+    order = np.argsort(positions, kind="stable")
+    prefix = key_field_prefix or ""
+
+    def ids():
+        for start in range(0, count, chunk_size):
+            for key in keys[order[start : start + chunk_size]].tolist():
+                yield prefix + key.decode("utf-8")
+
+    return ids()
+
+
+def merge_lz4docstores(
+    destination: Path, shards: List[Path], doc_cls: Type, index_fields: List[str]
+):
+    """Merges several LZ4 stores into one
+
+    Documents are concatenated in shard order, and the lookup indices are
+    merged so that the resulting store is identical to one built by
+    `PickleLz4FullStore` over the concatenated document streams.
+
+    :param destination: The folder of the merged store
+    :param shards: The folders of the stores to merge (they are consumed)
+    :param doc_cls: The document class (named tuple)
+    :param index_fields: The indexed fields
+    """
+    offsets = []
+    offset = 0
+    with (destination / "bin").open("wb") as out:
+        for shard in shards:
+            offsets.append(offset)
+            if not (shard / "bin").is_file():
+                continue
+            with (shard / "bin").open("rb") as fp:
+                shutil.copyfileobj(fp, out, 2**24)
+            (shard / "bin").unlink()
+            offset = out.tell()
+
+    # Document positions
+    with (destination / "bin.pos").open("wb") as out:
+        for shard, offset in zip(shards, offsets):
+            if not (shard / "bin.pos").is_file():
+                continue
+            positions = np.fromfile(shard / "bin.pos", dtype="int64")
+            (positions + offset).tofile(out)
+
+    # Lookup indices
+    for field in index_fields:
+        name = f"idx.{safe_str(field)}"
+        all_keys, all_positions = [], []
+        for shard, offset in zip(shards, offsets):
+            if not (shard / f"{name}.meta").is_file():
+                # Empty shard
+                continue
+            keys, positions = _read_sorted_index(shard / name)
+            all_keys.append(keys)
+            all_positions.append(positions + offset)
+
+        if not all_keys:
+            continue
+
+        keylen = max(keys.dtype.itemsize for keys in all_keys)
+        keys = np.concatenate([keys.astype(f"S{keylen}") for keys in all_keys])
+        positions = np.concatenate(all_positions)
+        order = np.argsort(keys, kind="stable")
+
+        keys[order].tofile(destination / f"{name}.key")
+        positions[order].tofile(destination / f"{name}.pos")
+        (destination / f"{name}.meta").write_text(f"{keylen} {len(keys)}")
+
+    (destination / "bin.meta").write_text(" ".join(doc_cls._fields))
+
+    for shard in shards:
+        shutil.rmtree(shard, ignore_errors=True)
+
+
+def build_lz4docstore(
+    destination: Path,
+    iter_factory: Callable[..., Iterator],
+    doc_cls: Type,
+    lookup_field: str,
+    *,
+    count_hint: Optional[int] = None,
+    num_workers: Optional[int] = 0,
+):
+    """Builds a LZ4 document store
+
+    :param destination: The store folder
+    :param iter_factory: Returns an iterator over documents. When `num_workers`
+        is greater than 1, it is called with two arguments `(shard, num_shards)`
+        and must return the documents of this shard only; shards should be
+        contiguous so that document order is the same as a sequential build.
+        If it has a `prepare` method, it is called once before the workers
+        are forked (e.g. to load shared data)
+    :param doc_cls: The document class (named tuple)
+    :param lookup_field: The field used for lookup
+    :param count_hint: Number of documents (hint), defaults to None
+    :param num_workers: Number of processes used to build the store (sequential
+        build if less than 2, number of CPUs if None)
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+
+    if num_workers < 2:
+        store = PickleLz4FullStore(
+            destination,
+            iter_factory,
+            doc_cls,
+            lookup_field=lookup_field,
+            index_fields=[lookup_field],
+            key_field_prefix=None,
+            size_hint=None,
+            count_hint=count_hint,
+        )
+        store.build()
+        return
+
+    # Each worker builds a partial store, which are merged afterwards
+    shards_path = destination / "shards"
+    if shards_path.exists():
+        shutil.rmtree(shards_path)
+    shards = [shards_path / f"{shard:04d}" for shard in range(num_workers)]
+
+    if prepare := getattr(iter_factory, "prepare", None):
+        prepare()
+
+    logging.info("Building the store with %d processes", num_workers)
+    # Fork so that the iterator factory (often a closure) needs not be pickled
+    with ProcessPoolExecutor(
+        num_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_shard_worker,
+        initargs=(iter_factory, doc_cls, lookup_field),
+    ) as executor:
+        counts = list(
+            executor.map(
+                _build_shard, shards, range(num_workers), [num_workers] * num_workers
+            )
+        )
+
+    logging.info("Merging %d shards (%d documents)", num_workers, sum(counts))
+    merge_lz4docstores(destination, shards, doc_cls, [lookup_field])
+    shards_path.rmdir()
+
+
 class lz4docstore_downloader(Resource):
     """Uses ir_datasets Lz4FullStore to build a document store for a stream of documents"""
 
@@ -55,17 +288,13 @@ class lz4docstore_downloader(Resource):
                 self.checker.check(file.path)
 
             # Builds the LZ4 store
-            store = PickleLz4FullStore(
+            build_lz4docstore(
                 destination,
                 lambda: self.iter_factory(Path(file.path)),
                 self.doc_cls,
-                lookup_field=self.lookup_field,
-                index_fields=[self.lookup_field],
-                key_field_prefix=None,
-                size_hint=None,
+                self.lookup_field,
                 count_hint=self.count_hint,
             )
-            store.build()
 
             # All good!
             (destination / "done").touch()
@@ -75,25 +304,32 @@ class lz4docstore_builder(Resource):
     def __init__(
         self,
         name: str,
-        iter_factory: Callable[[], Iterator],
+        iter_factory: Callable[..., Iterator],
         doc_cls: Type,
         lookup_field: str,
         *,
         count_hint: Optional[int] = None,
+        num_workers: Optional[int] = 0,
     ):
         """Uses ir_datasets Lz4FullStore to build a document store for a stream of documents
 
         :param name: The name of the variable for path construction
-        :param iter_factory: Iterator over documents
+        :param iter_factory: Iterator over documents; if `num_workers` is
+            greater than 1, it takes two arguments `(shard, num_shards)` and
+            returns an iterator over the documents of a shard
         :param doc_cls: The class of documents (must be a dataclass because of how ir-datasets works)
         :param lookup_field: Which field to use for lookup
         :param count_hint: Number of documents (hint), defaults to None
+        :param num_workers: Number of processes used to build the store,
+            defaults to 0 (sequential build); if None, the number of CPUs
+            (when the store is built)
         """
         super().__init__(name)
         self.iter_factory = iter_factory
         self.doc_cls = doc_cls
         self.lookup_field = lookup_field
         self.count_hint = count_hint
+        self.num_workers = num_workers
 
     def prepare(self):
         return self.definition.datapath / self.varname
@@ -111,17 +347,14 @@ class lz4docstore_builder(Resource):
         logging.info("Building the document index")
 
         # Builds the LZ4 store
-        store = PickleLz4FullStore(
+        build_lz4docstore(
             destination,
-            lambda: self.iter_factory(),
+            self.iter_factory,
             self.doc_cls,
-            lookup_field=self.lookup_field,
-            index_fields=[self.lookup_field],
-            key_field_prefix=None,
-            size_hint=None,
+            self.lookup_field,
             count_hint=self.count_hint,
+            num_workers=self.num_workers,
         )
-        store.build()
 
         # All good!
         (destination / "done").touch()
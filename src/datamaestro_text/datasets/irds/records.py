@@ -0,0 +1,207 @@
+"""Thread-safe access to the records of ir_datasets LZ4 stores"""
+
+import os
+import pickle
+import weakref
+from concurrent.futures import Executor
+from functools import cached_property, partial
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+from datamaestro_text.utils.pickles import pickled_tuple_spans
+
+#: A document as UTF-8 memory views (ID, then text fields)
+RawDocument = Tuple[memoryview, ...]
+
+#: Byte range (start, end) read at once, and the positions of its records
+RecordGroup = Tuple[int, int, List[int]]
+
+
+class LZ4Records:
+    """Reads records of a `PickleLz4FullStore`
+
+    Records are located with the (memory-mapped) lookup index, and read with
+    `os.pread`, which does not depend on a shared file position: contrary to
+    the ir_datasets store, reads can be made from several threads.
+    """
+
+    #: Records separated by at most this number of bytes are read at once
+    COALESCE_GAP = 2**12
+
+    #: Maximum number of bytes read at once
+    COALESCE_SIZE = 2**20
+
+    #: Minimum number of documents decompressed by a thread
+    MIN_TASK_SIZE = 256
+
+    def __init__(
+        self,
+        path: Path,
+        data_cls: Type,
+        lookup_field: str,
+        key_field_prefix: Optional[str] = None,
+    ):
+        self.path = path
+        self.data_cls = data_cls
+        self.lookup_field = lookup_field
+        self.key_field_prefix = key_field_prefix or ""
+
+    @cached_property
+    def index(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """The sorted keys and record positions (or None if no index)"""
+        from .helpers import lz4docstore_index
+
+        return lz4docstore_index(self.path, self.lookup_field)
+
+    @cached_property
+    def offsets(self) -> np.ndarray:
+        """Start of each record, followed by the size of the records file"""
+        offsets = np.fromfile(self.path / "bin.pos", dtype="int64")
+        return np.append(offsets, (self.path / "bin").stat().st_size)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @cached_property
+    def fd(self) -> int:
+        fd = os.open(self.path / "bin", os.O_RDONLY)
+        weakref.finalize(self, os.close, fd)
+        return fd
+
+    def field_indices(self, fields: Sequence[str]) -> List[int]:
+        """Returns the indices of the ID and of the given fields in records"""
+        names = self.data_cls._fields
+        return [names.index(field) for field in (self.lookup_field, *fields)]
+
+    def positions(self, docids: List[str]) -> np.ndarray:
+        """Returns the position of each document record"""
+        keys, positions = self.index
+        prefix = self.key_field_prefix
+        encoded = [docid[len(prefix) :].encode("utf-8") for docid in docids]
+        queries = np.array(encoded, dtype=keys.dtype)
+        ix = np.searchsorted(keys, queries)
+        found = ix < len(keys)
+        found[found] = keys[ix[found]] == queries[found]
+        for docid, key, ok in zip(docids, encoded, found.tolist()):
+            if not ok or len(key) > keys.itemsize or not docid.startswith(prefix):
+                raise KeyError(docid)
+        return positions[ix]
+
+    def coalesce(self, positions: np.ndarray) -> List[RecordGroup]:
+        """Groups (sorted) record positions into ranges read at once"""
+        offsets = self.offsets
+        ends = offsets[np.searchsorted(offsets, positions, side="right")]
+        groups = []
+        for position, end in zip(positions.tolist(), ends.tolist()):
+            if (
+                groups
+                and position - groups[-1][1] <= self.COALESCE_GAP
+                and end - groups[-1][0] <= self.COALESCE_SIZE
+            ):
+                groups[-1][1] = max(groups[-1][1], end)
+                groups[-1][2].append(position)
+            else:
+                groups.append([position, end, [position]])
+        return groups
+
+    def read(self, groups: List[RecordGroup], raw_fields: Optional[List[int]] = None):
+        """Reads and decompresses groups of records
+
+        :param raw_fields: If given, records are not unpickled: for each
+            record, memory views over the UTF-8 bytes of these fields are
+            returned
+        """
+        import lz4.block
+
+        records = []
+        for start, end, positions in groups:
+            data = memoryview(os.pread(self.fd, end - start, start))
+            for position in positions:
+                offset = position - start
+                length = int.from_bytes(data[offset : offset + 4], "little")
+                content = lz4.block.decompress(data[offset + 4 : offset + 4 + length])
+                if raw_fields is None:
+                    records.append(self.data_cls(*pickle.loads(content)))
+                else:
+                    records.append(raw_record(content, raw_fields))
+        return records
+
+    def read_range(
+        self, start: int, stop: int, raw_fields: Optional[List[int]] = None
+    ) -> List:
+        """Reads the records between two internal IDs (see `read`)"""
+        if start >= stop:
+            return []
+        positions = self.offsets[start:stop].tolist()
+        group = (positions[0], int(self.offsets[stop]), positions)
+        return self.read([group], raw_fields)
+
+    def lookup(
+        self,
+        docids: List[str],
+        convert: Optional[Callable] = None,
+        *,
+        raw_fields: Optional[List[int]] = None,
+        executor: Optional[Executor] = None,
+        max_tasks: int = 1,
+    ) -> Dict[str, object]:
+        """Reads documents given their IDs
+
+        Records are read by increasing position; when an executor is given,
+        the groups of records are split into (at most) `max_tasks` tasks
+        (LZ4 releases the GIL). Each distinct document is converted once.
+
+        :param convert: Function applied to each record
+        :param raw_fields: See `read`
+        :return: A dictionary document ID -> (converted) record
+        """
+        unique_ids = list(dict.fromkeys(docids))
+        positions = self.positions(unique_ids)
+        order = np.argsort(positions, kind="stable")
+        groups = self.coalesce(positions[order])
+
+        tasks = min(max_tasks, len(positions) // self.MIN_TASK_SIZE)
+        if executor is not None and tasks > 1:
+            bounds = np.linspace(0, len(groups), tasks + 1, dtype=int).tolist()
+            records = executor.map(
+                partial(self.read, raw_fields=raw_fields),
+                (groups[start:end] for start, end in zip(bounds, bounds[1:])),
+            )
+        else:
+            records = [self.read(groups, raw_fields)]
+
+        documents = [None] * len(unique_ids)
+        for ix, record in zip(order.tolist(), chain.from_iterable(records)):
+            documents[ix] = record if convert is None else convert(record)
+        return dict(zip(unique_ids, documents))
+
+
+def raw_record(content: bytes, fields: List[int]) -> RawDocument:
+    """Returns memory views over the UTF-8 bytes of fields of a pickled tuple
+
+    Fields that are not strings are converted to strings (which requires
+    unpickling the record).
+    """
+    try:
+        spans = pickled_tuple_spans(content)
+    except ValueError:
+        spans = None
+
+    view = memoryview(content)
+    if spans is not None and all(spans[ix] is not None for ix in fields):
+        return tuple(view[spans[ix][0] : spans[ix][1]] for ix in fields)
+
+    values = pickle.loads(content)
+    return tuple(raw_value(values[ix]) for ix in fields)
+
+
+def raw_value(value) -> memoryview:
+    """Returns the UTF-8 bytes of a value (empty for None)"""
+    if value is None:
+        return memoryview(b"")
+    if isinstance(value, bytes):
+        return memoryview(value)
+    return memoryview(str(value).encode("utf-8"))
@@ -1,5 +1,16 @@
+import importlib
 import inspect
-from typing import Any, Callable, Dict, Type
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterator,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 
 class Handler:
@@ -54,3 +65,52 @@ class Handler:
             handler = self.defaulthandler
 
         return handler(key)
+
+
+T = TypeVar("T")
+
+
+class ClassRegistry(Generic[T]):
+    """Associates values to classes given by their dotted name
+
+    Classes are only imported when the registry is first queried, so that
+    registering values does not import the (possibly heavy) modules defining
+    them.
+
+    Example:
+    ```
+    registry = ClassRegistry()
+    registry["ir_datasets.formats.GenericDoc"] = converter
+
+    registry[GenericDoc]  # returns converter
+    ```
+    """
+
+    def __init__(self, entries: Optional[Dict[str, T]] = None):
+        self.entries: Dict[str, T] = dict(entries or {})
+        self._resolved: Optional[Dict[Type, T]] = None
+
+    def __setitem__(self, name: str, value: T):
+        self.entries[name] = value
+        self._resolved = None
+
+    def update(self, entries: Dict[str, T]):
+        self.entries.update(entries)
+        self._resolved = None
+
+    def items(self) -> Iterator[Tuple[str, T]]:
+        return self.entries.items()
+
+    @staticmethod
+    def resolve(name: str) -> Type:
+        """Imports a class given its dotted name"""
+        module_name, _, qualname = name.rpartition(".")
+        return getattr(importlib.import_module(module_name), qualname)
+
+    def __getitem__(self, cls: Type) -> T:
+        if self._resolved is None:
+            self._resolved = {
+                ClassRegistry.resolve(name): value
+                for name, value in self.entries.items()
+            }
+        return self._resolved[cls]
@@ -1,32 +1,125 @@
-from pathlib import Path
-from typing import Iterator, Optional
+import json
+import mmap
 import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
 from datamaestro_text.data.ir import AdhocRunDict
+from datamaestro_text.data.ir.qrels import ColumnarAssessments, cached_assessments
+from datamaestro_text.data.ir.runs import ColumnarAdhocRun
 from datamaestro_text.data.ir.base import (
     AdhocAssessedTopic,
     TopicRecord,
-    SimpleAdhocAssessment,
     IDItem,
 )
 from datamaestro_text.data.ir.formats import TrecTopicRecord, TrecTopic
+from datamaestro_text.utils.files import cached_build, file_stamp
 
 # --- Runs
 
 
-def parse_run(path: Path) -> AdhocRunDict:
-    results = {}
-    with path.open("rt") as f:
-        for line in f:
-            query_id, _q0, doc_id, _rank, score, _model_id = re.split(
-                r"\s+", line.strip()
-            )
-            results.setdefault(query_id, {})[doc_id] = score
+def _check_columns(path: Path, data: bytes, ncols: int, first_line: int):
+    """Checks that each (non blank) line has `ncols` tokens
+
+    :param first_line: The number of the first line of `data` (from 1)
+    :raises ValueError: if a line has another number of tokens
+    """
+    array = np.frombuffer(data, dtype=np.uint8)
+    # Whitespace as in `bytes.split` (\t, \n, \x0b, \x0c, \r and space)
+    space = (array == 32) | ((array >= 9) & (array <= 13))
+    starts = np.flatnonzero(space[:-1] > space[1:]) + 1
+    if len(array) > 0 and not space[0]:
+        starts = np.concatenate(([0], starts))
+
+    # Number of tokens of each line
+    before = np.searchsorted(starts, np.flatnonzero(array == 10))
+    counts = np.diff(np.concatenate(([0], before, [len(starts)])))
+    wrong = np.flatnonzero((counts != 0) & (counts != ncols))
+    if len(wrong) > 0:
+        raise ValueError(
+            f"{path}, line {first_line + wrong[0]}: expected {ncols} columns, "
+            f"got {counts[wrong[0]]}"
+        )
+
+
+def _read_columns(path: Path, ncols: int, chunk_size: int = 2**26):
+    """Reads a whitespace-separated file by chunks of bytes, and yields the
+    list of tokens of each chunk (each containing whole lines)
+
+    :raises ValueError: if a line does not have `ncols` columns
+    """
+    with path.open("rb") as fp:
+        remainder, line = b"", 1
+        while True:
+            data = fp.read(chunk_size)
+            if not data:
+                break
+            data = remainder + data
+            end = data.rfind(b"\n") + 1
+            if end == 0:
+                remainder = data
+                continue
+            data, remainder = data[:end], data[end:]
+            _check_columns(path, data, ncols, line)
+            line += data.count(b"\n")
+            yield data.split()
+
+        if tokens := remainder.split():
+            _check_columns(path, remainder, ncols, line)
+            yield tokens
+
+
+def _concatenate_bytes(arrays: List[np.ndarray]) -> np.ndarray:
+    """Concatenate bytes arrays (using the largest width)"""
+    width = max(array.itemsize for array in arrays)
+    return np.concatenate([array.astype(f"S{width}") for array in arrays])
+
+
+def parse_run(path: Path) -> ColumnarAdhocRun:
+    """Parses a TREC run file into a columnar run
 
-    return results
+    The result can be used as a dictionary (query ID -> doc ID -> score)
+    """
+    query_ids, doc_ids, scores = [], [], []
+    for tokens in _read_columns(path, 6):
+        query_ids.append(np.array(tokens[0::6]))
+        doc_ids.append(np.array(tokens[2::6]))
+        scores.append(np.array(tokens[4::6]).astype(np.float64))
+
+    if not query_ids:
+        return ColumnarAdhocRun.from_dict({})
+
+    return ColumnarAdhocRun.from_arrays(
+        _concatenate_bytes(query_ids),
+        _concatenate_bytes(doc_ids),
+        np.concatenate(scores),
+    )
 
 
 def write_run_dict(run: AdhocRunDict, run_path: Path):
-    """Write run dict"""
+    """Write run dict
+
+    The run can be a dictionary or a columnar run
+    """
+    if isinstance(run, ColumnarAdhocRun):
+        with run_path.open("wt") as f:
+            for ix, query_id in enumerate(run.query_ids.tolist()):
+                doc_codes, scores = run.results(ix)
+                order = np.argsort(-scores, kind="stable")
+                # Python floats, formatted as for dictionary runs
+                f.writelines(
+                    f"{query_id} Q0 {doc_id} {rank} {score} run\n"
+                    for rank, (doc_id, score) in enumerate(
+                        zip(
+                            run.doc_ids[doc_codes[order]].tolist(),
+                            scores[order].tolist(),
+                        ),
+                        1,
+                    )
+                )
+        return
+
     with run_path.open("wt") as f:
         for query_id, scored_documents in run.items():
             scored_documents = list(
@@ -40,21 +133,33 @@ def write_run_dict(run: AdhocRunDict, run_path: Path):
 # --- Assessments
 
 
-def parse_qrels(path: Path) -> Iterator[AdhocAssessedTopic]:
-    with path.open("rt") as fp:
-        _qid = None
-        assessments = []
+def parse_qrels_arrays(path: Path) -> ColumnarAssessments:
+    """Parses a TREC qrels file into columnar assessments"""
+    topic_ids, doc_ids, relevances = [], [], []
+    for tokens in _read_columns(path, 4):
+        topic_ids.append(np.array(tokens[0::4]))
+        doc_ids.append(np.array(tokens[2::4]))
+        relevances.append(np.array(tokens[3::4]).astype(np.int8))
+
+    if not topic_ids:
+        return ColumnarAssessments.from_arrays(
+            np.array([], dtype="S1"), np.array([], dtype="S1"), np.array([])
+        )
 
-        for line in fp:
-            qid, _, docno, rel = re.split(r"\s+", line.strip())
-            if qid != _qid:
-                if _qid is not None:
-                    yield AdhocAssessedTopic(_qid, assessments)
-                _qid = qid
-                assessments = []
-            assessments.append(SimpleAdhocAssessment(docno, int(rel)))
+    return ColumnarAssessments.from_arrays(
+        _concatenate_bytes(topic_ids),
+        _concatenate_bytes(doc_ids),
+        np.concatenate(relevances),
+    )
 
-        yield AdhocAssessedTopic(_qid, assessments)
+
+def load_qrels(path: Path) -> ColumnarAssessments:
+    """Loads a TREC qrels file, using a binary cache (built on first access)"""
+    return cached_assessments(path, parse_qrels_arrays)
+
+
+def parse_qrels(path: Path) -> Iterator[AdhocAssessedTopic]:
+    return parse_qrels_arrays(path).iter()
 
 
 # ---- TOPICS
@@ -64,45 +169,135 @@ def cleanup(s: Optional[str]) -> str:
     return s.replace("\t", " ").strip() if s is not None else ""
 
 
+#: A parsed topic (ID, title, description, narrative)
+TopicFields = Tuple[str, str, str, str]
+
+#: Version of the topics cache format
+TOPICS_CACHE_VERSION = 1
+
+
+@lru_cache
+def _topic_tags(xml_prefix: str) -> "re.Pattern":
+    prefix = re.escape(xml_prefix)
+    return re.compile(
+        rf"\n(\*\*|</top>|<num>|<{prefix}title>|<{prefix}desc>|<{prefix}narr>)"
+        r"([^\n]*)"
+    )
+
+
+def _lines(text: str) -> str:
+    """Strips each line, and appends a space to each"""
+    return " ".join(map(str.strip, text.split("\n"))) + " "
+
+
+def parse_topics(text: str, xml_prefix: str = "") -> Iterator[TopicFields]:
+    """Parses TREC topics in a single pass over the tag lines
+
+    Lines starting with a tag (`<num>`, `<title>`, `<desc>`, `<narr>`,
+    `</top>`) are found by a regular expression; the text of the
+    description and the narrative (and of the title if not on the tag
+    line) is in between.
+
+    :param text: The topics
+    :param xml_prefix: Prefix of the title, desc and narr tags
+    """
+    num = title = desc = narr = reading = None
+    start = 0
+    # Matches tags at the start of lines (including the first one)
+    for match in _topic_tags(xml_prefix).finditer(f"\n{text}"):
+        tag, rest = match.groups()
+        if reading is not None and match.start() >= start:
+            lines = _lines(text[start - 1 : match.start() - 1])
+            if reading == "title":
+                title += lines
+            elif reading == "desc":
+                desc += lines
+            else:
+                narr += lines
+        start = match.end() + 1
+
+        if tag == "**":
+            # translation comment in older formats (e.g., TREC 3 Spanish track)
+            continue
+        elif tag == "</top>":
+            if num:
+                yield num, cleanup(title), cleanup(desc), cleanup(narr)
+            num = title = desc = narr = reading = None
+        elif tag == "<num>":
+            num = rest.replace("Number:", "").strip()
+            reading = None
+        elif tag[-6:] == "title>":
+            title = rest.strip()
+            reading = "title" if title == "" else None
+        elif tag[-5:] == "desc>":
+            desc, reading = "", "desc"
+        else:
+            narr, reading = "", "narr"
+
+
+def _topic_record(fields: TopicFields) -> TopicRecord:
+    num, title, desc, narr = fields
+    return TrecTopicRecord(IDItem(num), TrecTopic(title, desc, narr))
+
+
 def parse_query_format(file, xml_prefix=None) -> Iterator[TopicRecord]:
-    """Parse TREC XML query format"""
+    """Parse TREC XML query format
+
+    :param file: A path, or a file object
+    """
     if xml_prefix is None:
         xml_prefix = ""
 
     if hasattr(file, "read"):
-        num, title, desc, narr, reading = None, None, None, None, None
-        for line in file:
-            if line.startswith("**"):
-                # translation comment in older formats (e.g., TREC 3 Spanish track)
-                continue
-            elif line.startswith("</top>"):
-                if num:
-                    yield TrecTopicRecord(
-                        IDItem(num),
-                        TrecTopic(cleanup(title), cleanup(desc), cleanup(narr)),
-                    )
-                num, title, desc, narr, reading = None, None, None, None, None
-            elif line.startswith("<num>"):
-                num = line[len("<num>") :].replace("Number:", "").strip()
-                reading = None
-            elif line.startswith(f"<{xml_prefix}title>"):
-                title = line[len(f"<{xml_prefix}title>") :].strip()
-                if title == "":
-                    reading = "title"
-                else:
-                    reading = None
-            elif line.startswith(f"<{xml_prefix}desc>"):
-                desc = ""
-                reading = "desc"
-            elif line.startswith(f"<{xml_prefix}narr>"):
-                narr = ""
-                reading = "narr"
-            elif reading == "desc":
-                desc += line.strip() + " "
-            elif reading == "narr":
-                narr += line.strip() + " "
-            elif reading == "title":
-                title += line.strip() + " "
+        text = file.read()
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", "replace")
+        yield from map(_topic_record, parse_topics(text, xml_prefix))
     else:
-        with open(file, "rt") as f:
-            yield from parse_query_format(f)
+        yield from map(_topic_record, read_topics(Path(file), xml_prefix))
+
+
+def read_topics(path: Path, xml_prefix: str = "") -> List[TopicFields]:
+    """Parses a TREC topics file"""
+    with path.open("rb") as fp:
+        if path.stat().st_size == 0:
+            return []
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # Decodes the file at once, with universal newlines
+            text = str(data, "utf-8", "replace")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return list(parse_topics(text, xml_prefix))
+
+
+def _load_topics_cache(cache_path: Path, metadata) -> Optional[List[TopicFields]]:
+    meta_path = cache_path / "meta.json"
+    if not meta_path.is_file() or json.loads(meta_path.read_text()) != metadata:
+        return None
+    with (cache_path / "topics.json").open("rt", encoding="utf-8") as fp:
+        return [tuple(fields) for fields in json.load(fp)]
+
+
+def _save_topics_cache(topics: List[TopicFields], cache_path: Path, metadata):
+    cache_path.mkdir(parents=True)
+    with (cache_path / "topics.json").open("wt", encoding="utf-8") as fp:
+        json.dump(topics, fp, ensure_ascii=False)
+    (cache_path / "meta.json").write_text(json.dumps(metadata))
+
+
+def load_topics(path: Path, xml_prefix: str = "") -> List[TopicFields]:
+    """Loads TREC topics, using a cache (built on first access)
+
+    Topics are cached as a JSON list in a folder next to the file, and the
+    cache is rebuilt when the size or modification time of the file changes.
+    """
+    metadata = {
+        **file_stamp(path),
+        "xml_prefix": xml_prefix,
+        "version": TOPICS_CACHE_VERSION,
+    }
+    return cached_build(
+        path.with_name(f"{path.name}.cache"),
+        lambda cache_path: _load_topics_cache(cache_path, metadata),
+        lambda: read_topics(path, xml_prefix),
+        lambda topics, cache_path: _save_topics_cache(topics, cache_path, metadata),
+    )
@@ -0,0 +1,38 @@
+import pytest
+
+from datamaestro_text.data.ir import IDItem, TextItem
+from datamaestro_text.data.ir.arrow import ArrowDocuments, write_documents
+from datamaestro_text.data.ir.csv import Documents
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_arrow_documents(tmp_path, format, num_workers):
+    pytest.importorskip("pyarrow")
+    docids = [f"doc-{ix}" for ix in range(100)]
+    source = tmp_path / "collection.tsv"
+    source.write_text("".join(f"{docid}\ttext {docid}\n" for docid in docids))
+    documents = Documents.C(id="", path=source).instance()
+
+    path = tmp_path / f"documents.{format}"
+    count = write_documents(
+        documents, path, format=format, row_group_size=16, num_workers=num_workers
+    )
+    assert count == 100
+
+    exported = ArrowDocuments.C(id="", path=path, format=format).instance()
+    assert exported.documentcount == 100
+    assert list(exported.iter_ids()) == docids
+    assert list(exported.iter_texts()) == [f"text {docid}" for docid in docids]
+
+    records = list(exported.iter())
+    assert [record[IDItem].id for record in records] == docids
+    assert records[42][TextItem].text == "text doc-42"
+    assert exported.document_recordtype.has(TextItem)
+
+    # Projection and ranges
+    batches = list(exported.iter_arrow_batches(["id"], start=20))
+    assert [batch.schema.names for batch in batches[:1]] == [["id"]]
+    assert sum(batch.num_rows for batch in batches) == 80
+    assert [r[IDItem].id for r in exported.iter_range(30, 35)] == docids[30:35]
+    assert list(exported.iter_documents_from(100)) == []
@@ -0,0 +1,132 @@
+import csv
+import time
+
+import numpy as np
+import pytest
+
+from datamaestro_text.data.ir import IDItem, TextItem, cord19
+from datamaestro_text.data.ir.csv import Documents
+
+
+def ids(documents):
+    return [document[IDItem].id for document in documents]
+
+
+@pytest.mark.parametrize("dense", [True, False])
+def test_csv_documents(tmp_path, dense):
+    docids = [str(ix) if dense else f"doc-{(ix * 7) % 100}" for ix in range(100)]
+    path = tmp_path / "collection.tsv"
+    path.write_text("".join(f"{docid}\ttext {docid}\n" for docid in docids))
+    documents = Documents.C(id="", path=path).instance()
+
+    assert ids(documents.iter()) == docids
+    assert documents.documentcount == 100
+    assert (documents.index.ids is None) == dense
+
+    assert documents.document_ext(docids[42])[TextItem].text == f"text {docids[42]}"
+    assert documents.document_int(3)[IDItem].id == docids[3]
+    assert ids(documents.documents_ext(docids[::-3])) == docids[::-3]
+    assert ids(documents.iter_documents_from(97)) == docids[97:]
+
+    with pytest.raises(KeyError):
+        documents.document_ext("unknown")
+    with pytest.raises(KeyError):
+        documents.document_ext("0042" if dense else "doc-100")
+
+
+def test_csv_blank_lines(tmp_path):
+    path = tmp_path / "collection.tsv"
+    path.write_text("\na\ttext a\n\nb\ttext b\r\n\n\nc\ttext c\n\n")
+    documents = Documents.C(id="", path=path).instance()
+
+    assert ids(documents.iter()) == ["a", "b", "c"]
+    assert list(documents.iter_ids()) == ["a", "b", "c"]
+    assert documents.documentcount == 3
+    assert documents.document_ext("b")[TextItem].text == "text b"
+    assert documents.document_int(2)[TextItem].text == "text c"
+    assert ids(documents.iter_documents_from(1)) == ["b", "c"]
+
+    # Malformed lines are reported (and the index is rebuilt)
+    path.write_text("a\ttext a\nb text b\n")
+    documents = Documents.C(id="", path=path).instance()
+    with pytest.raises(ValueError, match="line 2"):
+        documents.index
+    with pytest.raises(ValueError, match="b text b"):
+        list(documents.iter())
+
+
+def test_cord19_documents(tmp_path):
+    path = tmp_path / "metadata.csv"
+    rows = [(f"uid{ix}", f"title {ix}", f'abstract\n"{ix}"') for ix in range(10)]
+    with path.open("wt", newline="") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(["cord_uid", "title", "abstract"])
+        writer.writerows(rows)
+    documents = cord19.Documents.C(id="", path=path).instance()
+
+    assert list(documents.iter_ids()) == [row[0] for row in rows]
+    assert documents.documentcount == 10
+    assert ids(documents.iter_documents_from(7)) == ["uid7", "uid8", "uid9"]
+    assert list(documents.iter_documents_from(10)) == []
+
+    # The row index is rebuilt when the file changes
+    with path.open("at", newline="") as fp:
+        csv.writer(fp).writerow(["uid10", "title 10", "abstract 10"])
+    documents = cord19.Documents.C(id="", path=path).instance()
+    assert documents.documentcount == 11
+    assert ids(documents.iter_documents_from(9)) == ["uid9", "uid10"]
+
+
+def test_seek(tmp_path, monkeypatch):
+    """Iterating from a document seeks to its offset"""
+    lines = [f"{ix}\ttext of document {ix}\n" for ix in range(1000)]
+    path = tmp_path / "collection.tsv"
+    path.write_text("".join(lines))
+    documents = Documents.C(id="", path=path).instance()
+
+    full = ids(documents.iter())
+    offsets = np.cumsum([0] + [len(line) for line in lines])
+    assert documents.index.offsets.tolist() == offsets.tolist()
+    for start in [0, 1, 500, 999, 1000]:
+        assert ids(documents.iter_documents_from(start)) == full[start:]
+
+    # IDs are read without creating the documents
+    monkeypatch.setattr(documents, "_document", None)
+    assert list(documents.iter_ids()) == full
+
+
+@pytest.mark.benchmark
+def test_seek_benchmark(tmp_path):
+    """Starting from the end is much faster than iterating"""
+    path = tmp_path / "collection.tsv"
+    path.write_text("".join(f"{ix}\ttext of document {ix}\n" for ix in range(50_000)))
+    documents = Documents.C(id="", path=path).instance()
+    documents.index
+
+    start = time.perf_counter()
+    assert ids(documents.iter_documents_from(49_990)) == [
+        str(ix) for ix in range(49_990, 50_000)
+    ]
+    seek = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in documents.iter():
+        pass
+    full = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert sum(1 for _ in documents.iter_ids()) == 50_000
+    iter_ids = time.perf_counter() - start
+
+    assert seek * 10 < full, f"seek: {seek:.3f}s, iteration: {full:.3f}s"
+    assert iter_ids < full, f"iter_ids: {iter_ids:.3f}s, iteration: {full:.3f}s"
+
+
+def test_csv_shards(tmp_path):
+    path = tmp_path / "collection.tsv"
+    path.write_text("".join(f"{ix}\ttext {ix}\n" for ix in range(10)))
+    documents = Documents.C(id="", path=path).instance()
+
+    shards = [ids(documents.shard(ix, 4)) for ix in range(4)]
+    assert sum(shards, []) == [str(ix) for ix in range(10)]
+    assert ids(documents.iter_range(3, 5)) == ["3", "4"]
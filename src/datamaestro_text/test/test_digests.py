@@ -0,0 +1,34 @@
+from hashlib import md5
+
+from datamaestro_text.utils.digests import DigestIndex
+
+
+def test_digest_index(tmp_path):
+    entries = [(f"doc-{ix}", md5(f"text {ix}".encode()).digest()) for ix in range(100)]
+    calls = []
+
+    def build():
+        calls.append(True)
+        return iter(entries)
+
+    index = DigestIndex.create(tmp_path / "index", build, chunk_size=16)
+    assert len(index) == 100
+    for key, digest in entries[::7]:
+        assert index.get(key) == digest
+        assert index.check(key, digest)
+        assert not index.check(key, md5(b"other").digest())
+    assert index.get("unknown") is None
+
+    # The index is only built once
+    index = DigestIndex.create(tmp_path / "index", build)
+    assert index.get("doc-42") == entries[42][1]
+    assert len(calls) == 1
+
+
+def test_digest_index_empty(tmp_path):
+    index = DigestIndex.create(tmp_path / "index", lambda: iter([]))
+    assert len(index) == 0
+    assert index.get("doc-0") is None
+    assert not index.check("doc-0", md5(b"").digest())
+
+    assert len(DigestIndex(tmp_path / "index")) == 0
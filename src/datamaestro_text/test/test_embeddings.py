@@ -0,0 +1,47 @@
+import numpy as np
+
+from datamaestro_text.data.embeddings import WordEmbeddingsText
+
+LINES = ["the 0.1 0.2 0.3\n", "at name 1 2 3\n", "cat -1 0.5 1e-3\n", "dog 4 5 6\n"]
+
+
+def test_embeddings_text(tmp_path):
+    path = tmp_path / "vectors.txt"
+    path.write_text("".join(LINES))
+    embeddings = WordEmbeddingsText.C(id="", path=path).instance()
+
+    for _ in range(2):
+        # The second time, the cache is used
+        words, vectors = embeddings.load()
+        assert words == ["the", "at name", "cat", "dog"]
+        assert vectors.dtype == np.float32
+        assert np.allclose(vectors[2], [-1, 0.5, 1e-3])
+        assert (path.parent / "vectors.txt.cache" / "meta.json").is_file()
+
+        # Vectors can be modified in place (without changing the cache)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    words, vectors = embeddings.load(vocabulary=["dog", "the", "unknown"])
+    assert words == ["the", "dog"]
+    assert np.allclose(vectors, [[0.1, 0.2, 0.3], [4, 5, 6]])
+
+    words, vectors = embeddings.load(vocabulary=["dog", "the"], max_words=2)
+    assert words == ["the"]
+    assert vectors.shape == (1, 3)
+
+
+def test_embeddings_blank_lines(tmp_path):
+    """Blank lines are ignored, and the last line might not end with a newline"""
+    for name, text in [
+        ("blank.txt", "".join(LINES) + "\n\n"),
+        ("no-newline.txt", "".join(LINES).rstrip("\n")),
+        ("inner.txt", "\n".join(LINES)),
+    ]:
+        path = tmp_path / name
+        path.write_text(text)
+        embeddings = WordEmbeddingsText.C(id="", path=path).instance()
+        for _ in range(2):
+            words, vectors = embeddings.load()
+            assert words == ["the", "at name", "cat", "dog"]
+            assert vectors.shape == (4, 3)
+            assert np.allclose(vectors[3], [4, 5, 6])
@@ -0,0 +1,126 @@
+import bz2
+import json
+import os
+from hashlib import md5, sha256
+
+import pytest
+
+from datamaestro_text.data.ir import stores
+from datamaestro_text.data.ir.stores import IKatClueWeb22DocumentStore
+from datamaestro_text.utils.files import ChecksumManifest
+
+FILES = {
+    f"part-{part}.jsonl.bz2": [
+        {"id": f"doc{part}-{ix}:0", "contents": f"text {part} {ix}", "url": "u"}
+        for ix in range(5)
+    ]
+    for part in range(3)
+}
+
+
+@pytest.fixture
+def collection(tmp_path):
+    """Writes the files, their checksums and the passage hashes"""
+    folder = tmp_path / "documents"
+    folder.mkdir()
+    checksums, hashes = [], []
+    for filename, documents in FILES.items():
+        data = bz2.compress(
+            "".join(f"{json.dumps(document)}\n" for document in documents).encode()
+        )
+        (folder / filename).write_bytes(data)
+        checksums.append(f"{sha256(data).hexdigest()}  {filename}\n")
+        for document in documents:
+            doc_id, passage_no = document["id"].split(":")
+            digest = md5(document["contents"].encode()).hexdigest()
+            hashes.append(f"{doc_id} {passage_no} {digest}\n")
+
+    checksums_file = tmp_path / "passages.sha256sums"
+    checksums_file.write_text("".join(checksums))
+    hashes_file = tmp_path / "hashes.tsv.bz2"
+    hashes_file.write_bytes(bz2.compress("".join(hashes).encode()))
+    return folder, checksums_file, hashes_file
+
+
+def ids(documents):
+    return [document.id for document in documents]
+
+
+ALL_IDS = [document["id"] for documents in FILES.values() for document in documents]
+
+
+def test_ikat_documents(collection, monkeypatch):
+    folder, checksums_file, hashes_file = collection
+    factory = IKatClueWeb22DocumentStore.generator(folder, checksums_file, hashes_file)
+    assert ids(factory()) == ALL_IDS
+    assert sum((ids(factory(shard, 2)) for shard in range(2)), []) == ALL_IDS
+
+    # Verified files are not hashed again
+    def file_digest(*args):
+        raise AssertionError("File hashed again")
+
+    monkeypatch.setattr(stores, "file_digest", file_digest)
+    factory = IKatClueWeb22DocumentStore.generator(folder, checksums_file, hashes_file)
+    assert ids(factory()) == ALL_IDS
+
+
+def test_ikat_checksums(collection):
+    folder, checksums_file, hashes_file = collection
+    path = folder / "part-1.jsonl.bz2"
+    path.write_bytes(
+        bz2.compress(json.dumps({**FILES[path.name][0], "url": "x"}).encode())
+    )
+
+    factory = IKatClueWeb22DocumentStore.generator(
+        folder, checksums_file, hashes_file, checksum_workers=1
+    )
+    documents = factory()
+    with pytest.raises(AssertionError, match="part-1.jsonl.bz2"):
+        for _ in documents:
+            pass
+
+    # Stopping early cancels the pending checksums
+    documents = factory()
+    next(documents)
+    documents.close()
+
+
+def test_ikat_passage_sampling(collection):
+    folder, checksums_file, hashes_file = collection
+    path = folder / "part-2.jsonl.bz2"
+    documents = [{**document, "contents": "changed"} for document in FILES[path.name]]
+    data = bz2.compress("".join(f"{json.dumps(d)}\n" for d in documents).encode())
+    path.write_bytes(data)
+    lines = checksums_file.read_text().splitlines(keepends=True)
+    lines[2] = f"{sha256(data).hexdigest()}  {path.name}\n"
+    checksums_file.write_text("".join(lines))
+
+    factory = IKatClueWeb22DocumentStore.generator(folder, checksums_file, hashes_file)
+    with pytest.raises(AssertionError, match="for passage doc2-0:0"):
+        list(factory())
+
+    # Passages are not checked when the sample rate is 0
+    factory = IKatClueWeb22DocumentStore.generator(
+        folder, checksums_file, hashes_file, md5_sample_rate=0
+    )
+    assert ids(factory()) == ALL_IDS
+
+
+def test_checksum_manifest(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("content")
+    manifest = ChecksumManifest(tmp_path / "manifest")
+    assert manifest.digest("file.txt", path) is None
+    manifest.add("file.txt", path, "abc")
+    assert manifest.digest("file.txt", path) == "abc"
+
+    # Reloaded, ignoring partially written lines
+    with (tmp_path / "manifest").open("at") as fp:
+        fp.write('{"name": "other')
+    manifest = ChecksumManifest(tmp_path / "manifest")
+    assert manifest.digest("file.txt", path) == "abc"
+
+    # Changed files must be hashed again
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert manifest.digest("file.txt", path) is None
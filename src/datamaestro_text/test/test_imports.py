@@ -0,0 +1,42 @@
+"""Guards the import time of the main modules"""
+
+import subprocess
+import sys
+
+import pytest
+
+MODULES = [
+    "datamaestro_text.data.ir",
+    "datamaestro_text.data.ir.formats",
+    "datamaestro_text.data.ir.stores",
+    "datamaestro_text.datasets.irds.data",
+]
+
+
+def import_times(module: str):
+    """Imports a module in a new interpreter, and returns the cumulative
+    import time (in microseconds) of each imported module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_no_ir_datasets_import(module):
+    """ir_datasets is only imported when an irds dataset is used"""
+    times = import_times(module)
+    assert "ir_datasets" not in times, (
+        f"{module} imports ir_datasets"
+        f" ({times[module] / 1000:.0f} ms in total,"
+        f" {times['ir_datasets'] / 1000:.0f} ms for ir_datasets)"
+    )
@@ -0,0 +1,219 @@
+import json
+
+import pytest
+from datamaestro import Context
+
+from datamaestro_text.datasets.irds import Repository
+from datamaestro_text.datasets.irds.datasets import snapshot_path
+
+
+def test_registry_snapshot(tmp_path, monkeypatch):
+    """Datasets are resolved lazily, then from the registry snapshot"""
+    monkeypatch.setattr(Context, "cachepath", property(lambda self: tmp_path))
+    name = "irds.msmarco-passage.train.queries"
+
+    repository = Repository(Context.instance())
+    dataset = repository.search(name)
+    assert dataset.irds_id == "msmarco-passage/train"
+    assert repository._modules is None
+    assert not snapshot_path(repository).exists()
+
+    ids = {ds.id for module in repository.modules() for ds in module}
+    assert snapshot_path(repository).is_file()
+
+    repository = Repository(Context.instance())
+    assert repository.search(name).id == name
+    assert repository.search("irds.msmarco-passage.train").topics.id == name
+    assert {ds.id for module in repository.modules() for ds in module} == ids
+
+
+def test_columnar_topics(tmp_path, monkeypatch):
+    """irds topics are stored in (cached) columns"""
+    from types import SimpleNamespace
+
+    from ir_datasets.datasets.dpr_w100 import DprW100Query
+    from ir_datasets.formats import GenericQuery
+
+    from datamaestro_text.data.ir import IDItem, TextItem
+    from datamaestro_text.datasets.irds.data import Topics
+
+    monkeypatch.setattr(Context, "cachepath", property(lambda self: tmp_path))
+    queries = [GenericQuery(f"q{ix}", f"query {ix} é") for ix in range(10, 0, -1)]
+    answers = [DprW100Query("1", "who?", ("a", "b")), DprW100Query("2", "b", ())]
+
+    for _ in range(2):
+        # The second time, the cache is used
+        topics = Topics.C(id="", irds="test/queries").instance()
+        topics.__dict__["dataset"] = SimpleNamespace(
+            queries_cls=lambda: GenericQuery, queries_iter=lambda: iter(queries)
+        )
+        assert [topic[IDItem].id for topic in topics.iter()] == [
+            query.query_id for query in queries
+        ]
+        assert topics.topic_ext("q3")[TextItem].text == "query 3 é"
+        assert topics.topic_int(0)[IDItem].id == "q10"
+        assert [t[IDItem].id for t in topics.topics_ext(["q1", "q5"])] == ["q1", "q5"]
+        assert topics.columns_ext(["q2", "q7"], ["text"]) == {
+            "text": ["query 2 é", "query 7 é"]
+        }
+        with pytest.raises(KeyError):
+            topics.topic_ext("q11")
+    cache_path = tmp_path / "irds" / "topics" / "test_queries"
+    assert (cache_path / "meta.json").is_file()
+
+    # A stale cache is replaced (arrays that are in use are not modified)
+    meta = json.loads((cache_path / "meta.json").read_text())
+    (cache_path / "meta.json").write_text(json.dumps({**meta, "version": -1}))
+    columns = topics.handler.columns
+    topics = Topics.C(id="", irds="test/queries").instance()
+    topics.__dict__["dataset"] = SimpleNamespace(
+        queries_cls=lambda: GenericQuery, queries_iter=lambda: iter(queries[:2])
+    )
+    assert topics.columns_ext(["q9"], ["text"]) == {"text": ["query 9 é"]}
+    assert len(columns) == 10 and columns.sorted_ids[0] == b"q1"
+    assert sorted(path.name for path in cache_path.parent.iterdir()) == [
+        "test_queries",
+        "test_queries.lock",
+    ]
+
+    # Non-string fields are JSON-encoded
+    topics = Topics.C(id="", irds="test/answers").instance()
+    topics.__dict__["dataset"] = SimpleNamespace(
+        queries_cls=lambda: DprW100Query, queries_iter=lambda: iter(answers)
+    )
+    assert topics.columns_ext(["2", "1"]) == {
+        "query_id": ["2", "1"],
+        "text": ["b", "who?"],
+        "answers": [(), ("a", "b")],
+    }
+
+
+def test_columnar_topics_values():
+    """Field values are preserved (or rejected), the last duplicate is used"""
+    import datetime
+
+    from datamaestro_text.data.ir.topics import ColumnarTopics
+
+    rows = [
+        ("1", "a", {"k": ["x", "y"]}, ({"s": "t"},), None),
+        ("2", "b", None, (), (1, 2)),
+        ("1", "c", {}, ("u",), ()),
+    ]
+    fields = ["id", "text", "meta", "tuple", "optional"]
+    topics = ColumnarTopics.from_rows(fields, rows)
+    assert [topics.row(ix) for ix in range(3)] == rows
+    assert topics.column("optional", [0, 1]) == [None, (1, 2)]
+    assert topics.index("1") == 2
+    assert topics.indices(["2", "1"]).tolist() == [1, 2]
+    with pytest.raises(KeyError):
+        topics.index("0")
+
+    # Values that would not be decoded as is are rejected
+    for value in [datetime.date(2020, 1, 1), (("a", 1),), {1: "a"}]:
+        with pytest.raises(TypeError, match="topic field value"):
+            ColumnarTopics.from_rows(["id", "value"], [("1", value)])
+
+
+def test_batch_conversion():
+    """Documents are converted by batches"""
+    import logging
+    import time
+    from types import SimpleNamespace
+
+    from ir_datasets.datasets.msmarco_passage_v2 import MsMarcoV2Passage
+    from ir_datasets.formats import GenericDoc
+
+    from datamaestro.record import record_type
+
+    from datamaestro_text.data.ir import IDItem, SimpleTextItem, TextItem, formats
+    from datamaestro_text.datasets.irds.data import Documents
+
+    docs = [
+        MsMarcoV2Passage(f"p{ix}", f"passage {ix}", ((0, 7),), f"d{ix // 3}")
+        for ix in range(10_000)
+    ]
+    documents = Documents.C(id="", irds="test/passages").instance()
+    documents.__dict__["dataset"] = SimpleNamespace(docs_cls=lambda: MsMarcoV2Passage)
+    documents.__dict__["store"] = docs
+
+    converter, recordtype = documents.converter, documents.document_recordtype
+    batches = list(documents.iter_batches(4096))
+    assert [len(batch) for batch in batches] == [4096, 4096, 1808]
+    records = [record for batch in batches for record in batch]
+    for doc, record in zip(docs[::97], records[::97]):
+        expected = converter(recordtype, doc)
+        assert record[IDItem].id == expected[IDItem].id
+        assert record[formats.MsMarcoV2Passage] == expected[formats.MsMarcoV2Passage]
+    assert [doc[IDItem].id for doc in documents.iter()] == [d.doc_id for d in docs]
+
+    columns = next(documents.iter_columns(3, ["doc_id", "msmarco_document_id"]))
+    assert columns == {"doc_id": ["p0", "p1", "p2"], "msmarco_document_id": ["d0"] * 3}
+
+    generic = Documents.CONVERTERS[GenericDoc]
+    generic_type = record_type(IDItem, SimpleTextItem)
+    (record,) = generic.convert_batch(generic_type, [GenericDoc("a", "text")])
+    assert record[TextItem].text == "text"
+
+    start = time.perf_counter()
+    [converter(recordtype, doc) for doc in docs]
+    single = time.perf_counter() - start
+    start = time.perf_counter()
+    converter.convert_batch(recordtype, docs)
+    batch = time.perf_counter() - start
+    logging.info(
+        "Conversion: %.0f docs/sec (batch), %.0f docs/sec (single)",
+        len(docs) / batch,
+        len(docs) / single,
+    )
+
+
+def test_compact_records():
+    """Compact records behave as records, and use less memory"""
+    import logging
+    import pickle
+    import time
+    import tracemalloc
+    from types import SimpleNamespace
+
+    from ir_datasets.formats import GenericDoc
+
+    from datamaestro_text.data.ir import CompactRecord, IDItem, SimpleTextItem, TextItem
+    from datamaestro_text.data.ir.base import UrlItem
+    from datamaestro_text.datasets.irds.data import Documents
+
+    docs = [GenericDoc(f"d{ix}", f"text {ix}") for ix in range(10_000)]
+    stats = {}
+    for compact in (False, True):
+        documents = Documents.C(
+            id="", irds="test/docs", compact_records=compact
+        ).instance()
+        documents.__dict__["dataset"] = SimpleNamespace(docs_cls=lambda: GenericDoc)
+        documents.__dict__["store"] = docs
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        records = list(documents.iter())
+        elapsed = time.perf_counter() - start
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats[compact] = memory
+        logging.info(
+            "compact=%s: %.0f docs/sec, %.0f bytes/doc",
+            compact,
+            len(docs) / elapsed,
+            memory / len(docs),
+        )
+
+        assert isinstance(records[0], CompactRecord) == compact
+        assert all(isinstance(r, CompactRecord) == compact for r in records[1:])
+        record = records[42]
+        assert record[IDItem].id == "d42"
+        assert record[TextItem].text == "text 42"
+        assert record.has(TextItem) and not record.has(UrlItem)
+        assert record.get(UrlItem) is None
+        assert list(record.items.values()) == [IDItem("d42"), SimpleTextItem("text 42")]
+        assert pickle.loads(pickle.dumps(record))[IDItem].id == "d42"
+        with pytest.raises(KeyError):
+            record[UrlItem]
+
+    assert stats[True] < stats[False]
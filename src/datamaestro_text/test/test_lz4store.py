@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pytest
+
+from ir_datasets.indices import PickleLz4FullStore
+
+from datamaestro_text.data.ir import IDItem
+from datamaestro_text.data.ir.stores import CachedDocumentStore, OrConvQADocumentStore
+from datamaestro_text.datasets.irds.helpers import build_lz4docstore, lz4docstore_ids
+
+
+class Document(NamedTuple):
+    id: str
+    text: str
+
+
+DOCUMENTS = [Document(f"doc-{ix}", f"text of document {ix}") for ix in range(103)]
+
+
+def documents(shard: int = 0, num_shards: int = 1):
+    start = len(DOCUMENTS) * shard // num_shards
+    end = len(DOCUMENTS) * (shard + 1) // num_shards
+    return iter(DOCUMENTS[start:end])
+
+
+def test_parallel_build(tmp_path):
+    """A store built in parallel is the same as a sequential one"""
+    build_lz4docstore(tmp_path / "seq", documents, Document, "id")
+    build_lz4docstore(tmp_path / "par", documents, Document, "id", num_workers=4)
+
+    for name in ["bin", "bin.pos", "idx.id.key", "idx.id.pos", "idx.id.meta"]:
+        assert (tmp_path / "seq" / name).read_bytes() == (
+            tmp_path / "par" / name
+        ).read_bytes(), f"{name} differs"
+
+    store = PickleLz4FullStore(tmp_path / "par", None, Document, "id", ["id"])
+    assert store.count() == len(DOCUMENTS)
+    assert store.get("doc-42") == DOCUMENTS[42]
+    assert list(store) == DOCUMENTS
+
+
+class PreparedDocuments:
+    """Documents whose shards can only be read once prepared"""
+
+    def __init__(self):
+        self.prepared_by = None
+
+    def prepare(self):
+        self.prepared_by = os.getpid()
+
+    def __call__(self, shard: int = 0, num_shards: int = 1):
+        # Prepared once, by the parent process
+        assert self.prepared_by == os.getppid()
+        return documents(shard, num_shards)
+
+
+def test_parallel_build_prepare(tmp_path):
+    """Iterator factories are prepared once, before forking"""
+    build_lz4docstore(tmp_path, PreparedDocuments(), Document, "id", num_workers=2)
+    store = PickleLz4FullStore(tmp_path, None, Document, "id", ["id"])
+    assert list(store) == DOCUMENTS
+
+
+def test_ids(tmp_path):
+    """IDs are read from the lookup index in store order"""
+    build_lz4docstore(tmp_path, documents, Document, "id")
+    assert list(lz4docstore_ids(tmp_path, "id")) == [doc.id for doc in DOCUMENTS]
+
+
+def test_shards(tmp_path):
+    """Shards of a LZ4 store cover all the documents"""
+    Doc = OrConvQADocumentStore.NAMED_TUPLE
+    docs = [Doc(f"doc-{ix}", "title", f"body {ix}", "a", ix) for ix in range(50)]
+    build_lz4docstore(tmp_path, lambda: iter(docs), Doc, "id")
+    store = OrConvQADocumentStore.C(id="", path=tmp_path).instance()
+
+    shards = [[doc[IDItem].id for doc in store.shard(ix, 3)] for ix in range(3)]
+    assert [len(shard) for shard in shards] == [16, 17, 17]
+    assert sum(shards, []) == [doc.id for doc in docs]
+    assert [doc[IDItem].id for doc in store.iter_range(48)] == ["doc-48", "doc-49"]
+
+
+def test_parallel_iter(tmp_path):
+    """Parallel iteration returns the same documents"""
+    Doc = OrConvQADocumentStore.NAMED_TUPLE
+    docs = [Doc(f"doc-{ix}", "title", f"body {ix}", "a", ix) for ix in range(100)]
+    build_lz4docstore(tmp_path, lambda: iter(docs), Doc, "id")
+    store = OrConvQADocumentStore.C(id="", path=tmp_path).instance()
+
+    expected = [doc.id for doc in docs]
+    assert [doc[IDItem].id for doc in store.iter(parallel=3, batch_size=7)] == expected
+    unordered = store.iter(parallel=3, ordered=False, batch_size=7)
+    assert sorted(doc[IDItem].id for doc in unordered) == sorted(expected)
+
+
+def test_cached_store(tmp_path):
+    Doc = OrConvQADocumentStore.NAMED_TUPLE
+    docs = [Doc(f"doc-{ix}", "title", f"body {ix}", "a", ix) for ix in range(10)]
+    build_lz4docstore(tmp_path, lambda: iter(docs), Doc, "id")
+    store = CachedDocumentStore.C(
+        id="", store=OrConvQADocumentStore.C(id="", path=tmp_path), cache_size=3
+    ).instance()
+
+    assert store.document_ext("doc-1")[IDItem].id == "doc-1"
+    assert store.document_ext("doc-1") is store.document_ext("doc-1")
+    ids = ["doc-2", "doc-1", "doc-3", "doc-2"]
+    assert [doc[IDItem].id for doc in store.documents_ext(ids)] == ids
+    assert store.document_ext("doc-4")
+
+    # Hits for doc-1 only; doc-4 evicts doc-1 (least recently used)
+    assert store.statistics() == (3, 4, 1, 3)
+
+
+def test_batch_lookup(tmp_path):
+    """Batched lookups return the same documents as single ones"""
+    Doc = OrConvQADocumentStore.NAMED_TUPLE
+    docs = [Doc(f"doc-{ix}", "title", f"body {ix}", "a", ix) for ix in range(5000)]
+    build_lz4docstore(tmp_path, lambda: iter(docs), Doc, "id")
+    store = OrConvQADocumentStore.C(id="", path=tmp_path).instance()
+
+    ids = ["doc-7", "doc-4999", "doc-7", "doc-0", "doc-12"]
+    assert [doc[IDItem].id for doc in store.documents_ext(ids)] == ids
+    assert store.documents_ext([]) == []
+    with pytest.raises(KeyError):
+        store.documents_ext(["doc-1", "doc-5000"])
+
+    # Reports the throughput for random batches
+    random = np.random.default_rng(0)
+    for batch_size in [64, 256, 1024, 4096]:
+        ids = [f"doc-{ix}" for ix in random.integers(0, len(docs), batch_size)]
+        start = time.perf_counter()
+        retrieved = store.documents_ext(ids)
+        elapsed = time.perf_counter() - start
+        assert [doc[IDItem].id for doc in retrieved] == ids
+        logging.info("Batch of %d: %.0f docs/sec", batch_size, batch_size / elapsed)
+
+
+def test_async(tmp_path):
+    """Concurrent asynchronous requests are merged into batches"""
+    Doc = OrConvQADocumentStore.NAMED_TUPLE
+    docs = [Doc(f"doc-{ix}", "title", f"body {ix}", "a", ix) for ix in range(100)]
+    build_lz4docstore(tmp_path, lambda: iter(docs), Doc, "id")
+    store = OrConvQADocumentStore.C(id="", path=tmp_path).instance()
+
+    batches = []
+    documents_ext = store.documents_ext
+    store.documents_ext = lambda ids: batches.append(ids) or documents_ext(ids)
+
+    async def run():
+        ids = [f"doc-{ix}" for ix in range(0, 100, 7)]
+        requests = [store.adocument_ext(docid) for docid in ids]
+        requests.append(store.adocuments_ext(["doc-1", "doc-2"]))
+        requests.append(store.adocument_ext("unknown"))
+        results = await asyncio.gather(*requests, return_exceptions=True)
+
+        assert [doc[IDItem].id for doc in results[: len(ids)]] == ids
+        assert [doc[IDItem].id for doc in results[-2]] == ["doc-1", "doc-2"]
+        assert isinstance(results[-1], KeyError)
+
+        # One batch, then one request per document after the failure
+        assert len(batches[0]) == len(ids) + 3
+        assert len(batches) == len(ids) + 4
+
+        return [doc[IDItem].id async for doc in store.aiter(batch_size=30)]
+
+    assert asyncio.run(run()) == [doc.id for doc in docs]
+
+    cached = CachedDocumentStore.C(
+        id="", store=OrConvQADocumentStore.C(id="", path=tmp_path)
+    ).instance()
+
+    async def run_cached():
+        return [doc[IDItem].id async for doc in cached.aiter(batch_size=30)]
+
+    assert asyncio.run(run_cached()) == [doc.id for doc in docs]
+
+
+def test_raw(tmp_path):
+    """Raw documents are memory views over the UTF-8 ID and text fields"""
+    Doc = OrConvQADocumentStore.NAMED_TUPLE
+    docs = [Doc(f"doc-{ix}", f"tïtle {ix}", "body" * ix, "a", ix) for ix in range(100)]
+    docs[3] = Doc("doc-3", "same", "same", "a", 3)
+    build_lz4docstore(tmp_path, lambda: iter(docs), Doc, "id")
+    store = OrConvQADocumentStore.C(id="", path=tmp_path).instance()
+
+    expected = [
+        tuple(value.encode("utf-8") for value in (doc.id, doc.title, doc.body))
+        for doc in docs
+    ]
+    raw = list(store.iter_raw(batch_size=7))
+    assert all(isinstance(view, memoryview) for view in raw[0])
+    assert [tuple(bytes(view) for view in doc) for doc in raw] == expected
+
+    ids = ["doc-3", "doc-99", "doc-3"]
+    raw = store.documents_ext_raw(ids)
+    assert [tuple(bytes(view) for view in doc) for doc in raw] == [
+        expected[3],
+        expected[99],
+        expected[3],
+    ]
@@ -0,0 +1,36 @@
+import pickle
+
+import pytest
+
+from datamaestro_text.utils.pickles import pickled_tuple_spans
+
+VALUES = [
+    ("doc-1", "text", 3, None),
+    ("é" * 300, "x" * 70000, -5, 2**80, 1.5, True),
+    ("a", ["x", ("y", 2)], {"k": "v"}, b"raw", "a"),
+    ("a", "a", "a"),
+    ("a",),
+    (),
+]
+
+
+@pytest.mark.parametrize("protocol", [3, 4, 5])
+def test_pickled_tuple_spans(protocol):
+    for value in VALUES:
+        data = pickle.dumps(value, protocol=protocol)
+        spans = pickled_tuple_spans(data)
+        assert len(spans) == len(value)
+        for field, span in zip(value, spans):
+            if isinstance(field, str):
+                assert data[span[0] : span[1]] == field.encode("utf-8")
+            elif isinstance(field, bytes):
+                assert data[span[0] : span[1]] == field
+            else:
+                assert span is None
+
+
+def test_pickled_tuple_spans_unsupported():
+    with pytest.raises(ValueError):
+        pickled_tuple_spans(pickle.dumps((object(),)))
+    with pytest.raises(ValueError):
+        pickled_tuple_spans(pickle.dumps(["not", "a", "tuple"]))
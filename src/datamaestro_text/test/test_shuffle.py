@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+
+from datamaestro_text.utils.shuffle import shuffle
+
+
+def test_shuffle(tmp_path):
+    """Shuffling outputs a (deterministic) permutation of the input"""
+    lines = [f"line {ix}\n" for ix in range(1000)]
+
+    def run(seed):
+        output = io.StringIO()
+        shuffle(
+            iter(lines),
+            output,
+            memory=500,
+            random=np.random.RandomState(seed),
+            tmp_path=tmp_path,
+            num_workers=2,
+        )
+        return output.getvalue().splitlines(keepends=True)
+
+    shuffled = run(1)
+    assert sorted(shuffled) == sorted(lines)
+    assert shuffled != lines
+    assert run(1) == shuffled
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_shuffle_binary(tmp_path):
+    """Binary triplets are shuffled by chunks (a permutation of the input)"""
+    from types import SimpleNamespace
+
+    from datamaestro_text.data.ir import IDItem, TrainingTripletsArray
+    from datamaestro_text.transforms.ir import ShuffledTrainingTripletsLines
+
+    triplets = [(f"q{ix % 7}", f"d{ix}", f"d{ix + 1}") for ix in range(100)]
+
+    def run(seed):
+        task = SimpleNamespace(tmp_path=tmp_path / "tmp", path=tmp_path / str(seed))
+        task.tmp_path.mkdir(exist_ok=True)
+        ShuffledTrainingTripletsLines._shuffle_binary(
+            task, iter(triplets), np.random.RandomState(seed), chunk_size=16
+        )
+        output = TrainingTripletsArray.C(id="", path=task.path).instance()
+        return [
+            tuple(record[IDItem].id for record in triplet) for triplet in output.iter()
+        ]
+
+    shuffled = run(1)
+    assert sorted(shuffled) == sorted(triplets)
+    assert shuffled != triplets
+    assert run(1) == shuffled
+    assert list((tmp_path / "tmp").iterdir()) == []
@@ -0,0 +1,178 @@
+import pytest
+
+from datamaestro_text.interfaces.trec import parse_run, write_run_dict
+
+RUN = """q1 Q0 d1 1 2.5 model
+q1 Q0 d2 2 1.5 model
+q0 Q0 d2 1 3 model
+q0 Q0 d3 2 0.25 model
+q1 Q0 d3 3 -1 model
+"""
+
+
+def test_run(tmp_path):
+    path = tmp_path / "run.txt"
+    path.write_text(RUN)
+
+    run = parse_run(path)
+    assert list(run) == ["q1", "q0"]
+    assert run["q1"] == {"d1": 2.5, "d2": 1.5, "d3": -1.0}
+    assert run["q0"] == {"d2": 3.0, "d3": 0.25}
+    assert run.offsets.tolist() == [0, 3, 5]
+
+    # Columnar and dictionary runs are written the same way
+    write_run_dict(run, tmp_path / "columnar.txt")
+    write_run_dict(dict(run), tmp_path / "dict.txt")
+    assert (tmp_path / "columnar.txt").read_text() == (
+        tmp_path / "dict.txt"
+    ).read_text()
+    assert parse_run(tmp_path / "columnar.txt") == run
+
+
+def test_run_scores(tmp_path):
+    """Scores are written the same way, whatever the run representation"""
+    from datamaestro_text.data.ir.runs import ColumnarAdhocRun
+    from datamaestro_text.data.ir.trec import TrecAdhocRun
+
+    run = {"q1": {"d1": 1 / 3, "d2": 0.1, "d3": 1e-7}, "q2": {"d1": 2.0}}
+    write_run_dict(ColumnarAdhocRun.from_dict(run), tmp_path / "columnar.txt")
+    write_run_dict(run, tmp_path / "dict.txt")
+    text = (tmp_path / "dict.txt").read_text()
+    assert (tmp_path / "columnar.txt").read_text() == text
+    assert "d2 2 0.1 run" in text
+
+    # get_dict returns a plain dictionary (with float scores)
+    loaded = TrecAdhocRun.C(id="", path=tmp_path / "dict.txt").instance().get_dict()
+    assert type(loaded) is dict and type(loaded["q1"]) is dict
+    assert loaded == run
+
+
+QRELS = """q2 0 d1 1
+q2 0 d2 0
+q10 0 d3 2
+q10 0 d1 -1
+"""
+
+
+def test_qrels(tmp_path):
+    from datamaestro_text.data.ir.trec import TrecAdhocAssessments
+
+    path = tmp_path / "qrels.txt"
+    path.write_text(QRELS)
+
+    for _ in range(2):
+        # The second time, the binary cache is used
+        qrels = TrecAdhocAssessments.C(id="", path=path).instance()
+        assert qrels.get("q2") == {"d1": 1, "d2": 0}
+        assert qrels.relevant_docs("q10") == ["d3"]
+        assert qrels.relevant_docs("q10", min_rel=-1) == ["d3", "d1"]
+        assert qrels.get("q3") == {}
+        assert {
+            topic.topic_id: [(a.doc_id, a.rel) for a in topic.assessments]
+            for topic in qrels.iter()
+        } == {"q2": [("d1", 1), ("d2", 0)], "q10": [("d3", 2), ("d1", -1)]}
+
+    assert (tmp_path / "qrels.txt.cache" / "meta.json").is_file()
+
+    # The cache is replaced (not rewritten) when the file changes, so that
+    # memory-mapped arrays stay valid
+    path.write_text(QRELS + "q3 0 d4 1\n")
+    assert TrecAdhocAssessments.C(id="", path=path).instance().get("q3") == {"d4": 1}
+    assert qrels.get("q2") == {"d1": 1, "d2": 0}
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "qrels.txt",
+        "qrels.txt.cache",
+        "qrels.txt.cache.lock",
+    ]
+
+
+TOPICS = """<top>
+<num> Number: 301
+<title> International Organized Crime
+
+<desc> Description:
+Identify organizations that participate in international
+** translator comment
+criminal activity.
+
+<narr> Narrative:
+A relevant document must as a minimum identify the organization.
+</top>
+
+<top>
+<num> Number: 302
+<title>
+Poliomyelitis and
+Post-Polio
+<desc> Description:
+Is the disease still a problem?
+</top>
+"""
+
+
+def test_topics(tmp_path):
+    from datamaestro_text.data.ir.base import IDItem
+    from datamaestro_text.data.ir.formats import TrecTopic
+    from datamaestro_text.data.ir.trec import TrecTopics
+
+    path = tmp_path / "topics.txt"
+    path.write_text(TOPICS)
+
+    for _ in range(2):
+        # The second time, the cache is used
+        topics = TrecTopics.C(id="", path=path, parts=["title"]).instance()
+        assert [topic[IDItem].id for topic in topics.iter()] == ["301", "302"]
+        assert topics.count() == 2
+
+        topic = topics.topic_ext("301")[TrecTopic]
+        assert topic.text == "International Organized Crime"
+        assert topic.description == (
+            "Identify organizations that participate in international "
+            "criminal activity."
+        )
+        assert topic.narrative == (
+            "A relevant document must as a minimum identify the organization."
+        )
+
+        topic = topics.topic_int(1)[TrecTopic]
+        assert (topic.text, topic.description, topic.narrative) == (
+            "Poliomyelitis and Post-Polio",
+            "Is the disease still a problem?",
+            "",
+        )
+
+    assert (tmp_path / "topics.txt.cache" / "meta.json").is_file()
+
+
+def test_topics_cache(tmp_path):
+    from datamaestro_text.interfaces.trec import load_topics
+
+    path = tmp_path / "topics.txt"
+    path.write_text(TOPICS)
+    assert [fields[0] for fields in load_topics(path)] == ["301", "302"]
+
+    # The cache is rebuilt when the file changes
+    path.write_text(TOPICS.replace("302", "303"))
+    assert [fields[0] for fields in load_topics(path)] == ["301", "303"]
+    assert [fields[0] for fields in load_topics(path)] == ["301", "303"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "topics.txt",
+        "topics.txt.cache",
+        "topics.txt.cache.lock",
+    ]
+
+
+def test_run_malformed(tmp_path):
+    """Lines with a wrong number of columns are reported"""
+    path = tmp_path / "run.txt"
+    lines = RUN.splitlines(keepends=True)
+    # Same number of tokens overall, but not on each line
+    lines[2] = "q0 Q0 d2 1 3\n"
+    lines[3] = "q0 Q0 d3 2 0.25 model extra\n"
+    path.write_text("".join(lines))
+    with pytest.raises(ValueError, match="run.txt, line 3: expected 6 columns"):
+        parse_run(path)
+
+    # Blank lines are ignored
+    path.write_text(RUN.replace("\n", "\n\n"))
+    assert parse_run(path)["q1"] == {"d1": 2.5, "d2": 1.5, "d3": -1.0}
@@ -0,0 +1,83 @@
+import gzip
+
+import numpy as np
+import pytest
+
+from datamaestro_text.data.ir import (
+    IDItem,
+    TrainingTripletsArray,
+    TrainingTripletsLines,
+)
+
+LINES = "".join(f"q{ix}\tp{ix}\tn{ix}\n" for ix in range(3000))
+
+
+@pytest.mark.parametrize("name", ["triplets.tsv", "triplets.tsv.gz"])
+def test_triplets_random_access(tmp_path, name):
+    path = tmp_path / name
+    if name.endswith(".gz"):
+        path.write_bytes(gzip.compress(LINES.encode()))
+    else:
+        path.write_text(LINES)
+
+    triplets = TrainingTripletsLines.C(
+        id="", path=path, doc_ids=True, topic_ids=True
+    ).instance()
+
+    def ids(triplet):
+        return tuple(record[IDItem].id for record in triplet)
+
+    if triplets.line_index.seekable:
+        assert ids(triplets[1500]) == ("q1500", "p1500", "n1500")
+        assert ids(triplets[-1]) == ("q2999", "p2999", "n2999")
+    else:
+        # gzip without indexed_gzip: random access fails
+        with pytest.raises(RuntimeError, match="indexed_gzip"):
+            triplets[1500]
+    assert ids(triplets[5]) == ("q5", "p5", "n5")
+    assert triplets.count() == 3000
+
+    # Iterating from a triplet always works (possibly decompressing the file)
+    assert [ids(t)[0] for t in triplets.iter_from(2998)] == ["q2998", "q2999"]
+    shards = [[ids(t)[0] for t in triplets.shard(rank, 4)] for rank in range(4)]
+    assert sum(shards, []) == [ids(t)[0] for t in triplets.iter()]
+
+    # The line index is rebuilt when the file changes
+    more = LINES + "q3000\tp3000\tn3000\n"
+    if name.endswith(".gz"):
+        path.write_bytes(gzip.compress(more.encode()))
+    else:
+        path.write_text(more)
+    triplets = TrainingTripletsLines.C(
+        id="", path=path, doc_ids=True, topic_ids=True
+    ).instance()
+    assert triplets.count() == 3001
+    assert [ids(t)[0] for t in triplets.iter_from(3000)] == ["q3000"]
+    if triplets.line_index.seekable:
+        assert ids(triplets[-1]) == ("q3000", "p3000", "n3000")
+
+
+def test_triplets_array(tmp_path):
+    """Binary triplets give random access to ID triplets"""
+    topic_ids = np.array([b"q1", b"q2"])
+    doc_ids = np.array([b"d1", b"d2", b"d3"])
+    codes = np.array([[0, 1, 2], [1, 0, 2], [1, 2, 0]], dtype=np.int32)
+    TrainingTripletsArray.write(tmp_path / "triplets", codes, topic_ids, doc_ids)
+
+    triplets = TrainingTripletsArray.C(id="", path=tmp_path / "triplets").instance()
+
+    def ids(triplet):
+        return tuple(record[IDItem].id for record in triplet)
+
+    assert triplets.count() == 3
+    assert [ids(t) for t in triplets.iter()] == [
+        ("q1", "d2", "d3"),
+        ("q2", "d1", "d3"),
+        ("q2", "d3", "d1"),
+    ]
+    assert ids(triplets[-1]) == ("q2", "d3", "d1")
+    assert [ids(t) for t in triplets.shard(1, 2)] == [
+        ("q2", "d1", "d3"),
+        ("q2", "d3", "d1"),
+    ]
+    assert (triplets.codes(1, 2) == codes[1:2]).all()
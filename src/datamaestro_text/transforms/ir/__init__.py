@@ -2,14 +2,30 @@ import logging
 import gzip
 from abc import ABC, abstractmethod
 from pathlib import Path
-from experimaestro import Config, Task, Param, Annotated, pathgenerator, Option, tqdm
+from typing import List
+from experimaestro import (
+    Config,
+    Task,
+    Param,
+    Meta,
+    Annotated,
+    pathgenerator,
+    Option,
+    field,
+    tqdm,
+)
 import numpy as np
 from datamaestro.record import RecordType
 import datamaestro_text.data.ir as ir
-from datamaestro_text.utils.shuffle import shuffle
+from datamaestro_text.data.ir.arrow import FORMATS, ArrowDocuments, write_documents
+from datamaestro_text.utils.iter import prefetch_map
+from datamaestro_text.utils.shuffle import interleave_counts, shuffle
 
 
 def getpathname(context, config):
+    if config.binary:
+        return context.currentpath() / "triplets"
+
     name = "triplets.lst"
     if config.compressed:
         name = "triplets.lst.gz"
@@ -28,6 +44,9 @@ class StoreTrainingTripletTopicAdapter(ir.TrainingTriplets):
     data: Param[ir.TrainingTriplets]
     """Input data"""
 
+    prefetch: Meta[int] = 2
+    """Number of batches fetched in advance (in a background thread)"""
+
     def __validate__(self):
         assert self.data.topic_recordtype.has(ir.IDItem), (
             f"Topics {self.data.topic_recordtype}"
@@ -38,6 +57,17 @@ class StoreTrainingTripletTopicAdapter(ir.TrainingTriplets):
         for topic, doc1, doc2 in self.data.iter():
             yield self.store.topic_ext(topic[ir.IDItem].id), doc1, doc2
 
+    def _fetch(self, triplets: List[ir.Triplets]) -> List[ir.Triplets]:
+        """Retrieves the topics of a batch (one lookup per distinct topic)"""
+        topic_ids = list(dict.fromkeys(topic[ir.IDItem].id for topic, _, _ in triplets))
+        topics = dict(zip(topic_ids, self.store.topics_ext(topic_ids)))
+        return [
+            (topics[topic[ir.IDItem].id], doc1, doc2) for topic, doc1, doc2 in triplets
+        ]
+
+    def batch_iter(self, size: int):
+        return prefetch_map(self._fetch, self.data.batch_iter(size), self.prefetch)
+
     def count(self):
         return self.data.count()
 
@@ -63,6 +93,9 @@ class StoreTrainingTripletDocumentAdapter(ir.TrainingTriplets):
     data: Param[ir.TrainingTriplets]
     """Input data"""
 
+    prefetch: Meta[int] = 2
+    """Number of batches fetched in advance (in a background thread)"""
+
     def __validate__(self):
         assert self.data.document_recordtype.has(ir.IDItem), "Documents have no ID"
 
@@ -73,16 +106,23 @@ class StoreTrainingTripletDocumentAdapter(ir.TrainingTriplets):
             )
             yield topic, doc1, doc2
 
+    def _fetch(self, triplets: List[ir.Triplets]) -> List[ir.Triplets]:
+        """Retrieves the documents of a batch (one call to `documents_ext`)"""
+        docids = list(
+            dict.fromkeys(
+                docid
+                for _, doc1, doc2 in triplets
+                for docid in (doc1[ir.IDItem].id, doc2[ir.IDItem].id)
+            )
+        )
+        documents = dict(zip(docids, self.store.documents_ext(docids)))
+        return [
+            (topic, documents[doc1[ir.IDItem].id], documents[doc2[ir.IDItem].id])
+            for topic, doc1, doc2 in triplets
+        ]
+
     def batch_iter(self, size: int):
-        for triplets in self.data.batch_iter(size):
-            docids = []
-            for topic, doc1, doc2 in triplets:
-                docids.extend(doc1[ir.IDItem].id, doc2[ir.IDItem].id)
-            docs_iter = iter(self.store.documents_ext(docids))
-            for triplet in triplets:
-                triplet[1] = next(docs_iter)
-                triplet[2] = next(docs_iter)
-            yield triplets
+        return prefetch_map(self._fetch, self.data.batch_iter(size), self.prefetch)
 
     def count(self):
         return self.data.count()
@@ -90,12 +130,12 @@ class StoreTrainingTripletDocumentAdapter(ir.TrainingTriplets):
     @property
     def topic_recordtype(self) -> RecordType:
         """The class for topics"""
-        return self.store.topic_recordtype
+        return self.data.topic_recordtype
 
     @property
     def document_recordtype(self) -> RecordType:
         """The class for documents"""
-        return self.data.document_recordtype
+        return self.store.document_recordtype
 
 
 class ShuffledTrainingTripletsLines(Task):
@@ -128,7 +168,19 @@ class ShuffledTrainingTripletsLines(Task):
     tmp_path: Annotated[Path, pathgenerator("tmp")]
     """Path where temporary files will be stored"""
 
+    num_workers: Meta[int] = 4
+    """Number of processes used to shuffle the temporary files"""
+
+    binary: Param[bool] = field(default=False, ignore_default=True)
+    """Outputs a binary array of topic and document IDs codes (requires
+    `topic_ids` and `doc_ids`) rather than a text file"""
+
     def __validate__(self):
+        if self.binary:
+            assert self.topic_ids and self.doc_ids, (
+                "Binary output requires topic and document IDs"
+            )
+
         if self.topic_ids:
             assert self.data.topic_recordtype.has(ir.IDItem), (
                 f"No topic ID in the source data ({self.data.topic_recordtype})"
@@ -148,6 +200,9 @@ class ShuffledTrainingTripletsLines(Task):
             )
 
     def task_outputs(self, dep):
+        if self.binary:
+            return dep(ir.TrainingTripletsArray.C(id="", path=self.path))
+
         return dep(
             ir.TrainingTripletsLines.C(
                 id="",
@@ -200,7 +255,7 @@ class ShuffledTrainingTripletsLines(Task):
 
                 pbar.update(1)
                 count += 1
-                yield f"{get_query(query)}\t{get_doc(doca)}\t{get_doc(docb)}\n"
+                yield get_query(query), get_doc(doca), get_doc(docb)
 
                 if self.sample_max > 0 and count >= self.sample_max:
                     break
@@ -208,6 +263,11 @@ class ShuffledTrainingTripletsLines(Task):
             logging.info("Triples output ended (%d triples)", count)
 
         logging.info("Creating generator")
+        self.tmp_path.mkdir(exist_ok=True)
+
+        if self.binary:
+            self._shuffle_binary(triplegenerator(), random)
+            return
 
         # Output can be a stream or nothing
         if self.compressed:
@@ -216,8 +276,139 @@ class ShuffledTrainingTripletsLines(Task):
             output = self.path.open("wt")
 
         with output:
-            self.tmp_path.mkdir(exist_ok=True)
-            shuffle(triplegenerator(), output, random=random, tmp_path=self.tmp_path)
+            shuffle(
+                (f"{q}\t{pos}\t{neg}\n" for q, pos, neg in triplegenerator()),
+                output,
+                random=random,
+                tmp_path=self.tmp_path,
+                num_workers=self.num_workers,
+            )
+
+    def _shuffle_binary(self, triplets, random, chunk_size: int = 2**20):
+        """Encodes the triplets as integer codes and writes them shuffled"""
+        # Encode IDs (in order of first appearance) into a temporary file
+        topics, documents = {}, {}
+        count = 0
+        codes_path = self.tmp_path / "codes.bin"
+        with codes_path.open("wb") as fp:
+            chunk = np.empty((chunk_size, 3), dtype=np.int64)
+            for topic_id, pos_id, neg_id in triplets:
+                chunk[count % chunk_size] = (
+                    topics.setdefault(topic_id, len(topics)),
+                    documents.setdefault(pos_id, len(documents)),
+                    documents.setdefault(neg_id, len(documents)),
+                )
+                count += 1
+                if count % chunk_size == 0:
+                    chunk.tofile(fp)
+            chunk[: count % chunk_size].tofile(fp)
+
+        # Sort the IDs, and renumber codes accordingly
+        def sort_ids(vocabulary):
+            ids = np.array([key.encode("utf-8") for key in vocabulary], dtype=bytes)
+            order = np.argsort(ids, kind="stable")
+            ranks = np.empty(len(ids), dtype=np.int64)
+            ranks[order] = np.arange(len(ids))
+            return ids[order], ranks
+
+        topic_ids, topic_ranks = sort_ids(topics)
+        doc_ids, doc_ranks = sort_ids(documents)
+        del topics, documents
+
+        dtype = np.int32 if max(len(topic_ids), len(doc_ids)) < 2**31 else np.int64
+        self.path.mkdir(exist_ok=True)
+        np.save(self.path / "topic_ids.npy", topic_ids)
+        np.save(self.path / "doc_ids.npy", doc_ids)
+
+        if count == 0:
+            np.save(self.path / "triplets.npy", np.empty((0, 3), dtype=dtype))
+            codes_path.unlink()
+            return
+
+        # Shuffle each chunk of codes (in place), then randomly interleave
+        # the chunks (as in `shuffle`): only one chunk is in memory
+        logging.info("Shuffling %d triplets", count)
+        codes = np.memmap(codes_path, dtype=np.int64, mode="r+", shape=(count, 3))
+        starts = np.arange(0, count, chunk_size)
+        for start in starts.tolist():
+            chunk = codes[start : start + chunk_size]
+            chunk[:] = chunk[random.permutation(len(chunk))]
+        counts = np.minimum(starts + chunk_size, count) - starts
+
+        output = np.lib.format.open_memmap(
+            self.path / "triplets.npy", mode="w+", dtype=dtype, shape=(count, 3)
+        )
+        position = 0
+        for taken in interleave_counts(counts.tolist(), chunk_size, random):
+            block = np.concatenate(
+                [
+                    codes[start : start + size]
+                    for start, size in zip(starts.tolist(), taken.tolist())
+                ]
+            )
+            starts += taken
+            block = block[random.permutation(len(block))]
+
+            end = position + len(block)
+            output[position:end, 0] = topic_ranks[block[:, 0]]
+            output[position:end, 1] = doc_ranks[block[:, 1]]
+            output[position:end, 2] = doc_ranks[block[:, 2]]
+            position = end
+        output.flush()
+        del output, codes
+        codes_path.unlink()
+
+
+class DocumentsToArrow(Task):
+    """Exports documents to a columnar (Parquet or Arrow IPC) file
+
+    Each field of the documents is stored in its own column (see
+    :py:class:`~datamaestro_text.data.ir.arrow.ArrowDocuments`), so that
+    e.g. scanning document IDs or texts does not read the other fields.
+    Requires `pyarrow`.
+    """
+
+    documents: Param[ir.Documents]
+    """The documents to export"""
+
+    format: Param[str] = "parquet"
+    """The output format (parquet or arrow)"""
+
+    path: Annotated[
+        Path,
+        pathgenerator(
+            lambda context, config: context.currentpath() / f"documents.{config.format}"
+        ),
+    ]
+    """Output path"""
+
+    compression: Option[str] = "zstd"
+    """The compression codec (empty for no compression)"""
+
+    row_group_size: Option[int] = 2**16
+    """Number of documents in each row group (Parquet) or record batch
+    (Arrow IPC)"""
+
+    num_workers: Meta[int] = 4
+    """Number of processes converting documents (if the number of documents
+    is known)"""
+
+    def __validate__(self):
+        assert self.format in FORMATS, f"Unknown format {self.format}"
+
+    def task_outputs(self, dep):
+        return dep(ArrowDocuments.C(id="", path=self.path, format=self.format))
+
+    def execute(self):
+        count = write_documents(
+            self.documents,
+            self.path,
+            format=self.format,
+            compression=self.compression or None,
+            row_group_size=self.row_group_size,
+            num_workers=self.num_workers,
+        )
+        logging.info("Exported %d documents to %s", count, self.path)
 
 
 class TopicWrapper(Config, ABC):
@@ -0,0 +1,139 @@
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+
+class RequestBatcher(Generic[K, T]):
+    """Merges concurrent asynchronous requests into batched calls
+
+    Requests made within `window` seconds (or until `max_batch` keys are
+    pending) are fetched with one call to `fetch`, run in an executor. At most
+    `max_concurrency` batches are fetched at the same time.
+
+    A batcher is bound to the event loop it was created in.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[List[K]], List[T]],
+        *,
+        window: float = 0.001,
+        max_batch: int = 1024,
+        max_concurrency: int = 1,
+        executor: Optional[Executor] = None,
+    ):
+        self.fetch = fetch
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = executor
+        self.loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: List[Tuple[K, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    def get(self, key: K) -> Awaitable[T]:
+        """Requests one value"""
+        future = self.loop.create_future()
+        self._pending.append((key, future))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self.window, self.flush)
+        return future
+
+    async def get_many(self, keys: List[K]) -> List[T]:
+        """Requests several values (that can be merged with other requests)"""
+        return list(await asyncio.gather(*(self.get(key) for key in keys)))
+
+    def flush(self):
+        """Fetches the pending requests now"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._pending:
+            batch = self._pending[: self.max_batch]
+            del self._pending[: self.max_batch]
+            task = self.loop.create_task(self._fetch(batch))
+            # Keeps a reference to the task until it is done
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batch: List[Tuple[K, asyncio.Future]]):
+        batch = [(key, future) for key, future in batch if not future.done()]
+        if not batch:
+            return
+
+        async with self._semaphore:
+            keys = [key for key, _ in batch]
+            try:
+                values = await self.loop.run_in_executor(
+                    self.executor, self.fetch, keys
+                )
+            except Exception as exc:
+                if len(batch) == 1:
+                    if not batch[0][1].done():
+                        batch[0][1].set_exception(exc)
+                    return
+                # Fetches one by one below, so that only failing requests fail
+                values = None
+
+        if values is None:
+            await asyncio.gather(*(self._fetch([entry]) for entry in batch))
+            return
+
+        for (_, future), value in zip(batch, values):
+            if not future.done():
+                future.set_result(value)
+
+
+async def aiter_batches(
+    batches: Iterable[Callable[[], List[T]]],
+    *,
+    prefetch: int = 1,
+    executor: Optional[Executor] = None,
+) -> AsyncIterator[T]:
+    """Asynchronously iterates over batches computed in an executor
+
+    Iteration stops when the functions are exhausted, or at the first empty
+    batch.
+
+    :param batches: Functions returning each batch
+    :param prefetch: Number of batches computed ahead of the consumer (they
+        are computed concurrently if the executor has several workers)
+    :param executor: The executor (default one if None)
+    """
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    batches = iter(batches)
+    try:
+        while True:
+            while len(pending) <= prefetch and (batch := next(batches, None)):
+                pending.append(loop.run_in_executor(executor, batch))
+            if not pending:
+                return
+
+            values = await pending.popleft()
+            if not values:
+                return
+            for value in values:
+                yield value
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+from typing import Generic, Hashable, NamedTuple, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class CacheStatistics(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+
+
+class LRUCache(Generic[T]):
+    """A thread-safe LRU cache holding at most `maxsize` values"""
+
+    def __init__(self, maxsize: int):
+        assert maxsize > 0, "The cache size should be positive"
+        self.maxsize = maxsize
+        self._values: OrderedDict[Hashable, T] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[T]:
+        """Returns the cached value (or None), and marks it as recently used"""
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._values.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: T):
+        """Adds a value, evicting the least recently used ones if needed"""
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.maxsize:
+                self._values.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def statistics(self) -> CacheStatistics:
+        with self._lock:
+            return CacheStatistics(
+                self.hits, self.misses, self.evictions, len(self._values)
+            )
+
+    def __len__(self):
+        return len(self._values)
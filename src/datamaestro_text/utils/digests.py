@@ -0,0 +1,142 @@
+import logging
+import os
+from hashlib import blake2b
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Tuple
+
+import numpy as np
+from filelock import FileLock
+
+#: Size of the stored digests (e.g. MD5)
+DIGEST_SIZE = 16
+
+
+def key_hash(key: str) -> int:
+    """Hashes a key into a 64 bits integer"""
+    return int.from_bytes(
+        blake2b(key.encode("utf-8"), digest_size=8).digest(), "little"
+    )
+
+
+class DigestIndex:
+    """On-disk sorted table associating (hashed) string keys to digests
+
+    Keys are hashed to 64 bits integers and stored sorted in `<path>.key`,
+    while the 16 bytes digests are stored in the same order in
+    `<path>.digest`. Both files are memory-mapped, so lookups (binary search)
+    run in constant memory.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.keys = self._map(self.key_path(path), np.dtype("<u8"))
+        self.digests = self._map(self.digest_path(path), np.dtype(f"V{DIGEST_SIZE}"))
+        assert len(self.keys) == len(self.digests)
+
+    @staticmethod
+    def _map(path: Path, dtype: np.dtype) -> np.ndarray:
+        # Empty files cannot be memory-mapped
+        if path.stat().st_size == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    @staticmethod
+    def key_path(path: Path):
+        return path.with_name(f"{path.name}.key")
+
+    @staticmethod
+    def digest_path(path: Path):
+        return path.with_name(f"{path.name}.digest")
+
+    @staticmethod
+    def exists(path: Path):
+        return DigestIndex.digest_path(path).is_file()
+
+    @staticmethod
+    def create(
+        path: Path,
+        entries: Callable[[], Iterator[Tuple[str, bytes]]],
+        chunk_size: int = 2**22,
+    ) -> "DigestIndex":
+        """Builds the index (if it does not exist) and returns it
+
+        The index is built by a single process (a lock is held), and the
+        files are renamed once complete.
+
+        :param path: The path prefix of the index files
+        :param entries: A factory for an iterator over (key, digest) pairs
+        :param chunk_size: Number of entries processed at once
+        """
+        with FileLock(path.with_name(f"{path.name}.lock")):
+            if not DigestIndex.exists(path):
+                DigestIndex._build(path, entries(), chunk_size)
+        return DigestIndex(path)
+
+    @staticmethod
+    def _build(path: Path, entries: Iterator[Tuple[str, bytes]], chunk_size: int):
+        key_path = DigestIndex.key_path(path)
+        digest_path = DigestIndex.digest_path(path)
+        tmp_key_path = key_path.with_name(f"{key_path.name}.tmp")
+        tmp_digest_path = digest_path.with_name(f"{digest_path.name}.tmp")
+
+        # Write (unsorted) keys and digests, chunk by chunk
+        logging.info("Building digest index %s", path)
+        count = 0
+        with tmp_key_path.open("wb") as key_fp, tmp_digest_path.open("wb") as dig_fp:
+            keys = np.empty(chunk_size, dtype="<u8")
+            digests = bytearray()
+            for key, digest in entries:
+                keys[count % chunk_size] = key_hash(key)
+                assert len(digest) == DIGEST_SIZE
+                digests.extend(digest)
+                count += 1
+                if count % chunk_size == 0:
+                    keys.tofile(key_fp)
+                    dig_fp.write(digests)
+                    digests = bytearray()
+            keys[: count % chunk_size].tofile(key_fp)
+            dig_fp.write(digests)
+
+        # Sort the keys, and re-order the digests accordingly
+        logging.info("Sorting %d digests", count)
+        unsorted_keys = np.fromfile(tmp_key_path, dtype="<u8")
+        order = np.argsort(unsorted_keys, kind="stable")
+        unsorted_keys[order].tofile(key_path)
+        del unsorted_keys
+        tmp_key_path.unlink()
+
+        unsorted_digests = DigestIndex._map(
+            tmp_digest_path, np.dtype(f"V{DIGEST_SIZE}")
+        )
+        with tmp_digest_path.with_suffix(".sorted").open("wb") as fp:
+            for start in range(0, count, chunk_size):
+                unsorted_digests[order[start : start + chunk_size]].tofile(fp)
+        del unsorted_digests
+        os.replace(tmp_digest_path.with_suffix(".sorted"), digest_path)
+        tmp_digest_path.unlink()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the digest associated with the key (or None)"""
+        digests = self.all(key)
+        return digests[0] if digests else None
+
+    def all(self, key: str) -> list[bytes]:
+        """Returns all the digests whose hashed key matches"""
+        hashed = np.uint64(key_hash(key))
+        ix = int(np.searchsorted(self.keys, hashed))
+        digests = []
+        while ix < len(self.keys) and self.keys[ix] == hashed:
+            digests.append(self.digests[ix].tobytes())
+            ix += 1
+        return digests
+
+    def check(self, key: str, digest: bytes) -> bool:
+        """Checks that the digest matches the one stored for this key
+
+        In the (unlikely) case of a collision between hashed keys, the digest
+        is accepted if it matches any of them.
+        """
+        return digest in self.all(key)
@@ -1,7 +1,18 @@
+import json
+import logging
 import os
+import shutil
+import threading
+from contextlib import contextmanager
+from functools import cached_property
+from filelock import FileLock
 from tqdm import tqdm
 import gzip
 from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple, TypeVar
+import numpy as np
+
+T = TypeVar("T")
 
 
 def auto_open(path: Path, mode: str):
@@ -10,6 +21,329 @@ def auto_open(path: Path, mode: str):
     return path.open(mode)
 
 
+def file_digest(path: Path, hasher_factory: Callable, buffer_size: int = 2**20) -> str:
+    """Computes the (hex) digest of a file
+
+    Large buffers are used so that the hash computation releases the GIL, which
+    means that this function can be run in a thread pool.
+    """
+    hasher = hasher_factory()
+    with path.open("rb") as fp:
+        while data := fp.read(buffer_size):
+            hasher.update(data)
+    return hasher.hexdigest()
+
+
+def file_stamp(path: Path) -> Dict[str, int]:
+    """Size and modification time (ns) of a file, used to invalidate caches"""
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def _remove(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def replace_path(source: Path, target: Path):
+    """Atomically replaces a file or a folder
+
+    A folder cannot be replaced by a rename: the old folder is first moved
+    aside, then deleted. Files that other processes have opened (or
+    memory-mapped) are never modified.
+    """
+    if target.is_dir() and not target.is_symlink():
+        old = target.with_name(f"{target.name}.old")
+        _remove(old)
+        os.replace(target, old)
+        os.replace(source, target)
+        shutil.rmtree(old)
+    else:
+        os.replace(source, target)
+
+
+@contextmanager
+def _cache_lock(path: Path) -> Iterator[bool]:
+    """Holds `<path>.lock`, yielding False if the lock cannot be created"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lock = FileLock(path.with_name(f"{path.name}.lock"))
+        lock.acquire()
+    except OSError:
+        logging.warning("Could not lock the cache %s", path)
+        yield False
+        return
+
+    try:
+        yield True
+    finally:
+        lock.release()
+
+
+def _write_cache(path: Path, write: Callable[[Path], None]) -> bool:
+    """Writes into a temporary path which then replaces `path`"""
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    try:
+        _remove(tmp_path)
+        write(tmp_path)
+        replace_path(tmp_path, path)
+    except OSError:
+        logging.warning("Could not write the cache %s", path)
+        _remove(tmp_path)
+        return False
+    return True
+
+
+def cached_build(
+    path: Path,
+    load: Callable[[Path], Optional[T]],
+    compute: Callable[[], T],
+    save: Callable[[T, Path], None],
+) -> T:
+    """Returns a value cached in a file or folder, computing it if needed
+
+    The cache is built by a single process (holding `<path>.lock`): the value
+    is saved into a temporary path, which then replaces `path`. Readers never
+    see partially written files, and memory-mapped files are never rewritten.
+    Once written, the cache is loaded; if it cannot be written, the computed
+    value is returned.
+
+    :param load: Loads the cache, or returns None if it is missing or stale
+    :param compute: Computes the value
+    :param save: Saves the value into a (new) file or folder
+    """
+    if (value := load(path)) is not None:
+        return value
+
+    with _cache_lock(path) as locked:
+        # The cache might have been built while we were waiting
+        if locked and (value := load(path)) is not None:
+            return value
+
+        value = compute()
+        if locked and _write_cache(path, lambda tmp_path: save(value, tmp_path)):
+            if (loaded := load(path)) is not None:
+                return loaded
+        return value
+
+
+def cached_write(
+    path: Path,
+    load: Callable[[Path], Optional[T]],
+    write: Callable[[Path], None],
+) -> Optional[T]:
+    """Returns a value cached in a file or folder, writing it if needed
+
+    Like `cached_build`, but the cache is directly written (e.g. streamed)
+    into a temporary path, without computing the value first.
+
+    :param load: Loads the cache, or returns None if it is missing or stale
+    :param write: Writes the cache into a (new) file or folder
+    :return: The loaded cache, or None if it could not be written
+    """
+    if (value := load(path)) is not None:
+        return value
+
+    with _cache_lock(path) as locked:
+        if not locked:
+            return None
+        if (value := load(path)) is not None:
+            return value
+        if _write_cache(path, write):
+            return load(path)
+        return None
+
+
+class ChecksumManifest:
+    """Sidecar manifest of verified files
+
+    Each line of the manifest is a JSON object with the file name, size,
+    modification time (in ns) and digest. A file whose size and modification
+    time did not change since it was verified does not need to be hashed
+    again.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Tuple[int, int, str]] = {}
+
+        if path.is_file():
+            with path.open("rt") as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Partially written line (e.g. after a crash)
+                        continue
+                    self.entries[entry["name"]] = (
+                        entry["size"],
+                        entry["mtime"],
+                        entry["digest"],
+                    )
+
+    @staticmethod
+    def _stat(path: Path):
+        stat = path.stat()
+        return stat.st_size, stat.st_mtime_ns
+
+    def digest(self, name: str, path: Path) -> Optional[str]:
+        """Returns the recorded digest if the file did not change"""
+        entry = self.entries.get(name, None)
+        if entry is None or entry[:2] != self._stat(path):
+            return None
+        return entry[2]
+
+    def add(self, name: str, path: Path, digest: str):
+        """Records a verified file (appended to the manifest)"""
+        size, mtime = self._stat(path)
+        line = json.dumps(
+            {"name": name, "size": size, "mtime": mtime, "digest": digest}
+        )
+        with self.lock:
+            self.entries[name] = (size, mtime, digest)
+            # Append in one write (several processes might share the manifest)
+            with self.path.open("at") as fp:
+                fp.write(f"{line}\n")
+
+
+def _indexed_gzip():
+    """Returns the `IndexedGzipFile` class, or None if not installed"""
+    try:
+        from indexed_gzip import IndexedGzipFile
+    except ImportError:
+        return None
+    return IndexedGzipFile
+
+
+class LineIndex:
+    """Sparse index of line offsets in a (possibly gzipped) text file
+
+    The (uncompressed) offset of one line every `every` lines is stored in a
+    `<path>.lines.npz` file, built once on first use (and rebuilt if the file
+    size or modification time changes). Seeking in gzip files requires the
+    `indexed_gzip` package (`gzip` extra), whose index is stored in
+    `<path>.gzidx` and rebuilt with the line index.
+    """
+
+    def __init__(self, path: Path, every: int = 1024):
+        self.path = path
+        self.every = every
+        self.index_path = path.with_name(f"{path.name}.lines.npz")
+        self.gzindex_path = path.with_name(f"{path.name}.gzidx")
+
+    @property
+    def exists(self):
+        return self.index_path.is_file()
+
+    @property
+    def seekable(self) -> bool:
+        """Whether lines can be accessed directly (gzip files need
+        `indexed_gzip`, otherwise they are decompressed up to the line)"""
+        return self.path.suffix != ".gz" or _indexed_gzip() is not None
+
+    def _open(self, use_gzindex: bool) -> BinaryIO:
+        if self.path.suffix != ".gz":
+            return self.path.open("rb")
+
+        IndexedGzipFile = _indexed_gzip()
+        if IndexedGzipFile is None:
+            return gzip.open(self.path, "rb")
+        if use_gzindex and self.gzindex_path.is_file():
+            return IndexedGzipFile(str(self.path), index_file=str(self.gzindex_path))
+        return IndexedGzipFile(str(self.path))
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """Offsets of lines 0, every, 2 * every, ..."""
+        return self._index[0]
+
+    @property
+    def count(self) -> int:
+        """Number of lines"""
+        return self._index[1]
+
+    @cached_property
+    def _index(self) -> Tuple[np.ndarray, int]:
+        return cached_build(self.index_path, self._load, self._build, self._save)
+
+    def _load(self, index_path: Path) -> Optional[Tuple[np.ndarray, int]]:
+        if not index_path.is_file():
+            return None
+
+        data = np.load(index_path)
+        stamp = file_stamp(self.path)
+        if (int(data["size"]), int(data["mtime"])) != (stamp["size"], stamp["mtime"]):
+            return None
+        assert data["every"] == self.every, "Line index built with another step"
+        return data["offsets"], int(data["count"])
+
+    def _build(self) -> Tuple[np.ndarray, int]:
+        logging.info("Building the line index of %s", self.path)
+        offsets = []
+        position = 0
+        count = 0
+        # The gzip index (if any) is for the previous version of the file
+        self.gzindex_path.unlink(missing_ok=True)
+        with self._open(use_gzindex=False) as fp:
+            for count, line in enumerate(tqdm(fp, unit="lines"), 1):
+                if (count - 1) % self.every == 0:
+                    offsets.append(position)
+                position += len(line)
+
+            if hasattr(fp, "export_index"):
+                tmp_path = self.gzindex_path.with_name(f"{self.gzindex_path.name}.tmp")
+                fp.export_index(str(tmp_path))
+                os.replace(tmp_path, self.gzindex_path)
+
+        return np.array(offsets, dtype=np.int64), count
+
+    def _save(self, index: Tuple[np.ndarray, int], index_path: Path):
+        offsets, count = index
+        with index_path.open("wb") as fp:
+            np.savez(
+                fp,
+                offsets=offsets,
+                count=count,
+                every=self.every,
+                **file_stamp(self.path),
+            )
+
+    def open(self, line: int, *, sequential: bool = False) -> BinaryIO:
+        """Returns a (binary) file object positioned at the given line
+
+        :param sequential: If the file is not seekable, decompress it up to
+            the line (instead of raising an error)
+        :raises RuntimeError: if the file is not seekable (and `sequential`
+            is False)
+        """
+        # The line index is checked first (so that the gzip index is valid)
+        offsets = self.offsets
+        if line >= self.every and not self.seekable:
+            if not sequential:
+                raise RuntimeError(
+                    f"Cannot seek in {self.path}: indexed_gzip is not installed"
+                )
+            logging.warning(
+                "indexed_gzip is not installed: decompressing %s up to line %d",
+                self.path,
+                line,
+            )
+
+        fp = self._open(use_gzindex=True)
+        if len(offsets) > 0:
+            checkpoint = min(line // self.every, len(offsets) - 1)
+            fp.seek(int(offsets[checkpoint]))
+            for _ in range(line - checkpoint * self.every):
+                fp.readline()
+        return fp
+
+    def __len__(self):
+        return self.count
+
+
 class CountingWrapper:
     """Wrap a file object to count the actual compressed bytes read."""
 
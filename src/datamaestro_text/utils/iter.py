@@ -1,6 +1,9 @@
-from typing import Callable, Sequence, TypeVar, Iterator, List, Union
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Sequence, TypeVar, Iterator, List, Union
 
 T = TypeVar("T")
+U = TypeVar("U")
 
 
 class BatchIterator(Iterator[List[T]]):
@@ -21,6 +24,38 @@ class BatchIterator(Iterator[List[T]]):
         return batch
 
 
+def prefetch_map(
+    fn: Callable[[T], U], iterable: Iterable[T], prefetch: int = 2
+) -> Iterator[U]:
+    """Maps a function over an iterable in a background thread
+
+    Up to `prefetch` results are computed ahead of the consumer, in order. A
+    single thread is used, so `fn` does not need to be thread-safe (but should
+    not be called concurrently from the consumer thread).
+
+    :param fn: The function to apply
+    :param iterable: The input
+    :param prefetch: Number of results computed in advance (0 to disable)
+    """
+    if prefetch <= 0:
+        yield from map(fn, iterable)
+        return
+
+    with ThreadPoolExecutor(1) as executor:
+        futures = deque()
+        try:
+            for item in iterable:
+                futures.append(executor.submit(fn, item))
+                if len(futures) > prefetch:
+                    yield futures.popleft().result()
+
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
 class FactoryIterable:
     def __init__(self, factory: Callable[[], Iterator[T]]):
         self.factory: Callable[[], Iterator[T]] = factory
@@ -0,0 +1,161 @@
+"""Reads fields of pickled tuples without unpickling them"""
+
+from typing import List, Optional, Tuple
+
+#: Span (start, end) of an UTF-8 string or bytes in a pickle
+Span = Tuple[int, int]
+
+_MARK = object()
+
+# Opcodes whose argument is a length-prefixed string or bytes
+_STRINGS = {
+    0x8C: 1,  # SHORT_BINUNICODE
+    ord("X"): 4,  # BINUNICODE
+    0x8D: 8,  # BINUNICODE8
+    ord("C"): 1,  # SHORT_BINBYTES
+    ord("B"): 4,  # BINBYTES
+    0x8E: 8,  # BINBYTES8
+}
+
+# Opcodes pushing a value that is not needed, with their argument size
+_SCALARS = {
+    ord("N"): 0,  # NONE
+    0x88: 0,  # NEWTRUE
+    0x89: 0,  # NEWFALSE
+    ord("K"): 1,  # BININT1
+    ord("M"): 2,  # BININT2
+    ord("J"): 4,  # BININT
+    ord("G"): 8,  # BINFLOAT
+    ord("]"): 0,  # EMPTY_LIST
+    ord("}"): 0,  # EMPTY_DICT
+}
+
+_TUPLES = {0x85: 1, 0x86: 2, 0x87: 3}  # TUPLE1, TUPLE2, TUPLE3
+
+_LONGS = {0x8A: 1, 0x8B: 4}  # LONG1, LONG4 (size of the length)
+
+_GETS = {ord("h"): 1, ord("j"): 4}  # BINGET, LONG_BINGET
+
+_PUTS = {ord("q"): 1, ord("r"): 4}  # BINPUT, LONG_BINPUT
+
+
+def pickled_tuple_spans(data: bytes) -> List[Optional[Span]]:
+    """Returns the spans of the (string or bytes) fields of a pickled tuple
+
+    Only the opcodes used to pickle tuples of strings, numbers, and lists,
+    tuples or dictionaries of those are supported.
+
+    :param data: The pickle (protocol 2 or above)
+    :return: For each field of the tuple, the span of its UTF-8 (or raw)
+        bytes in `data`, or None if the field is not a string
+    :raises ValueError: if the pickle is not supported
+    """
+    # Fast path for flat tuples of strings and small integers
+    ix = 2 if data[0] == 0x80 else 0
+    if data[ix] == 0x95:
+        ix += 9
+    if marked := data[ix] == 0x28:
+        ix += 1
+    spans = []
+    while True:
+        op = data[ix]
+        if op == 0x8C:  # SHORT_BINUNICODE
+            end = ix + 2 + data[ix + 1]
+            spans.append((ix + 2, end))
+            ix = end
+        elif op == 0x94:  # MEMOIZE
+            ix += 1
+        elif op == 0x58:  # BINUNICODE
+            end = ix + 5 + int.from_bytes(data[ix + 1 : ix + 5], "little")
+            spans.append((ix + 5, end))
+            ix = end
+        elif op == 0x4B:  # BININT1
+            spans.append(None)
+            ix += 2
+        elif op == 0x4A:  # BININT
+            spans.append(None)
+            ix += 5
+        elif op == 0x4E:  # NONE
+            spans.append(None)
+            ix += 1
+        else:
+            break
+
+    if (data[ix] == 0x74) if marked else (_TUPLES.get(data[ix]) == len(spans)):
+        # TUPLE (or TUPLE1-3), possibly memoized, then STOP
+        ix += 1 + (data[ix + 1] == 0x94)
+        if data[ix] == 0x2E and ix == len(data) - 1:
+            return spans
+    return _pickled_tuple_spans(data)
+
+
+def _pickled_tuple_spans(data: bytes) -> List[Optional[Span]]:
+    stack = []
+    memo = []
+    ix = 0
+    while True:
+        op = data[ix]
+        ix += 1
+        if (size := _STRINGS.get(op)) is not None:
+            length = int.from_bytes(data[ix : ix + size], "little")
+            ix += size
+            stack.append((ix, ix + length))
+            ix += length
+        elif (size := _SCALARS.get(op)) is not None:
+            stack.append(None)
+            ix += size
+        elif op == 0x94:  # MEMOIZE
+            memo.append(stack[-1])
+        elif op == 0x95:  # FRAME
+            ix += 8
+        elif op == 0x80:  # PROTO
+            ix += 1
+        elif op == ord(")"):  # EMPTY_TUPLE
+            stack.append([])
+        elif op == ord("("):  # MARK
+            stack.append(_MARK)
+        elif op == ord("t") or op == ord("l") or op == ord("d"):
+            # TUPLE, LIST, DICT
+            mark = _find_mark(stack)
+            items = stack[mark + 1 :]
+            del stack[mark:]
+            stack.append(items if op == ord("t") else None)
+        elif (size := _TUPLES.get(op)) is not None:
+            items = stack[-size:]
+            del stack[-size:]
+            stack.append(items)
+        elif op == ord("e") or op == ord("u"):  # APPENDS, SETITEMS
+            del stack[_find_mark(stack) :]
+        elif op == ord("a"):  # APPEND
+            del stack[-1]
+        elif op == ord("s"):  # SETITEM
+            del stack[-2:]
+        elif (size := _GETS.get(op)) is not None:
+            stack.append(memo[int.from_bytes(data[ix : ix + size], "little")])
+            ix += size
+        elif (size := _PUTS.get(op)) is not None:
+            _put(memo, int.from_bytes(data[ix : ix + size], "little"), stack[-1])
+            ix += size
+        elif (size := _LONGS.get(op)) is not None:
+            ix += size + int.from_bytes(data[ix : ix + size], "little")
+            stack.append(None)
+        elif op == ord("."):  # STOP
+            break
+        else:
+            raise ValueError(f"Unsupported pickle opcode {op:#x} at {ix - 1}")
+
+    if len(stack) != 1 or not isinstance(stack[0], list):
+        raise ValueError("The pickle is not a tuple")
+    return [field if isinstance(field, tuple) else None for field in stack[0]]
+
+
+def _find_mark(stack: list) -> int:
+    for ix in range(len(stack) - 1, -1, -1):
+        if stack[ix] is _MARK:
+            return ix
+    raise ValueError("Unbalanced pickle mark")
+
+
+def _put(memo: list, index: int, value):
+    memo.extend([None] * (index + 1 - len(memo)))
+    memo[index] = value
@@ -19,29 +19,123 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import os
+import atexit
+import logging
+import queue
+import shutil
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-import atexit
+from threading import Thread
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+import lz4.frame
 import numpy
-import logging
-from typing import TextIO, Optional, List
 
 # Use 1GB
 MEMORY = 1024**3
 
 
-def shuffle_and_close(random, buf, f):
-    random.shuffle(buf)
-    f.writelines(buf)
-    f.close()
-
-
-def add_temporary_file(tmp_path: Path, files: List, rm_files: List[str]):
-    tmp_file = tempfile.NamedTemporaryFile(mode="w", delete=False, dir=tmp_path)
-    logging.info("Adding temporary file %s", tmp_file.name)
-    files.append(tmp_file)
-    rm_files.append(tmp_file.name)
+def shuffle_and_write(lines: List[str], seed: int, path: Path) -> int:
+    """Shuffle lines and write them to a compressed (LZ4) temporary file
+
+    This function is run in a worker process.
+    """
+    numpy.random.RandomState(seed).shuffle(lines)
+    with lz4.frame.open(path, "wt") as fp:
+        fp.writelines(lines)
+    return len(lines)
+
+
+class ThreadedWriter(Thread):
+    """Writes blocks of lines to an output stream in a background thread (e.g.
+    so that compression overlaps with the merge)"""
+
+    def __init__(self, output: TextIO, max_blocks: int = 4):
+        super().__init__(daemon=True)
+        self.output = output
+        self.queue = queue.Queue(max_blocks)
+        self.error = None
+
+    def run(self):
+        while (lines := self.queue.get()) is not None:
+            if self.error is None:
+                try:
+                    self.output.writelines(lines)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, lines):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(lines)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def interleave_counts(
+    counts: List[int], block_size: int, random
+) -> Iterator[numpy.ndarray]:
+    """Draws a uniformly random interleaving of shuffled sources, by blocks
+
+    For each block, yields the number of items taken from each source: it
+    follows a multivariate hypergeometric distribution (drawn as successive
+    univariate hypergeometric draws). If each source is uniformly shuffled,
+    and the items of each block are uniformly permuted, so is the output.
+    """
+    remaining = numpy.array(counts, dtype=numpy.int64)
+    while (total := int(remaining.sum())) > 0:
+        size = min(block_size, total)
+
+        taken = numpy.zeros(len(counts), dtype=numpy.int64)
+        left = size
+        for ix in range(len(counts) - 1):
+            others = int(remaining[ix + 1 :].sum())
+            if left == 0:
+                break
+            if others == 0:
+                taken[ix] = left
+            else:
+                taken[ix] = random.hypergeometric(remaining[ix], others, left)
+            left -= taken[ix]
+        taken[-1] += left
+        remaining -= taken
+        yield taken
+
+
+def interleave(
+    files: List[Path], counts: List[int], block_size: int, random
+) -> Iterable[List[str]]:
+    """Randomly interleaves the lines of shuffled files, by blocks
+
+    The interleaving is a uniformly random arrangement of the lines' source
+    files (see `interleave_counts`), and their order within each block is
+    uniformly permuted.
+    """
+    readers = [lz4.frame.open(path, "rt") for path in files]
+    try:
+        for taken in interleave_counts(counts, block_size, random):
+            size = int(taken.sum())
+            lines = []
+            for reader, count in zip(readers, taken):
+                lines.extend(islice(reader, int(count)))
+            assert len(lines) == size, "Temporary files are shorter than expected"
+
+            block = numpy.empty(size, dtype=object)
+            block[random.permutation(size)] = lines
+            yield block.tolist()
+    finally:
+        for reader in readers:
+            reader.close()
 
 
 def shuffle(
@@ -51,65 +145,80 @@ def shuffle(
     memory=MEMORY,
     random=None,
     tmp_path: Optional[Path] = None,
+    num_workers: int = 4,
 ):
-    """Shuffle using temporary file"""
+    """Shuffle using temporary files
+
+    Lines are grouped in chunks, which are shuffled and written
+    (LZ4-compressed) by a process pool. The chunks are then merged with a
+    uniformly random interleaving, and written by a background thread.
+
+    :param input: An iterable over lines
+    :param output: The output stream
+    :param memory: The (approximate) memory budget in bytes
+    :param random: A numpy random state
+    :param tmp_path: Where to store the temporary files
+    :param num_workers: The number of processes shuffling chunks
+    """
     if random is None:
         random = numpy.random.RandomState()
-    files = []
+    num_workers = max(1, num_workers)
+    chunk_memory = memory // (num_workers + 1)
 
     # --- Files to remove
-    rm_files = []
+    tmp_dir = Path(tempfile.mkdtemp(dir=tmp_path))
 
     def remove_files():
         logging.info("Removing files")
-        for path in rm_files:
-            if os.path.exists(path):
-                os.unlink(path)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
     # In case of crash, remove the files
     atexit.register(remove_files)
 
-    # Let's go
-    add_temporary_file(tmp_path, files, rm_files)
+    # Shuffle and write chunks
     total_bytes = 0
-    total_lines = 0
-    buf = []
-    bytes_used = 0
-
-    # Create the temporary files
-    for line in input:
-        bytes_used += len(line)
-        total_bytes += len(line)
-        total_lines += 1
-        buf.append(line)
-        if bytes_used >= memory:
-            shuffle_and_close(random, buf, files[-1])
-            add_temporary_file(tmp_path, files, rm_files)
-
-            buf = []
-            bytes_used = 0
-
-    if buf:
-        shuffle_and_close(random, buf, files[-1])
-
-    buf = []
-    avg_bytes_per_line = total_bytes / float(total_lines)
-    logging.info("Output from %d temporary files", len(files))
-
-    files = [open(f.name) for f in files]
-    while files:
-        lines_per_file = int((memory / avg_bytes_per_line) / len(files))
-        for f in files:
-            lines = f.readlines(lines_per_file)
-            buf += lines
-            if not lines:
-                files.remove(f)
-                os.unlink(f.name)
-                rm_files.remove(f.name)
-
-        random.shuffle(buf)
-        output.writelines(buf)
+    files, futures = [], []
+    with ProcessPoolExecutor(num_workers) as executor:
+
+        def submit(buf):
+            # Limits the number of chunks in memory
+            if len(futures) - num_workers >= 0:
+                futures[-num_workers].result()
+            files.append(tmp_dir / f"{len(files)}.lz4")
+            logging.info("Adding temporary file %s", files[-1])
+            futures.append(
+                executor.submit(
+                    shuffle_and_write, buf, random.randint(2**31), files[-1]
+                )
+            )
+
         buf = []
+        bytes_used = 0
+        for line in input:
+            bytes_used += len(line)
+            buf.append(line)
+            if bytes_used >= chunk_memory:
+                submit(buf)
+                total_bytes += bytes_used
+                buf = []
+                bytes_used = 0
+
+        if buf:
+            submit(buf)
+            total_bytes += bytes_used
+        del buf
+
+        counts = [future.result() for future in futures]
+
+    # Merge
+    total_lines = sum(counts)
+    if total_lines > 0:
+        avg_bytes_per_line = total_bytes / float(total_lines)
+        block_size = max(1, int(memory / avg_bytes_per_line / 2))
+        logging.info("Output from %d temporary files", len(files))
+        with ThreadedWriter(output) as writer:
+            for lines in interleave(files, counts, block_size, random):
+                writer.write(lines)
 
     remove_files()
     atexit.unregister(remove_files)